@@ -1,15 +1,26 @@
 """
 그린 그림을 예측하는 간단한 스크립트
+
+모델 옆에 NumPy 가중치(models/quickdraw_rnn.npz, scripts/export_numpy.py로 추출)가 있으면
+TensorFlow를 import하지 않고 NumPy 엔진으로 예측합니다. .npz가 .keras 모델보다 오래되었으면
+(추출 후 다시 학습) Keras 모델을 사용합니다.
 """
+import os
 import json
 import numpy as np
 import sys
 from pathlib import Path
-from tensorflow import keras
 from src import data_loader
+from src.numpy_engine import NumpyLSTMModel, numpy_model_path
+from src.registry import load_categories
 
+# 모델 옆에 <이름>.categories.json(train.py가 저장)이 없을 때 사용하는 기본 카테고리
 CATEGORIES = ["cat", "dog", "airplane", "car", "bird"]
 
+# predict_api.py와 같은 입력 전처리 (0~255 정규화 + RDP 단순화, PREDICT_SIMPLIFY=0이면 생략)
+# 두 진입점이 같은 그림에 같은 클래스를 반환하도록 같은 환경 변수와 기본값을 사용
+SIMPLIFY_INPUT = os.getenv("PREDICT_SIMPLIFY", "1").strip().lower() not in ("0", "false", "no", "off")
+
 def main():
     """
     drawing.json 파일을 로드하고 예측 결과 출력
@@ -25,16 +36,31 @@ def main():
         print("사용법: python predict.py [drawing.json 경로]")
         return
     
-    # 모델 로드
+    # 모델 로드 (NumPy 가중치가 있으면 TensorFlow 없이 예측)
     model_path = "models/quickdraw_rnn.keras"
-    if not Path(model_path).exists():
+    npz_path = numpy_model_path(model_path)
+    use_numpy = Path(npz_path).exists()
+    # 다시 학습한 모델보다 오래된 .npz는 이전 가중치이므로 Keras 모델로 예측
+    if use_numpy and Path(model_path).exists() and Path(npz_path).stat().st_mtime < Path(model_path).stat().st_mtime:
+        print(f"⚠️  NumPy 가중치가 모델보다 오래되었습니다: {npz_path} (scripts/export_numpy.py로 다시 추출하세요)")
+        use_numpy = False
+    if use_numpy:
+        print(f"NumPy 모델 로드 중: {npz_path}")
+        engine = NumpyLSTMModel.load(npz_path)
+        predict = engine.run
+        categories = load_categories(npz_path, default=CATEGORIES)
+    elif Path(model_path).exists():
+        print(f"모델 로드 중: {model_path}")
+        from tensorflow import keras
+        import src.model  # conv 구조의 커스텀 레이어 등록 (load_model용)
+        model = keras.models.load_model(model_path)
+        predict = lambda batch: model.predict(batch, verbose=0)
+        categories = load_categories(model_path, default=CATEGORIES)
+    else:
         print(f"⚠️  모델 파일을 찾을 수 없습니다: {model_path}")
         print("먼저 train.py를 실행하여 모델을 학습시켜주세요.")
         return
     
-    print(f"모델 로드 중: {model_path}")
-    model = keras.models.load_model(model_path)
-    
     # 그림 로드
     print(f"그림 로드 중: {drawing_path}")
     with open(drawing_path, 'r') as f:
@@ -50,17 +76,17 @@ def main():
     
     # 전처리
     print("전처리 중...")
-    sequence = data_loader.drawing_to_sequence(drawing)
+    sequence = data_loader.drawing_to_sequence(drawing, simplify=SIMPLIFY_INPUT)
     input_array = sequence.reshape(1, 200, 3).astype(np.float32)
     
     # 예측
     print("예측 중...")
-    predictions = model.predict(input_array, verbose=0)
+    predictions = predict(input_array)
     probabilities = predictions[0]
     
     # 결과 출력
     predicted_idx = np.argmax(probabilities)
-    predicted_class = CATEGORIES[predicted_idx]
+    predicted_class = categories[predicted_idx]
     confidence = probabilities[predicted_idx]
     
     print(f"\n{'='*60}")
@@ -70,7 +96,7 @@ def main():
     print(f"확률: {confidence:.4f} ({confidence*100:.2f}%)")
     
     print(f"\n모든 클래스 확률:")
-    for idx, class_name in enumerate(CATEGORIES):
+    for idx, class_name in enumerate(categories):
         prob = probabilities[idx]
         marker = " ← 예측" if idx == predicted_idx else ""
         print(f"  {class_name}: {prob:.4f} ({prob*100:.2f}%){marker}")
@@ -1,54 +1,344 @@
 """
 API용 예측 스크립트 - JSON 입력을 받아 예측 결과를 JSON으로 반환
 ONNX 모델 사용 (FaceAgeRank 방식)
+
+사용법:
+    python predict_api.py [모델 경로]            # 1회 실행: stdin JSON 1개 → stdout JSON 1개
+    python predict_api.py [모델 경로] --serve    # 상주 워커: 한 줄에 JSON 1개씩 요청/응답
+    python predict_api.py [모델 경로] --int8     # INT8 양자화 모델(<모델>.int8.onnx) 사용
+    python predict_api.py 모델1.onnx 이름=모델2.onnx --serve   # 여러 모델을 한 워커에 로드 (첫 번째가 기본)
+    python predict_api.py models/quickdraw_rnn.npz          # NumPy 엔진 (scripts/export_numpy.py로 추출한 가중치, onnxruntime 로드 안 함)
+    python predict_api.py [모델 경로] --pool     # 프로세스 풀: 상주 워커 여러 개를 미리 fork하고 Unix 소켓(PREDICT_SOCKET) 1개로 요청 분배
+
+모델마다 옆의 <이름>.categories.json(train.py가 저장)에서 카테고리 목록을 읽고, 없으면 CATEGORIES를 사용합니다.
+모델 이름은 "이름=경로"로 지정하거나, 생략하면 파일 이름에서 확장자를 뺀 것입니다 (예: quickdraw_rnn_10classes).
+
+상주 워커 프로토콜 (stdin/stdout, 한 줄 = JSON 객체 1개):
+    시작 시   → {"type": "ready", "model": ..., "categories": [...], "error": null, "models": {...}}
+    요청      ← {"id": 1, "drawing": [...]}
+              또는 {"id": 1, "packed": "<base64>"}  (src/data_loader.pack_drawing 바이너리 형식)
+              "model": "이름"을 붙이면 해당 모델로 예측 (없으면 기본 모델)
+    응답      → {"id": 1, "type": "result", "result": {...}}
+    상태 확인 ← {"id": 2, "type": "ping"}   → {"id": 2, "type": "pong"}
+    배치 통계 ← {"id": 3, "type": "stats"}  → {"id": 3, "type": "stats", "stats": {...}, "cache": {...}, "models": {...}}
+    모델 목록 ← {"id": 6, "type": "models"} → {"id": 6, "type": "models", "models": {이름: {path, categories, reloads, ...}}}
+    계측 조회 ← {"id": 7, "type": "metrics"} → {"id": 7, "type": "metrics", "metrics": {...}}  (단계별 시간 히스토그램, 요청/오류/배치 크기)
+              {"id": 7, "type": "metrics", "format": "prometheus"} → {"id": 7, "type": "metrics", "text": "..."}
+    증분 예측 ← {"id": 4, "type": "stream", "session": "s1", "strokes": [[xs, ys]], "closed": false}
+              → {"id": 4, "type": "result", "result": {...}}  (새로 추가된 점만 전송)
+    세션 종료 ← {"id": 5, "type": "stream_end", "session": "s1"} → {"id": 5, "type": "stream_end", "closed": true}
+    종료      ← {"type": "shutdown"}
+
+프로세스 풀 모드(--pool)는 같은 프로토콜을 PREDICT_SOCKET의 Unix 소켓으로 제공합니다 (연결마다 ready 메시지부터 전송).
+요청은 처리 중인 요청이 가장 적은 워커로 보내고, 증분 예측은 세션별로 같은 워커, stats/metrics는 모든 워커의 결과를 합쳐 응답합니다.
+"shutdown"은 그 연결만 닫으며, 풀은 SIGTERM/SIGINT로 종료합니다.
 """
 import json
 import sys
+import base64
+import logging
 import os
 import time
+import threading
 import numpy as np
 from pathlib import Path
-import onnxruntime as ort
 from src import data_loader
+from src.inference import quantized_model_path, load_session, preload_model, warm_up_session
+from src.incremental import IncrementalSession, SessionStore
+from src.metrics import BATCH_SIZE_BUCKETS, Metrics, merge_snapshots, snapshot_prometheus_text
+from src.registry import LoadedModel, ModelRegistry
 
+# 모델 옆에 <이름>.categories.json이 없을 때 사용하는 기본 카테고리
 CATEGORIES = ["cat", "dog", "airplane", "car", "bird"]
 
-# 모델 로드 시간 측정
-model_load_start = time.time()
+# 상주 워커 마이크로 배칭 설정 (처리량 ↔ 지연 시간 조절)
+MAX_BATCH_SIZE = int(os.getenv("PREDICT_MAX_BATCH_SIZE", "32"))  # 배치 1개당 최대 요청 수
+MAX_WAIT_MS = float(os.getenv("PREDICT_MAX_WAIT_MS", "5"))  # 첫 요청 이후 추가 요청을 기다리는 최대 시간
+
+# 증분(스트리밍) 예측 세션 설정
+STREAM_MAX_SESSIONS = int(os.getenv("STREAM_MAX_SESSIONS", "1000"))  # 동시에 유지하는 그림 세션 수
+STREAM_SESSION_TTL = float(os.getenv("STREAM_SESSION_TTL", "300"))  # 이 시간(초) 동안 갱신이 없으면 세션 삭제
+
+# 상주 워커 시작 시 워밍업 실행 횟수 (0이면 생략)
+# ONNX Runtime 세션 옵션(그래프 최적화, 스레드 수 등)은 ORT_* 환경 변수로 설정 (src/inference.py 참고)
+WARMUP_RUNS = int(os.getenv("ORT_WARMUP_RUNS", "1"))
+
+# 실시간 입력 전처리: 0~255 정규화 + RDP 단순화로 학습 데이터(QuickDraw simplified)와 같은 형태로 맞춤
+# (조밀한 캔버스 점이 200개에서 잘리지 않고, 짧아진 시퀀스는 동적 길이 모델에서 더 빨리 실행됨)
+SIMPLIFY_INPUT = os.getenv("PREDICT_SIMPLIFY", "1").strip().lower() not in ("0", "false", "no", "off")
+
+# 예측 결과 캐시 (같은 그림 재전송, 변경 없는 캔버스 반복 요청용)
+PREDICT_CACHE_SIZE = int(os.getenv("PREDICT_CACHE_SIZE", "1024"))  # 최대 항목 수 (0이면 사용 안 함)
+PREDICT_CACHE_TTL = float(os.getenv("PREDICT_CACHE_TTL", "60"))  # 항목 유지 시간 (초)
+
+# 상주 워커가 모델 파일(.onnx, .opt.onnx, .categories.json) 변경을 확인하는 간격 (초, 0이면 재로드 안 함)
+RELOAD_INTERVAL = float(os.getenv("PREDICT_RELOAD_INTERVAL", "2"))
+
+# 프로세스 풀 모드(--pool) 설정
+# 워커마다 ONNX Runtime 연산자 내부 스레드 수(ORT_INTRA_OP_THREADS)를 따로 지정하지 않으면 CPU 코어 수 / 워커 수
+POOL_WORKERS = int(os.getenv("PREDICT_POOL_WORKERS", "0"))  # 워커 프로세스 수 (0이면 사용 가능한 CPU 코어 수)
+POOL_SOCKET = os.getenv("PREDICT_SOCKET", "/tmp/quickdraw_predict.sock")  # 클라이언트(Node 서버)가 연결하는 Unix 소켓
+
+# JSON 백엔드: orjson이 설치되어 있으면 사용 (PREDICT_JSON_BACKEND=json이면 표준 json 모듈)
+JSON_BACKEND = os.getenv("PREDICT_JSON_BACKEND", "auto")
+try:
+    if JSON_BACKEND == "json":
+        raise ImportError
+    import orjson
+    json_loads = orjson.loads  # orjson.JSONDecodeError는 json.JSONDecodeError의 하위 클래스
+    
+    def json_dumps(obj):
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+except ImportError:
+    if JSON_BACKEND == "orjson":
+        raise
+    json_loads = json.loads
+    json_dumps = json.dumps
+
+# stderr 로그 수준: debug(요청마다 예측 결과 출력), info(기본: 모델 로드/워밍업/재로드), warning, error
+LOG_LEVEL = os.getenv("PREDICT_LOG_LEVEL", "info").upper()
+logging.basicConfig(stream=sys.stderr, level=getattr(logging, LOG_LEVEL, logging.INFO), format="%(message)s")
+logger = logging.getLogger("predict_api")
+
+# 요청 처리 계측 ({"type": "metrics"} 요청으로 JSON 또는 Prometheus 텍스트 형식 조회)
+metrics = Metrics()
+stage_seconds = metrics.histogram(
+    "quickdraw_stage_duration_seconds",
+    "Time per processing stage (parse, preprocess, session_run, postprocess, serialize)",
+    label_names=("stage",)
+)
+requests_total = metrics.counter("quickdraw_requests_total", "Requests received, by request type", ("type",))
+errors_total = metrics.counter("quickdraw_errors_total", "Requests answered with an error, by kind", ("kind",))
+predictions_total = metrics.counter(
+    "quickdraw_predictions_total",
+    "Predictions answered, by model and source (cache or batch)",
+    ("model", "source")
+)
+batch_sizes = metrics.histogram(
+    "quickdraw_batch_size",
+    "Drawings per ONNX session run, by model",
+    BATCH_SIZE_BUCKETS,
+    ("model",)
+)
 
-# ONNX 모델 경로 결정: 명령줄 인자 > 환경 변수 > 기본값
-onnx_model_path = None
-if len(sys.argv) >= 2:
-    onnx_model_path = sys.argv[1]  # 첫 번째 인자로 ONNX 모델 경로 지정
+def observe_run(model_name, batch_size, seconds):
+    """
+    LoadedModel이 세션을 실행할 때마다 호출 (배치 1개 단위)
+    """
+    stage_seconds.observe(seconds, stage="session_run")
+    batch_sizes.observe(batch_size, model=model_name)
 
-if not onnx_model_path:
-    onnx_model_path = os.getenv("ONNX_MODEL_PATH", "models/quickdraw_rnn.onnx")
+# 명령줄 인자: "--"로 시작하는 것은 옵션, 나머지는 위치 인자
+cli_args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+cli_flags = {arg for arg in sys.argv[1:] if arg.startswith("--")}
+POOL = "--pool" in cli_flags
+SERVING = "--serve" in cli_flags or POOL
 
-# 절대 경로로 변환 (상대 경로인 경우)
-if not os.path.isabs(onnx_model_path):
-    # 현재 작업 디렉토리 기준으로 절대 경로 생성
-    onnx_model_path = os.path.abspath(onnx_model_path)
+def parse_model_spec(spec):
+    """
+    모델 지정 1개를 (이름, 절대 경로)로 변환
+    
+    "이름=경로" 또는 "경로" (이름은 파일 이름에서 확장자를 뺀 것, 예: quickdraw_rnn_10classes)
+    """
+    name, sep, path = spec.partition("=")
+    if not sep:
+        name, path = Path(spec).stem, spec
+    
+    # INT8 양자화 모델 선택: --int8 플래그 또는 ONNX_MODEL_VARIANT=int8 (convert_to_onnx.py --quantize 결과물)
+    if "--int8" in cli_flags or os.getenv("ONNX_MODEL_VARIANT") == "int8":
+        path = quantized_model_path(path)
+    
+    # 절대 경로로 변환 (상대 경로인 경우 현재 작업 디렉토리 기준)
+    return name, os.path.abspath(path)
 
-# ONNX 모델 파일 존재 확인 및 로드
-onnx_session = None
-onnx_load_error = None
-onnx_load_time = 0
+# ONNX 모델 경로 결정: 명령줄 인자(여러 개 가능) > 환경 변수 > 기본값
+# 첫 번째 모델이 기본 모델 (요청에 "model"이 없으면 사용)
+model_specs = cli_args
+if not model_specs:
+    model_specs = [spec.strip() for spec in os.getenv("ONNX_MODEL_PATHS", "").split(",") if spec.strip()]
+if not model_specs:
+    model_specs = [os.getenv("ONNX_MODEL_PATH", "models/quickdraw_rnn.onnx")]
+
+def warm_up(model):
+    """
+    첫 실제 요청이 세션 초기화 비용(커널 준비, 메모리 할당)을 떠안지 않도록
+    모델을 요청에 내보내기 전에 단건/최대 배치 크기(동적 길이 모델은 버킷 길이별로)를 미리 실행
+    """
+    if model.session is None:
+        # NumPy 엔진은 세션 초기화 비용이 없음
+        return
+    lengths = data_loader.BUCKET_LENGTHS if model.dynamic_length else (None,)
+    sizes = sorted({1, MAX_BATCH_SIZE})
+    elapsed = warm_up_session(model.session, batch_sizes=sizes, lengths=lengths, runs=WARMUP_RUNS)
+    logger.info(f"[타이밍] 워밍업 ({model.name}): {elapsed:.2f}초 (배치 {sizes}, 길이 {list(lengths)})")
 
-if not os.path.exists(onnx_model_path):
-    onnx_load_error = f"ONNX 모델 파일을 찾을 수 없습니다: {onnx_model_path}"
-else:
-    # ONNX 모델 로드
+def load_model(name, path):
+    """
+    모델 1개 로드 (레지스트리 최초 로드와 파일 변경 시 재로드에 사용)
+    
+    카테고리는 모델 옆의 <이름>.categories.json (train.py가 저장), 없으면 CATEGORIES
+    상주 워커에서는 워밍업까지 마친 뒤 반환하므로 교체 직후 요청도 느려지지 않습니다.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"모델 파일을 찾을 수 없습니다: {path}")
+    
+    load_start = time.time()
+    # 미리 최적화된 <모델>.opt.onnx가 있으면 그것을 로드 (시작 시 그래프 최적화 생략)
+    model = LoadedModel(
+        name,
+        path,
+        default_categories=CATEGORIES,
+        max_batch_size=MAX_BATCH_SIZE,
+        max_wait_ms=MAX_WAIT_MS,
+        cache_size=PREDICT_CACHE_SIZE,
+        cache_ttl=PREDICT_CACHE_TTL,
+        observe_run=observe_run
+    )
+    backend = "NumPy" if model.engine is not None else "ONNX"
+    logger.info(f"✅ {backend} 모델 로드 성공 ({name}, 클래스 {len(model.categories)}개, {time.time() - load_start:.2f}초): {model.loaded_path}")
+    if SERVING and WARMUP_RUNS > 0:
+        warm_up(model)
+    return model
+
+# 모델별 ONNX 세션 + 카테고리 + 마이크로 배처 + 예측 결과 캐시
+# (캐시 키는 전처리된 (200, 3) 시퀀스 해시 + 모델 파일 식별자, 모델이 교체되면 새 캐시 사용)
+registry = ModelRegistry(load_model)
+
+onnx_model_path = parse_model_spec(model_specs[0])[1]  # 기본 모델 (증분 예측 스텝 모델 위치 기준)
+
+def load_models():
+    """
+    model_specs의 모델을 모두 레지스트리에 로드 (프로세스 풀 모드에서는 워커마다 fork 이후에 호출)
+    """
+    model_load_start = time.time()
+    for spec in model_specs:
+        registry.add(*parse_model_spec(spec))
+    # 모델 로드 시간을 stderr에 출력 (디버깅용)
+    logger.info(f"[타이밍] 모델 {len(model_specs)}개 로드 전체: {time.time() - model_load_start:.2f}초")
+
+def model_categories(model_name=None):
+    """
+    모델의 카테고리 목록 (로드되지 않은 모델이면 CATEGORIES)
+    """
     try:
-        onnx_load_start = time.time()
-        onnx_session = ort.InferenceSession(onnx_model_path, providers=["CPUExecutionProvider"])
-        onnx_load_time = time.time() - onnx_load_start
-        print(f"✅ ONNX 모델 로드 성공: {onnx_model_path}", file=sys.stderr)
-    except Exception as e:
-        onnx_load_error = f"ONNX 모델 로드 실패: {str(e)}"
+        return registry.get(model_name).categories
+    except KeyError:
+        return CATEGORIES
 
-model_load_time = time.time() - model_load_start
-# 모델 로드 시간을 stderr에 출력 (디버깅용)
-print(f"[타이밍] ONNX 로드: {onnx_load_time:.2f}초 | 모델 로드 전체: {model_load_time:.2f}초", file=sys.stderr)
+def empty_result(error=None, categories=None):
+    """
+    빈 그림이나 오류 시 반환하는 기본 결과
+    """
+    result = {
+        "predictedClass": "",
+        "confidence": 0.0,
+        "allProbabilities": {category: 0.0 for category in (categories or model_categories())}
+    }
+    if error is not None:
+        result["error"] = error
+    return result
+
+def format_result(probabilities, categories=None):
+    """
+    확률 벡터 1개 (클래스 수,)를 API 응답 dict로 변환
+    """
+    start = time.perf_counter()
+    categories = categories or model_categories()
+    
+    # 확률 정규화 (softmax가 이미 적용되어 있지만, 안전을 위해 정규화)
+    # ONNX 모델 출력이 로그 확률일 수도 있으므로 확인
+    probabilities_sum = np.sum(probabilities)
+    if probabilities_sum > 1.1 or probabilities_sum < 0.9:  # 합이 1에 가깝지 않으면 정규화
+        probabilities = probabilities / probabilities_sum
+    
+    # 결과 생성
+    predicted_idx = np.argmax(probabilities)
+    predicted_class = categories[predicted_idx]
+    confidence = float(probabilities[predicted_idx])
+    
+    # 디버깅: 예측 결과 출력 (PREDICT_LOG_LEVEL=debug일 때만, 요청마다 실행되는 경로라 문자열도 만들지 않음)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"[디버깅] 예측 클래스: {predicted_class}, 확률: {confidence:.4f}, 전체 확률 합: {np.sum(probabilities):.4f}")
+        logger.debug(f"[디버깅] 전체 확률 분포: {dict(zip(categories, [float(p) for p in probabilities]))}")
+    
+    all_probabilities = {
+        category: float(prob) for category, prob in zip(categories, probabilities)
+    }
+    
+    stage_seconds.observe(time.perf_counter() - start, stage="postprocess")
+    return {
+        "predictedClass": predicted_class,
+        "confidence": confidence,
+        "allProbabilities": all_probabilities
+    }
+
+def check_ready(num_points, model_name=None):
+    """
+    예측 전에 바로 응답할 수 있는 경우(빈 그림, 알 수 없는 모델, 모델 로드 실패)의 결과 반환, 아니면 None
+    """
+    try:
+        model = registry.get(model_name)
+    except KeyError as e:
+        return empty_result(e.args[0])
+    
+    if not num_points:
+        return empty_result(categories=model.categories)
+    
+    return None
+
+def request_sequence(request):
+    """
+    요청의 그림을 (200, 3) 시퀀스로 전처리
+    
+    "packed": pack_drawing 형식(int16 좌표 + 획별 점 수)의 base64 문자열 - 리스트를 만들지 않고 np.frombuffer로 해석
+    "drawing": [[x 좌표들], [y 좌표들]] 획 목록 (기존 JSON 형식)
+    
+    Returns:
+        (시퀀스 또는 None, 점 수) - 점이 없으면(빈 획만 있는 그림 포함) 시퀀스는 None
+    """
+    packed = request.get("packed")
+    if packed is not None:
+        xs, ys, lengths = data_loader.unpack_drawing(base64.b64decode(packed))
+        if not len(xs):
+            return None, 0
+        return data_loader.points_to_sequence(xs, ys, lengths, return_length=True, simplify=SIMPLIFY_INPUT)
+    
+    drawing = request.get("drawing") or []
+    if not drawing:
+        return None, 0
+    sequence, num_points = data_loader.drawing_to_sequence(drawing, return_length=True, simplify=SIMPLIFY_INPUT)
+    if not num_points:
+        return None, 0
+    return sequence, num_points
+
+def predict_drawing(drawing, model_name=None):
+    """
+    그림 1개를 예측하여 결과 dict 반환
+    """
+    return predict_request({"drawing": drawing, "model": model_name})
+
+def predict_request(request):
+    """
+    요청 1개("drawing" 또는 "packed", 선택적으로 "model")를 예측하여 결과 dict 반환
+    """
+    # 전처리
+    model_name = request.get("model")
+    with stage_seconds.time(stage="preprocess"):
+        sequence, num_points = request_sequence(request)
+    early_result = check_ready(num_points, model_name)
+    if early_result is not None:
+        return early_result
+    
+    with registry.acquire(model_name) as model:
+        # 같은 시퀀스의 이전 예측 결과 재사용
+        cache_key = model.cache.key(sequence)
+        probabilities = model.cache.get(cache_key)
+        if probabilities is None:
+            input_array = sequence.reshape(1, 200, 3).astype(np.float32)
+            probabilities = model.run(input_array)[0]  # (클래스 수,) 형태
+            model.cache.put(cache_key, probabilities)
+        
+        return format_result(probabilities, model.categories)
 
 def main():
     """
@@ -56,79 +346,320 @@ def main():
     """
     try:
         # stdin에서 JSON 읽기
-        input_data = json.load(sys.stdin)
-        drawing = input_data.get('drawing', [])
+        input_data = json_loads(sys.stdin.read())
+        result = predict_request(input_data)
         
-        if not drawing:
-            result = {
-                "predictedClass": "",
-                "confidence": 0.0,
-                "allProbabilities": {category: 0.0 for category in CATEGORIES}
-            }
-            print(json.dumps(result))
-            return
-        
-        # ONNX 모델 로드 에러 확인
-        if onnx_load_error or onnx_session is None:
-            result = {
-                "predictedClass": "",
-                "confidence": 0.0,
-                "allProbabilities": {category: 0.0 for category in CATEGORIES},
-                "error": onnx_load_error or "ONNX 모델이 로드되지 않았습니다."
-            }
-            print(json.dumps(result))
+        # JSON으로 출력
+        print(json_dumps(result))
+    
+    except Exception as e:
+        print(json_dumps(empty_result(str(e))))
+        sys.exit(1)
+
+def stream_model_path():
+    """
+    증분 예측용 스텝 모델(convert_to_onnx.py --step-output) 경로
+    
+    STREAM_ONNX_MODEL_PATH 환경 변수 > 기본 모델 옆의 "<이름>_stream.onnx"
+    """
+    return os.getenv("STREAM_ONNX_MODEL_PATH") or str(Path(onnx_model_path).with_name(
+        Path(onnx_model_path).stem + "_stream.onnx"
+    ))
+
+def load_stream_sessions():
+    """
+    증분 예측용 스텝 모델을 로드하여 세션 저장소 생성
+    
+    Returns:
+        (SessionStore 또는 None, 로드 에러 메시지 또는 None)
+    """
+    step_model_path = stream_model_path()
+    if not os.path.exists(step_model_path):
+        return None, f"스텝 모델 파일을 찾을 수 없습니다: {step_model_path}"
+    
+    try:
+        stream_session, _ = load_session(step_model_path)
+    except Exception as e:
+        return None, f"스텝 모델 로드 실패: {str(e)}"
+    
+    input_names = [model_input.name for model_input in stream_session.get_inputs()]
+    state_size = stream_session.get_inputs()[1].shape[-1]
+    
+    def run_step(points, state_h, state_c):
+        return stream_session.run(None, dict(zip(input_names, [points, state_h, state_c])))
+    
+    logger.info(f"✅ 스텝 모델 로드 성공: {step_model_path}")
+    if WARMUP_RUNS > 0:
+        warm_up_session(stream_session, lengths=(1, 8), runs=WARMUP_RUNS)
+    store = SessionStore(
+        lambda: IncrementalSession(run_step, state_size),
+        max_sessions=STREAM_MAX_SESSIONS,
+        ttl_seconds=STREAM_SESSION_TTL
+    )
+    return store, None
+
+# 상주 워커 stdout 쓰기 잠금 (입력 스레드와 배치 스레드가 함께 씀)
+write_lock = threading.Lock()
+
+def write_message(message):
+    """
+    상주 워커 응답 1줄을 stdout에 쓰고 즉시 flush
+    """
+    with stage_seconds.time(stage="serialize"):
+        line = json_dumps(message) + "\n"
+    with write_lock:
+        sys.stdout.write(line)
+        sys.stdout.flush()
+
+def handle_stream_request(request, streams, stream_error):
+    """
+    증분 예측 요청 처리: 세션의 LSTM 상태를 유지한 채 새로 추가된 점만 실행
+    """
+    request_id = request.get("id")
+    session_id = request.get("session")
+    
+    if request.get("type") == "stream_end":
+        closed = streams.close(session_id) if streams is not None else False
+        return {"id": request_id, "type": "stream_end", "closed": closed}
+    
+    if streams is None:
+        return {"id": request_id, "type": "result", "result": empty_result(stream_error)}
+    if session_id is None:
+        return {"id": request_id, "type": "error", "error": "session이 필요합니다."}
+    
+    try:
+        probabilities = streams.get(session_id).append(
+            request.get("strokes", []),
+            closed=bool(request.get("closed", False))
+        )
+        result = empty_result() if probabilities is None else format_result(probabilities)
+    except Exception as e:
+        errors_total.inc(kind="stream")
+        result = empty_result(str(e))
+    return {"id": request_id, "type": "result", "result": result}
+
+def handle_request(request, streams=None, stream_error=None):
+    """
+    상주 워커 요청 1개를 처리
+    
+    예측 요청은 전처리 후 요청한 모델("model", 없으면 기본 모델)의 마이크로 배처에 넣고,
+    응답은 배치가 끝난 뒤 배치 스레드에서 쓴다.
+    """
+    request_id = request.get("id")
+    request_type = request.get("type", "predict")
+    requests_total.inc(type=request_type)
+    
+    if request_type == "ping":
+        write_message({"id": request_id, "type": "pong"})
+        return
+    if request_type == "stats":
+        # stats/cache는 기본 모델, models는 모델별
+        try:
+            default_model = registry.get()
+            batch_stats, cache_stats = default_model.batcher.stats(), default_model.cache.stats()
+        except KeyError:
+            batch_stats, cache_stats = None, None
+        write_message({"id": request_id, "type": "stats", "stats": batch_stats, "cache": cache_stats, "models": registry.stats()})
+        return
+    if request_type == "models":
+        write_message({"id": request_id, "type": "models", "models": registry.describe()})
+        return
+    if request_type == "metrics":
+        if request.get("format") == "prometheus":
+            write_message({"id": request_id, "type": "metrics", "text": metrics.prometheus_text()})
+        else:
+            write_message({"id": request_id, "type": "metrics", "metrics": metrics.snapshot()})
+        return
+    if request_type in ("stream", "stream_end"):
+        write_message(handle_stream_request(request, streams, stream_error))
+        return
+    if request_type != "predict":
+        errors_total.inc(kind="unknown_type")
+        write_message({"id": request_id, "type": "error", "error": f"알 수 없는 요청 유형: {request_type}"})
+        return
+    
+    def reply(result):
+        write_message({"id": request_id, "type": "result", "result": result})
+    
+    model_name = request.get("model")
+    try:
+        with stage_seconds.time(stage="preprocess"):
+            sequence, num_points = request_sequence(request)
+        early_result = check_ready(num_points, model_name)
+        if early_result is not None:
+            if "error" in early_result:
+                errors_total.inc(kind="model_unavailable")
+            reply(early_result)
             return
         
-        # 전처리
-        sequence = data_loader.drawing_to_sequence(drawing)
-        input_array = sequence.reshape(1, 200, 3).astype(np.float32)
-        
-        # ONNX 모델 입력 이름 확인
-        input_name = onnx_session.get_inputs()[0].name
-        output_name = onnx_session.get_outputs()[0].name
-        
-        # 예측 (ONNX)
-        predictions = onnx_session.run([output_name], {input_name: input_array})[0]
-        probabilities = predictions[0]  # (5,) 형태
-        
-        # 확률 정규화 (softmax가 이미 적용되어 있지만, 안전을 위해 정규화)
-        # ONNX 모델 출력이 로그 확률일 수도 있으므로 확인
-        probabilities_sum = np.sum(probabilities)
-        if probabilities_sum > 1.1 or probabilities_sum < 0.9:  # 합이 1에 가깝지 않으면 정규화
-            probabilities = probabilities / probabilities_sum
-        
-        # 결과 생성
-        predicted_idx = np.argmax(probabilities)
-        predicted_class = CATEGORIES[predicted_idx]
-        confidence = float(probabilities[predicted_idx])
+        # 이 요청은 끝까지 지금 버전의 모델을 사용 (처리 중에 모델 파일이 교체되어도 같은 세션/카테고리로 응답)
+        with registry.acquire(model_name) as model:
+            cache_key = model.cache.key(sequence)
+            cached = model.cache.get(cache_key)
+            if cached is not None:
+                # 캐시 적중: 배치를 거치지 않고 바로 응답
+                predictions_total.inc(model=model.name, source="cache")
+                reply(format_result(cached, model.categories))
+                return
+            
+            def on_done(probabilities, error):
+                if error is not None:
+                    errors_total.inc(kind="session_run")
+                    reply(empty_result(str(error), model.categories))
+                    return
+                # 배치 출력 배열 전체가 캐시에 남지 않도록 복사
+                model.cache.put(cache_key, np.array(probabilities))
+                try:
+                    predictions_total.inc(model=model.name, source="batch")
+                    reply(format_result(probabilities, model.categories))
+                except Exception as e:
+                    errors_total.inc(kind="postprocess")
+                    reply(empty_result(str(e), model.categories))
+            
+            model.batcher.submit(sequence, on_done)
+    except Exception as e:
+        errors_total.inc(kind="predict")
+        reply(empty_result(str(e)))
+
+def serve():
+    """
+    상주 워커 모드: 모델을 한 번만 로드한 상태로 stdin의 요청을 줄 단위로 처리
+    
+    요청마다 Python 시작, onnxruntime import, 세션 생성 비용을 반복하지 않도록
+    Node 서버가 이 프로세스를 한 번 띄워 두고 계속 재사용합니다.
+    동시에 들어온 요청은 모델별 MicroBatcher가 (N, 200, 3) 배치 하나로 묶어 예측합니다.
+    모델 파일이 바뀌면 백그라운드에서 새로 로드한 뒤 교체합니다 (PREDICT_RELOAD_INTERVAL).
+    """
+    streams, stream_error = load_stream_sessions()
+    registry.start_watching(RELOAD_INTERVAL)
+    
+    write_message({
+        "type": "ready",
+        "model": onnx_model_path,
+        "categories": model_categories(),
+        "error": registry.error(),
+        "models": registry.describe()
+    })
+    
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
         
-        # 디버깅: 예측 결과 출력
-        print(f"[디버깅] 예측 클래스: {predicted_class}, 확률: {confidence:.4f}, 전체 확률 합: {np.sum(probabilities):.4f}", file=sys.stderr)
-        print(f"[디버깅] 전체 확률 분포: {dict(zip(CATEGORIES, [float(p) for p in probabilities]))}", file=sys.stderr)
+        try:
+            with stage_seconds.time(stage="parse"):
+                request = json_loads(line)
+        except json.JSONDecodeError as e:
+            requests_total.inc(type="invalid")
+            errors_total.inc(kind="invalid_json")
+            write_message({"id": None, "type": "error", "error": f"잘못된 JSON: {e}"})
+            continue
+        if not isinstance(request, dict):
+            requests_total.inc(type="invalid")
+            errors_total.inc(kind="invalid_request")
+            write_message({"id": None, "type": "error", "error": "요청은 JSON 객체여야 합니다."})
+            continue
         
-        all_probabilities = {
-            category: float(prob) for category, prob in zip(CATEGORIES, probabilities)
-        }
+        if request.get("type") == "shutdown":
+            break
         
-        result = {
-            "predictedClass": predicted_class,
-            "confidence": confidence,
-            "allProbabilities": all_probabilities
+        handle_request(request, streams, stream_error)
+    
+    # 이미 받은 요청은 모두 처리한 뒤 종료
+    registry.close()
+
+def available_cpus():
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def pool_worker(index):
+    """
+    프로세스 풀 워커 1개: fork 이후 모델을 로드하고 상주 워커와 같은 루프로 요청 처리 (stdin/stdout이 풀 소켓에 연결됨)
+    """
+    # 로그 앞에 워커 번호 표시
+    for handler in logging.getLogger().handlers:
+        handler.setFormatter(logging.Formatter(f"[w{index}] %(message)s"))
+    load_models()
+    serve()
+
+def combine_metrics(request, replies):
+    """
+    모든 워커의 계측 스냅샷을 합쳐 metrics 응답 생성 (카운터와 히스토그램은 합산)
+    """
+    snapshot = merge_snapshots([reply["metrics"] for reply in replies.values() if reply is not None])
+    if request.get("format") == "prometheus":
+        return {"type": "metrics", "text": snapshot_prometheus_text(snapshot)}
+    return {"type": "metrics", "metrics": snapshot}
+
+def serve_pool():
+    """
+    프로세스 풀 모드: 상주 워커 POOL_WORKERS개를 미리 fork하고 Unix 소켓(POOL_SOCKET) 1개로 요청을 분배
+    
+    하나의 프로세스에서는 요청마다 실행되는 전처리/후처리(JSON, base64, RDP 단순화 등)가 GIL에 묶여
+    작은 요청이 많이 동시에 들어와도 코어를 다 쓰지 못하므로, 워커 프로세스마다 ONNX Runtime 세션을 두고
+    워커별 연산자 내부 스레드 수를 제한해 코어를 나눠 씁니다.
+    모델 파일은 fork 전에 한 번만 읽어 두어 워커들이 읽기 전용으로 공유하고 (src/inference.py의 preload_model),
+    종료된 워커는 다시 fork합니다 (src/worker_pool.py).
+    """
+    from src.worker_pool import WorkerPool
+    
+    num_workers = POOL_WORKERS or available_cpus()
+    os.environ.setdefault("ORT_INTRA_OP_THREADS", str(max(1, available_cpus() // num_workers)))
+    
+    # 워커마다 반복하지 않도록 fork 전에 모델 파일을 읽고 onnxruntime을 import (세션은 워커에서 생성)
+    onnx_paths = [path for _, path in map(parse_model_spec, model_specs) if path.endswith(".onnx")]
+    if os.path.exists(stream_model_path()):
+        onnx_paths.append(stream_model_path())
+    for path in onnx_paths:
+        if os.path.exists(path):
+            preload_model(path)
+    if onnx_paths:
+        import onnxruntime  # noqa: F401
+    
+    def combine_stats(request, replies):
+        # 워커별 stats 응답 (응답하지 못한 워커는 None) + 풀 상태 (워커별 pid, 처리 중인 요청 수, 재시작 횟수 등)
+        return {
+            "type": "stats",
+            "workers": [
+                None if replies.get(worker.index) is None
+                else {key: value for key, value in replies[worker.index].items() if key not in ("id", "type")}
+                for worker in pool.workers
+            ],
+            "pool": pool.describe()
         }
-        
-        # JSON으로 출력
-        print(json.dumps(result))
-        
-    except Exception as e:
-        result = {
-            "predictedClass": "",
-            "confidence": 0.0,
-            "allProbabilities": {category: 0.0 for category in CATEGORIES},
-            "error": str(e)
+    
+    pool = WorkerPool(
+        pool_worker,
+        num_workers,
+        POOL_SOCKET,
+        loads=json_loads,
+        dumps=json_dumps,
+        # 증분 예측 세션의 LSTM 상태는 워커 하나에만 있으므로 세션별로 같은 워커 사용
+        affinity=lambda request: request.get("session") if request.get("type") in ("stream", "stream_end") else None,
+        broadcast={
+            "metrics": (lambda request: {"type": "metrics"}, combine_metrics),
+            "stats": (lambda request: {"type": "stats"}, combine_stats),
         }
-        print(json.dumps(result))
+    )
+    logger.info(
+        f"✅ 프로세스 풀 시작: 워커 {num_workers}개, 워커별 intra-op 스레드 {os.environ['ORT_INTRA_OP_THREADS']}개, "
+        f"소켓 {POOL_SOCKET}"
+    )
+    try:
+        pool.serve_forever()
+    except RuntimeError as e:
+        # 다른 풀이 이미 같은 소켓을 사용 중
+        logger.error(f"❌ {e}")
         sys.exit(1)
+    logger.info("프로세스 풀 종료")
 
 if __name__ == "__main__":
-    main()
-
+    if POOL:
+        serve_pool()
+    else:
+        load_models()
+        if SERVING:
+            serve()
+        else:
+            main()
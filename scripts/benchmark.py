@@ -0,0 +1,507 @@
+"""
+전처리, 데이터 로드, 추론 성능 벤치마크
+
+네트워크 없이 QuickDraw 형식의 합성 그림(획 수/획당 점 수 조절 가능)을 만들어 측정하고,
+결과를 JSON으로 저장합니다. --baseline으로 이전 결과를 주면 느려진 항목을 표시합니다.
+
+사용법:
+    python scripts/benchmark.py [--output benchmark.json] [--baseline 이전결과.json]
+                                [--strokes 5] [--points 20] [--items 2000]
+                                [--onnx models/quickdraw_rnn.onnx] [--keras models/quickdraw_rnn.keras]
+                                [--skip keras,api] [--api-pool-workers 4]
+
+측정 항목:
+    preprocess  drawing_to_sequence / drawings_to_sequences 처리량 (그림/초, 단순화 포함/미포함)
+    loading     load_category_ndjson, load_dataset (직렬/병렬/캐시) MB/s
+    onnx        ONNX 단건/배치 추론 지연 시간 (p50/p95/p99)
+    keras       Keras 단건/배치 추론 지연 시간 (p50/p95/p99)
+    api         predict_api.py 요청 지연 시간 (1회 실행 모드, 상주 워커 순차/동시 요청,
+                --api-pool-workers를 주면 프로세스 풀(--pool) 동시 요청)
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import platform
+import argparse
+import tempfile
+import subprocess
+import threading
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+from src import data_loader
+from src.inference import load_session
+
+CATEGORIES = ["cat", "dog", "airplane", "car", "bird"]
+SECTIONS = ("preprocess", "loading", "onnx", "keras", "api")
+
+def make_drawing(rng, n_strokes, n_points):
+    """
+    QuickDraw 형식 합성 그림 1개: [[x 좌표들], [y 좌표들]] 획 목록 (0~255 정수 좌표)
+    """
+    drawing = []
+    for _ in range(n_strokes):
+        # 임의 시작점에서 작은 보폭으로 이어지는 획
+        start = rng.integers(0, 256, size=2)
+        steps = rng.integers(-12, 13, size=(n_points, 2))
+        points = np.clip(start + np.cumsum(steps, axis=0), 0, 255)
+        drawing.append([points[:, 0].tolist(), points[:, 1].tolist()])
+    return drawing
+
+def make_drawings(count, n_strokes, n_points, seed=0):
+    rng = np.random.default_rng(seed)
+    return [make_drawing(rng, n_strokes, n_points) for _ in range(count)]
+
+def write_ndjson(path, category, drawings):
+    """
+    합성 그림을 QuickDraw simplified ndjson 형식으로 저장
+    """
+    with open(path, 'w') as f:
+        for idx, drawing in enumerate(drawings):
+            f.write(json.dumps({
+                "word": category,
+                "countrycode": "KR",
+                "timestamp": "2017-03-01 00:00:00.00000 UTC",
+                "recognized": True,
+                "key_id": str(idx),
+                "drawing": drawing
+            }) + "\n")
+
+def summarize(timings_ms):
+    """
+    지연 시간 목록(ms) → 평균/p50/p95/p99
+    """
+    timings_ms = np.asarray(timings_ms, dtype=np.float64)
+    p50, p95, p99 = np.percentile(timings_ms, [50, 95, 99])
+    return {
+        "runs": int(len(timings_ms)),
+        "meanMs": float(timings_ms.mean()),
+        "p50Ms": float(p50),
+        "p95Ms": float(p95),
+        "p99Ms": float(p99),
+    }
+
+def time_call(fn, repeat):
+    """
+    fn을 repeat번 실행한 시간(초) 중 최솟값
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def bench_preprocess(drawings, repeat):
+    single = time_call(lambda: [data_loader.drawing_to_sequence(d) for d in drawings], repeat)
+    batched = time_call(lambda: data_loader.drawings_to_sequences(drawings), repeat)
+    simplified = time_call(lambda: data_loader.drawings_to_sequences(drawings, simplify=True), repeat)
+    return {
+        "drawings": len(drawings),
+        "drawingToSequencePerSec": len(drawings) / single,
+        "drawingsToSequencesPerSec": len(drawings) / batched,
+        "drawingsToSequencesSimplifyPerSec": len(drawings) / simplified,
+    }
+
+def bench_loading(raw_dir, cache_root, categories, repeat, num_workers):
+    """
+    ndjson 파싱 처리량 (MB/s, 샘플/초)
+    """
+    paths = [os.path.join(raw_dir, f"{category}.ndjson") for category in categories]
+    total_mb = sum(os.path.getsize(path) for path in paths) / (1024 * 1024)
+    category_mb = os.path.getsize(paths[0]) / (1024 * 1024)
+    
+    X, _ = data_loader.load_category_ndjson(paths[0], 0)
+    category_time = time_call(lambda: data_loader.load_category_ndjson(paths[0], 0), repeat)
+    serial_time = time_call(lambda: data_loader.load_dataset(categories, base_path=raw_dir), repeat)
+    parallel_time = time_call(
+        lambda: data_loader.load_dataset(categories, base_path=raw_dir, num_workers=num_workers),
+        repeat
+    )
+    
+    # 캐시: 첫 실행(생성) 이후 memmap으로 여는 시간
+    cache_dir = os.path.join(cache_root, "cache")
+    build_time = time_call(lambda: data_loader.load_dataset(categories, base_path=raw_dir, cache_dir=cache_dir), 1)
+    cached_time = time_call(lambda: data_loader.load_dataset(categories, base_path=raw_dir, cache_dir=cache_dir), repeat)
+    
+    # 줄 오프셋 인덱스로 클래스당 10%만 무작위 표본 추출 (인덱스 생성은 첫 실행에 포함)
+    sample_items = max(1, len(X) // 10)
+    index_time = time_call(lambda: [data_loader.build_line_index(path) for path in paths], 1)
+    sampled_time = time_call(
+        lambda: data_loader.load_dataset(categories, base_path=raw_dir, max_items=sample_items, sample="random", seed=0),
+        repeat
+    )
+    
+    samples = len(X) * len(categories)
+    return {
+        "totalMB": total_mb,
+        "samples": samples,
+        "numWorkers": num_workers,
+        "loadCategoryNdjsonMBPerSec": category_mb / category_time,
+        "loadDatasetMBPerSec": total_mb / serial_time,
+        "loadDatasetParallelMBPerSec": total_mb / parallel_time,
+        "loadDatasetCacheBuildMBPerSec": total_mb / build_time,
+        "loadDatasetCachedMBPerSec": total_mb / cached_time,
+        "loadDatasetSamplesPerSec": samples / serial_time,
+        "lineIndexBuildMBPerSec": total_mb / index_time,
+        "loadDatasetSampled10pctMs": sampled_time * 1000.0,
+        "loadDatasetSampled10pctSpeedup": serial_time / sampled_time,
+    }
+
+def bench_predict_fn(predict, X, batch_sizes, runs):
+    """
+    predict((N, 200, 3) 배열)의 배치 크기별 지연 시간
+    """
+    results = {}
+    for batch_size in batch_sizes:
+        batch = X[:batch_size]
+        predict(batch)  # 워밍업
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            predict(batch)
+            timings.append((time.perf_counter() - start) * 1000.0)
+        summary = summarize(timings)
+        summary["samplesPerSec"] = len(batch) / (summary["meanMs"] / 1000.0)
+        results[f"batch{len(batch)}"] = summary
+    return results
+
+def bench_onnx(model_path, X, batch_sizes, runs):
+    session, loaded_path = load_session(model_path)
+    input_name = session.get_inputs()[0].name
+    
+    def predict(batch):
+        return session.run(None, {input_name: batch})[0]
+    
+    return {"model": loaded_path, "latency": bench_predict_fn(predict, X, batch_sizes, runs)}
+
+def bench_keras(model_path, X, batch_sizes, runs):
+    from tensorflow import keras
+    import src.model  # conv 구조의 커스텀 레이어 등록 (load_model용)
+    model = keras.models.load_model(model_path)
+    
+    def predict(batch):
+        # model.predict는 호출마다 tf.data 설정 비용이 있어 서빙 경로와 같은 직접 호출로 측정
+        return model(batch, training=False).numpy()
+    
+    return {"model": model_path, "latency": bench_predict_fn(predict, X, batch_sizes, runs)}
+
+class WorkerClient:
+    """
+    predict_api.py --serve 워커(pool_workers > 0이면 --pool 프로세스 풀)를 띄우고
+    한 줄 JSON 요청/응답을 주고받는 클라이언트 (풀은 임시 디렉토리의 Unix 소켓으로 연결)
+    """
+    
+    def __init__(self, model_path, pool_workers=0):
+        env = dict(os.environ)
+        self.socket_dir = None
+        if pool_workers:
+            self.socket_dir = tempfile.mkdtemp(prefix="predict_pool_")
+            env["PREDICT_POOL_WORKERS"] = str(pool_workers)
+            env["PREDICT_SOCKET"] = os.path.join(self.socket_dir, "pool.sock")
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.join(ROOT_DIR, "predict_api.py"), model_path, "--pool" if pool_workers else "--serve"],
+            cwd=ROOT_DIR,
+            env=env,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            bufsize=1
+        )
+        if pool_workers:
+            self.sock = self._connect(env["PREDICT_SOCKET"])
+            self.reader = self.sock.makefile("r", encoding="utf-8")
+            self.writer = self.sock.makefile("w", encoding="utf-8")
+        else:
+            self.reader, self.writer = self.process.stdout, self.process.stdin
+        self.replies = {}
+        self.closed = False
+        self.ready = threading.Event()
+        self.cond = threading.Condition()
+        threading.Thread(target=self._read, daemon=True).start()
+        self.ready.wait()
+    
+    def _connect(self, socket_path, timeout=120.0):
+        # 풀이 소켓을 열 때까지 대기
+        deadline = time.monotonic() + timeout
+        while True:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(socket_path)
+                return sock
+            except (FileNotFoundError, ConnectionRefusedError):
+                sock.close()
+                if self.process.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError("predict_api.py --pool 소켓에 연결할 수 없습니다.")
+                time.sleep(0.1)
+    
+    def _read(self):
+        for line in self.reader:
+            if not line.startswith("{"):
+                continue
+            message = json.loads(line)
+            if message.get("type") == "ready":
+                self.ready.set()
+                continue
+            with self.cond:
+                self.replies[message.get("id")] = time.perf_counter()
+                self.cond.notify_all()
+        # 워커가 종료되면 기다리던 요청을 깨움
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        self.ready.set()
+    
+    def send(self, request_id, drawing):
+        self.writer.write(json.dumps({"id": request_id, "drawing": drawing}) + "\n")
+        self.writer.flush()
+    
+    def wait(self, request_id):
+        with self.cond:
+            self.cond.wait_for(lambda: request_id in self.replies or self.closed)
+            if request_id not in self.replies:
+                raise RuntimeError("predict_api.py 워커가 응답 전에 종료되었습니다.")
+            return self.replies.pop(request_id)
+    
+    def close(self):
+        if self.socket_dir is None:
+            self.process.stdin.write(json.dumps({"type": "shutdown"}) + "\n")
+            self.process.stdin.close()
+            self.process.wait()
+            return
+        # 풀의 "shutdown"은 연결만 닫으므로 풀은 SIGTERM으로 종료
+        self.writer.close()
+        self.sock.close()
+        self.process.terminate()
+        self.process.wait()
+        shutil.rmtree(self.socket_dir, ignore_errors=True)
+
+def bench_concurrent(client, drawings, first_id, requests, concurrency):
+    """
+    concurrency개씩 한꺼번에 보내고 모두 응답을 받은 뒤 다음 묶음을 보내는 동시 요청 지연 시간/처리량
+    """
+    timings = []
+    total_start = time.perf_counter()
+    for burst_start in range(first_id, first_id + requests, concurrency):
+        ids = range(burst_start, min(burst_start + concurrency, first_id + requests))
+        sent = {}
+        for request_id in ids:
+            sent[request_id] = time.perf_counter()
+            client.send(request_id, drawings[request_id % len(drawings)])
+        for request_id in ids:
+            timings.append((client.wait(request_id) - sent[request_id]) * 1000.0)
+    summary = summarize(timings)
+    summary["concurrency"] = concurrency
+    summary["requestsPerSec"] = len(timings) / (time.perf_counter() - total_start)
+    return summary
+
+def bench_api(model_path, drawings, requests, concurrency, oneshot_runs, pool_workers=0):
+    """
+    predict_api.py 요청 지연 시간 (Python 시작과 모델 로드가 포함된 1회 실행 모드 vs 상주 워커 vs 프로세스 풀)
+    """
+    results = {}
+    
+    timings = []
+    for run_idx in range(oneshot_runs):
+        payload = json.dumps({"drawing": drawings[run_idx % len(drawings)]})
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, os.path.join(ROOT_DIR, "predict_api.py"), model_path],
+            cwd=ROOT_DIR,
+            input=payload,
+            capture_output=True,
+            text=True,
+            check=True
+        )
+        timings.append((time.perf_counter() - start) * 1000.0)
+    results["oneShot"] = summarize(timings)
+    
+    start = time.perf_counter()
+    client = WorkerClient(model_path)
+    results["workerStartupMs"] = (time.perf_counter() - start) * 1000.0
+    try:
+        # 순차 요청: 요청 1개씩 응답을 받은 뒤 다음 요청
+        timings = []
+        for request_id in range(requests):
+            start = time.perf_counter()
+            client.send(request_id, drawings[request_id % len(drawings)])
+            timings.append((client.wait(request_id) - start) * 1000.0)
+        results["workerSequential"] = summarize(timings)
+        
+        # 동시 요청: concurrency개씩 한꺼번에 보내 마이크로 배칭 효과 측정
+        results["workerConcurrent"] = bench_concurrent(client, drawings, requests, requests, concurrency)
+    finally:
+        client.close()
+    
+    if pool_workers:
+        # 프로세스 풀: 같은 동시 요청을 워커 pool_workers개에 분배
+        start = time.perf_counter()
+        client = WorkerClient(model_path, pool_workers)
+        results["poolStartupMs"] = (time.perf_counter() - start) * 1000.0
+        try:
+            summary = bench_concurrent(client, drawings, 0, requests, concurrency)
+            summary["workers"] = pool_workers
+            results["poolConcurrent"] = summary
+        finally:
+            client.close()
+    return results
+
+def flatten(report, prefix=""):
+    """
+    중첩 dict → {"a.b.c": 숫자} (기준 결과와 비교용)
+    """
+    items = {}
+    for key, value in report.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            items.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            items[name] = value
+    return items
+
+def compare(report, baseline, tolerance):
+    """
+    기준 결과 대비 tolerance 이상 나빠진 항목 목록
+    
+    "...PerSec"는 클수록, "...Ms"는 작을수록 좋은 값으로 판단합니다.
+    """
+    current = flatten(report["results"])
+    previous = flatten(baseline.get("results", {}))
+    regressions = []
+    for name, value in sorted(current.items()):
+        old = previous.get(name)
+        if not old:
+            continue
+        if name.endswith("PerSec"):
+            change = (old - value) / old
+        elif name.endswith("Ms"):
+            change = (value - old) / old
+        else:
+            continue
+        if change > tolerance:
+            regressions.append({"metric": name, "baseline": old, "current": value, "change": change})
+    return regressions
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="QuickDraw 전처리/로드/추론 벤치마크")
+    parser.add_argument("--output", default="benchmark.json", help="결과 JSON 저장 경로")
+    parser.add_argument("--baseline", default=None, help="비교할 이전 결과 JSON")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="회귀로 판단할 악화 비율 (0.2 = 20%%)")
+    parser.add_argument("--strokes", type=int, default=5, help="합성 그림당 획 수")
+    parser.add_argument("--points", type=int, default=20, help="획당 점 수")
+    parser.add_argument("--items", type=int, default=2000, help="카테고리당 합성 그림 수")
+    parser.add_argument("--repeat", type=int, default=3, help="처리량 측정 반복 횟수 (최고 기록 사용)")
+    parser.add_argument("--runs", type=int, default=200, help="지연 시간 측정 횟수")
+    parser.add_argument("--batch-sizes", default="1,8,32,64", help="추론 배치 크기 목록")
+    parser.add_argument("--num-workers", type=int, default=os.cpu_count(), help="병렬 로드 프로세스 수")
+    parser.add_argument("--onnx", default="models/quickdraw_rnn.onnx", help="ONNX 모델 경로")
+    parser.add_argument("--keras", default="models/quickdraw_rnn.keras", help="Keras 모델 경로")
+    parser.add_argument("--api-requests", type=int, default=200, help="상주 워커 요청 수")
+    parser.add_argument("--api-concurrency", type=int, default=16, help="동시 요청 수")
+    parser.add_argument("--oneshot-runs", type=int, default=3, help="1회 실행 모드 측정 횟수")
+    parser.add_argument("--api-pool-workers", type=int, default=0, help="프로세스 풀(--pool) 워커 수 (0이면 측정 안 함)")
+    parser.add_argument("--skip", default="", help=f"건너뛸 항목 (쉼표 구분: {','.join(SECTIONS)})")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    skip = {name.strip() for name in args.skip.split(",") if name.strip()}
+    batch_sizes = [int(size) for size in args.batch_sizes.split(",")]
+    onnx_path = os.path.abspath(args.onnx)
+    keras_path = os.path.abspath(args.keras)
+    
+    print(f"합성 그림 생성: 카테고리 {len(CATEGORIES)}개 × {args.items:,}개 (획 {args.strokes}개 × 점 {args.points}개)")
+    drawings = make_drawings(args.items, args.strokes, args.points)
+    X = data_loader.drawings_to_sequences(drawings[:max(batch_sizes)])
+    
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "cpuCount": os.cpu_count(),
+            "numpy": np.__version__,
+        },
+        "config": {
+            "strokes": args.strokes,
+            "points": args.points,
+            "items": args.items,
+            "batchSizes": batch_sizes,
+            "runs": args.runs,
+            "ortEnv": {key: value for key, value in os.environ.items() if key.startswith("ORT_")},
+        },
+        "results": {},
+        "skipped": {},
+    }
+    results = report["results"]
+    
+    if "preprocess" not in skip:
+        print("전처리 측정 중...")
+        results["preprocess"] = bench_preprocess(drawings, args.repeat)
+    
+    if "loading" not in skip:
+        print("데이터 로드 측정 중...")
+        work_dir = tempfile.mkdtemp(prefix="quickdraw_bench_")
+        try:
+            raw_dir = os.path.join(work_dir, "raw")
+            os.makedirs(raw_dir)
+            for idx, category in enumerate(CATEGORIES):
+                write_ndjson(
+                    os.path.join(raw_dir, f"{category}.ndjson"),
+                    category,
+                    make_drawings(args.items, args.strokes, args.points, seed=idx + 1)
+                )
+            results["loading"] = bench_loading(raw_dir, work_dir, CATEGORIES, args.repeat, args.num_workers)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    
+    for section, path, bench in (("onnx", onnx_path, bench_onnx), ("keras", keras_path, bench_keras)):
+        if section in skip:
+            continue
+        if not os.path.exists(path):
+            report["skipped"][section] = f"모델 파일 없음: {path}"
+            continue
+        print(f"{section} 추론 측정 중...")
+        try:
+            results[section] = bench(path, X, batch_sizes, args.runs)
+        except ImportError as e:
+            report["skipped"][section] = str(e)
+    
+    if "api" not in skip:
+        if os.path.exists(onnx_path):
+            print("predict_api.py 요청 지연 시간 측정 중...")
+            results["api"] = bench_api(
+                onnx_path, drawings, args.api_requests, args.api_concurrency, args.oneshot_runs, args.api_pool_workers
+            )
+        else:
+            report["skipped"]["api"] = f"모델 파일 없음: {onnx_path}"
+    
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["regressions"] = compare(report, json.load(f), args.tolerance)
+    
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    
+    print("\n" + "="*70)
+    for name, value in flatten(results).items():
+        if name.endswith(("PerSec", "p50Ms", "p95Ms", "p99Ms")):
+            print(f"  {name:55s} {value:12.2f}")
+    print("="*70)
+    print(f"✓ 결과 저장: {args.output}")
+    
+    regressions = report.get("regressions", [])
+    if regressions:
+        print(f"\n⚠️  기준 대비 {args.tolerance*100:.0f}% 이상 느려진 항목 {len(regressions)}개:")
+        for item in regressions:
+            print(f"  {item['metric']}: {item['baseline']:.2f} → {item['current']:.2f} ({item['change']*100:+.1f}%)")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+모델 구조(bilstm / lstm / conv / conv_lstm)별 정확도, 파라미터 수, CPU 지연 시간 비교 스크립트
+
+같은 학습/평가 데이터로 구조마다 짧게 학습한 뒤 ONNX로 변환해
+onnxruntime CPU 지연 시간(단건 / 배치 64)을 측정합니다.
+--budget-ms를 주면 단건 p50 지연 시간이 예산 안에 드는 구조 중 정확도가 가장 높은 것을 추천합니다.
+
+사용법:
+    python scripts/compare_architectures.py [--architectures bilstm conv conv_lstm] [--epochs 5]
+                                            [--train-items 2000] [--eval-items 500]
+                                            [--budget-ms 2.0] [--report models/architectures.json]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+import onnxruntime as ort
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src import data_loader
+from src.model import ARCHITECTURES, build_model
+from src.registry import save_categories
+from convert_to_onnx import convert_to_onnx
+from quantize_onnx import measure_latency, predict_all
+
+CATEGORIES = ["cat", "dog", "airplane", "car", "bird"]
+
+def load_split(categories, data_dir, train_items, eval_items):
+    """
+    클래스별로 앞쪽 train_items개는 학습용, 나머지 eval_items개는 평가용으로 나눠 로드
+    
+    Returns:
+        (X_train, y_train, X_eval, y_eval) - 데이터가 없으면 None
+    """
+    try:
+        X, y = data_loader.load_dataset(
+            categories,
+            base_path=data_dir,
+            max_items=train_items + eval_items
+        )
+    except FileNotFoundError as e:
+        print(f"⚠️  학습 데이터를 찾을 수 없습니다: {e}")
+        return None
+    
+    train_idx = []
+    eval_idx = []
+    for label in range(len(categories)):
+        idx = np.flatnonzero(y == label)
+        train_idx.extend(idx[:train_items])
+        eval_idx.extend(idx[train_items:])
+    train_idx = np.random.default_rng(0).permutation(train_idx)
+    return X[train_idx], y[train_idx], X[eval_idx], y[eval_idx]
+
+def compare_architecture(architecture, categories, split, output_dir, epochs, batch_size, runs):
+    """
+    구조 1개 학습 → ONNX 변환 → 정확도/파라미터 수/지연 시간 측정
+    """
+    print("\n" + "-"*70)
+    print(f"구조: {architecture}")
+    print("-"*70)
+    X_train, y_train, X_eval, y_eval = split
+    
+    model = build_model(len(categories), architecture=architecture)
+    report = {
+        "architecture": architecture,
+        "parameters": int(model.count_params()),
+        "trainSamplesPerSec": None,
+        "accuracy": None,
+    }
+    
+    if y_train is not None:
+        start = time.perf_counter()
+        model.fit(X_train, y_train, batch_size=batch_size, epochs=epochs, verbose=2)
+        report["trainSamplesPerSec"] = len(X_train) * epochs / (time.perf_counter() - start)
+    
+    keras_path = os.path.join(output_dir, f"quickdraw_{architecture}.keras")
+    onnx_path = os.path.join(output_dir, f"quickdraw_{architecture}.onnx")
+    model.save(keras_path)
+    save_categories(keras_path, categories)
+    convert_to_onnx(keras_path, onnx_path, dynamic_length=True)
+    
+    session = ort.InferenceSession(onnx_path, providers=["CPUExecutionProvider"])
+    report["path"] = onnx_path
+    report["sizeBytes"] = os.path.getsize(onnx_path)
+    report["latency"] = {
+        "single": measure_latency(session, X_eval, 1, runs),
+        "batched": measure_latency(session, X_eval, 64, max(runs // 4, 5)),
+    }
+    if y_eval is not None:
+        predictions = predict_all(session, X_eval)
+        report["accuracy"] = float(np.mean(np.argmax(predictions, axis=1) == y_eval))
+    return report
+
+def recommend(reports, budget_ms):
+    """
+    단건 p50 지연 시간이 budget_ms 이하인 구조 중 정확도(정확도가 없으면 지연 시간)가 가장 좋은 구조
+    """
+    candidates = [r for r in reports if r["latency"]["single"]["p50Ms"] <= budget_ms]
+    if not candidates:
+        return None
+    if all(r["accuracy"] is not None for r in candidates):
+        return max(candidates, key=lambda r: r["accuracy"])["architecture"]
+    return min(candidates, key=lambda r: r["latency"]["single"]["p50Ms"])["architecture"]
+
+def print_report(report):
+    print("\n" + "="*70)
+    print(f"구조 비교 (평가 샘플 {report['evalSamples']:,}개, {report['epochs']} epoch)")
+    print("="*70)
+    for model in report["architectures"]:
+        accuracy = f"{model['accuracy']*100:.2f}%" if model["accuracy"] is not None else "-"
+        print(
+            f"  {model['architecture']:10s} 파라미터 {model['parameters']:>9,} | 정확도 {accuracy:>7s} | "
+            f"단건 {model['latency']['single']['p50Ms']:.2f} ms | "
+            f"배치(64) {model['latency']['batched']['p50Ms']:.2f} ms"
+        )
+    if report["budgetMs"] is not None:
+        choice = report["recommended"] or "없음 (예산 안에 드는 구조가 없습니다)"
+        print(f"  지연 시간 예산 {report['budgetMs']} ms 추천 구조: {choice}")
+    print("="*70)
+
+def run_comparison(
+    architectures=ARCHITECTURES,
+    categories=CATEGORIES,
+    data_dir="data/raw",
+    output_dir="models/architectures",
+    train_items=2000,
+    eval_items=500,
+    epochs=5,
+    batch_size=64,
+    runs=100,
+    budget_ms=None,
+    report_path=None
+):
+    """
+    구조별 비교 리포트 생성
+    
+    data_dir에 그림이 없으면 학습 없이 임의 입력으로 파라미터 수/지연 시간만 비교합니다.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    split = load_split(categories, data_dir, train_items, eval_items)
+    if split is None:
+        rng = np.random.default_rng(0)
+        X_eval = rng.integers(-20, 21, size=(256, data_loader.MAX_SEQ_LEN, 3)).astype(np.float32) / 255.0
+        X_eval[..., 2] = 0.0
+        split = (None, None, X_eval, None)
+    
+    reports = [
+        compare_architecture(architecture, categories, split, output_dir, epochs, batch_size, runs)
+        for architecture in architectures
+    ]
+    report = {
+        "categories": list(categories),
+        "evalSamples": len(split[2]),
+        "epochs": epochs if split[1] is not None else 0,
+        "budgetMs": budget_ms,
+        "recommended": recommend(reports, budget_ms) if budget_ms is not None else None,
+        "architectures": reports,
+    }
+    print_report(report)
+    
+    if report_path:
+        with open(report_path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"✓ 리포트 저장: {report_path}")
+    return report
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="모델 구조별 정확도/파라미터 수/CPU 지연 시간 비교")
+    parser.add_argument("--architectures", nargs="+", choices=ARCHITECTURES, default=list(ARCHITECTURES), help="비교할 구조")
+    parser.add_argument("--categories", nargs="+", default=CATEGORIES, help="학습/평가 카테고리")
+    parser.add_argument("--data-dir", default="data/raw", help="ndjson 디렉토리")
+    parser.add_argument("--output-dir", default="models/architectures", help="구조별 Keras/ONNX 모델 저장 위치")
+    parser.add_argument("--train-items", type=int, default=2000, help="클래스당 학습 샘플 수")
+    parser.add_argument("--eval-items", type=int, default=500, help="클래스당 평가 샘플 수")
+    parser.add_argument("--epochs", type=int, default=5, help="구조별 학습 epoch 수")
+    parser.add_argument("--batch-size", type=int, default=64, help="학습 배치 크기")
+    parser.add_argument("--runs", type=int, default=100, help="지연 시간 측정 반복 횟수")
+    parser.add_argument("--budget-ms", type=float, default=None, help="단건 p50 지연 시간 예산 (ms), 예산 안의 최고 정확도 구조 추천")
+    parser.add_argument("--report", default=None, help="JSON 리포트 저장 경로")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    run_comparison(
+        architectures=args.architectures,
+        categories=args.categories,
+        data_dir=args.data_dir,
+        output_dir=args.output_dir,
+        train_items=args.train_items,
+        eval_items=args.eval_items,
+        epochs=args.epochs,
+        batch_size=args.batch_size,
+        runs=args.runs,
+        budget_ms=args.budget_ms,
+        report_path=args.report
+    )
@@ -1,23 +1,42 @@
 """
 TensorFlow Keras 모델을 ONNX 형식으로 변환하는 스크립트
+
+사용법:
+    python scripts/convert_to_onnx.py [--keras 모델.keras] [--output 모델.onnx] [--dynamic-length]
+                                      [--step-output 스텝모델.onnx] [--quantize dynamic|static]
+                                      [--optimize basic|extended|all]
 """
 import os
+import sys
+import argparse
 import tf2onnx
 import onnx
+import tensorflow as tf
 from tensorflow import keras
 
-def convert_to_onnx():
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.model import build_step_model
+from src.inference import save_optimized_model, quantized_model_path
+from src.registry import categories_path, load_categories, save_categories
+from quantize_onnx import run_quantization
+
+def convert_to_onnx(
+    keras_model_path="models/quickdraw_rnn.keras",
+    onnx_model_path="models/quickdraw_rnn.onnx",
+    dynamic_length=False
+):
     """
     TensorFlow Keras 모델을 ONNX 형식으로 변환
     
     모델 로드: models/quickdraw_rnn.keras
     저장 경로: models/quickdraw_rnn.onnx
     Opset 버전: 17
-    """
-    # 모델 경로 설정
-    keras_model_path = "models/quickdraw_rnn.keras"
-    onnx_model_path = "models/quickdraw_rnn.onnx"
     
+    배치 축은 항상 동적(None)으로 내보내 predict_api.py가 (N, 200, 3) 배치를 한 번에 실행할 수 있게 합니다.
+    dynamic_length=True이거나 모델의 시간 축이 None이면 시간 축도 동적으로 내보내,
+    predict_api.py가 그림의 실제 길이(버킷 길이)만큼만 실행할 수 있게 합니다.
+    LSTM 가중치는 길이와 무관하므로 200 고정으로 학습한 모델도 동적 길이로 내보낼 수 있습니다.
+    """
     # 모델 디렉토리 확인
     if not os.path.exists(keras_model_path):
         raise FileNotFoundError(f"모델 파일을 찾을 수 없습니다: {keras_model_path}")
@@ -31,7 +50,13 @@ def convert_to_onnx():
     print(f"모델 입력 형태: {input_shape}")
     
     # ONNX 출력 디렉토리 생성
-    os.makedirs("models", exist_ok=True)
+    os.makedirs(os.path.dirname(onnx_model_path) or ".", exist_ok=True)
+    
+    # 배치 축을 None으로 고정한 입력 서명 (마이크로 배칭용 동적 배치)
+    seq_len = None if dynamic_length else input_shape[1]
+    input_signature = (
+        tf.TensorSpec((None, seq_len) + tuple(input_shape[2:]), tf.float32, name="masking_input"),
+    )
     
     # ONNX로 변환
     # tf2onnx.convert.from_keras() 사용
@@ -40,11 +65,114 @@ def convert_to_onnx():
         model,
         output_path=onnx_model_path,
         opset=17,
-        input_signature=None  # 자동으로 입력 서명 추론
+        input_signature=input_signature
     )
     
+    # 배치 축이 동적인지 확인
+    input_dims = onnx_model.graph.input[0].type.tensor_type.shape.dim
+    if input_dims[0].HasField("dim_value"):
+        raise RuntimeError(f"ONNX 입력의 배치 축이 고정되어 있습니다: {input_dims[0].dim_value}")
+    print(f"✓ 동적 배치 축 확인: {input_dims[0].dim_param or '?'}")
+    if seq_len is None:
+        if input_dims[1].HasField("dim_value"):
+            raise RuntimeError(f"ONNX 입력의 시간 축이 고정되어 있습니다: {input_dims[1].dim_value}")
+        print(f"✓ 동적 시간 축 확인: {input_dims[1].dim_param or '?'}")
+    
     print(f"Conversion complete: {onnx_model_path}")
+    copy_categories(keras_model_path, onnx_model_path)
+    
+    return model
 
-if __name__ == "__main__":
-    convert_to_onnx()
+def copy_categories(keras_model_path, onnx_model_path):
+    """
+    train.py가 저장한 카테고리 목록(<모델>.categories.json)을 ONNX 모델 옆으로 복사
+    
+    predict_api.py는 이 파일로 출력 순서의 클래스 이름을 정합니다 (없으면 기본 5개 클래스).
+    """
+    if not os.path.exists(categories_path(keras_model_path)):
+        print(f"⚠️  카테고리 파일이 없습니다: {categories_path(keras_model_path)} (predict_api.py 기본 CATEGORIES 사용)")
+        return
+    print(f"✓ 카테고리 저장: {save_categories(onnx_model_path, load_categories(keras_model_path))}")
+
+def convert_step_model(model, step_model_path="models/quickdraw_rnn_stream.onnx"):
+    """
+    단방향 LSTM 모델을 증분(스트리밍) 예측용 스텝 모델로 ONNX 변환
+    
+    입력: points (N, T, 3), state_h (N, units), state_c (N, units)
+    출력: 확률 (N, 클래스 수), state_h, state_c
+    predict_api.py의 "stream" 요청이 이 모델로 새로 추가된 점만 실행합니다.
+    """
+    step_model = build_step_model(model)
+    units = step_model.inputs[1].shape[-1]
+    
+    input_signature = (
+        tf.TensorSpec((None, None, 3), tf.float32, name="points"),
+        tf.TensorSpec((None, units), tf.float32, name="state_h"),
+        tf.TensorSpec((None, units), tf.float32, name="state_c"),
+    )
+    
+    print("스텝 모델 ONNX 변환 중...")
+    os.makedirs(os.path.dirname(step_model_path) or ".", exist_ok=True)
+    tf2onnx.convert.from_keras(
+        step_model,
+        output_path=step_model_path,
+        opset=17,
+        input_signature=input_signature
+    )
+    print(f"Step model conversion complete: {step_model_path}")
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Keras 모델을 ONNX로 변환")
+    parser.add_argument("--keras", default="models/quickdraw_rnn.keras", help="입력 Keras 모델 경로")
+    parser.add_argument("--output", default="models/quickdraw_rnn.onnx", help="출력 ONNX 모델 경로")
+    parser.add_argument(
+        "--dynamic-length",
+        action="store_true",
+        help="시간 축을 동적으로 내보내기 (실제 길이/버킷 길이 추론용)"
+    )
+    parser.add_argument(
+        "--step-output",
+        default=None,
+        help="증분 예측용 스텝 모델 출력 경로 (단방향 'lstm' 모델만 가능)"
+    )
+    parser.add_argument(
+        "--quantize",
+        choices=["dynamic", "static"],
+        default=None,
+        help="INT8 양자화 모델(<출력>.int8.onnx)도 생성하고 float 모델과 비교 리포트 출력"
+    )
+    parser.add_argument("--data-dir", default="data/raw", help="양자화 보정/평가용 ndjson 디렉토리")
+    parser.add_argument("--quantization-report", default=None, help="양자화 비교 리포트(JSON) 저장 경로")
+    parser.add_argument(
+        "--optimize",
+        choices=["basic", "extended", "all"],
+        default=None,
+        help="ONNX Runtime 그래프 최적화를 미리 적용한 <출력>.opt.onnx도 저장 (all은 변환한 CPU 전용)"
+    )
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    model = convert_to_onnx(
+        keras_model_path=args.keras,
+        onnx_model_path=args.output,
+        dynamic_length=args.dynamic_length
+    )
+    if args.step_output:
+        convert_step_model(model, step_model_path=args.step_output)
+    if args.quantize:
+        run_quantization(
+            args.output,
+            mode=args.quantize,
+            data_dir=args.data_dir,
+            report_path=args.quantization_report
+        )
+    if args.optimize:
+        # predict_api.py는 원본보다 최신인 .opt.onnx가 있으면 그것을 로드하고 시작 시 최적화를 생략
+        targets = [args.output]
+        if args.step_output:
+            targets.append(args.step_output)
+        if args.quantize:
+            targets.append(quantized_model_path(args.output))
+        for target in targets:
+            print(f"✓ 최적화 모델 저장 ({args.optimize}): {save_optimized_model(target, graph_optimization=args.optimize)}")
@@ -1,25 +1,190 @@
+"""
+QuickDraw 데이터셋(simplified ndjson) 다운로드 스크립트
+
+사용법:
+    python scripts/download_quickdraw.py [--workers 4] [--output-dir data/raw]
+                                         [--categories cat,dog] [--base-url URL]
+                                         [--manifest data/raw/checksums.json] [--update-manifest]
+
+- 여러 카테고리를 동시에 다운로드합니다 (--workers).
+- 연결이 끊기면 받은 부분(<파일>.part)부터 HTTP Range 요청으로 이어받습니다.
+- 이미 받은 파일은 서버의 크기/ETag와 같으면 건너뜁니다 (data/raw/.download_state.json).
+- --manifest로 SHA-256 체크섬 목록을 주면 파일을 검증하고, --update-manifest로 목록을 갱신합니다.
+- --base-url(또는 QUICKDRAW_BASE_URL)로 로컬 HTTP 서버 등 다른 주소에서 받을 수 있습니다.
+"""
 import os
+import json
+import time
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import requests
 from tqdm import tqdm
 
-def download_file(url, filepath):
-    """Download a file from URL with progress bar."""
-    response = requests.get(url, stream=True)
+BASE_URL = "https://storage.googleapis.com/quickdraw_dataset/full/simplified"
+CHUNK_SIZE = 1024 * 1024  # 1 MB 단위로 받아서 쓰기
+STATE_FILE = ".download_state.json"
+
+_local = threading.local()
+_state_lock = threading.Lock()
+
+def get_session():
+    """Return a requests.Session for the current thread (connection reuse per worker)."""
+    if not hasattr(_local, "session"):
+        _local.session = requests.Session()
+    return _local.session
+
+def load_json(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def save_json(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def sha256_file(filepath, chunk_size=CHUNK_SIZE):
+    """Compute the SHA-256 hex digest of a file."""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def remote_info(url, timeout=30):
+    """HEAD the URL and return (size or None, ETag or None)."""
+    response = get_session().head(url, allow_redirects=True, timeout=timeout)
     response.raise_for_status()
+    size = response.headers.get('content-length')
+    return (int(size) if size is not None else None), response.headers.get('etag')
+
+def is_complete(filepath, size, etag, state):
+    """Whether a local file already matches the remote size and ETag."""
+    if not os.path.exists(filepath):
+        return False
+    if size is not None and os.path.getsize(filepath) != size:
+        return False
+    recorded = state.get(os.path.basename(filepath), {})
+    if etag is not None and recorded.get("etag") not in (None, etag):
+        return False
+    return size is not None or etag is not None
+
+def download_file(url, filepath, size=None, etag=None, chunk_size=CHUNK_SIZE, position=0, timeout=60):
+    """
+    Download a file from URL with progress bar, resuming <filepath>.part with a Range request.
+    
+    If the server ignores the Range header (200 instead of 206) or the
+    remote file changed (If-Range with the ETag fails), the download starts over.
+    A .part that already has every byte (interrupted before the rename) is
+    renamed without downloading; the caller verifies the checksum.
+    """
+    part_path = f"{filepath}.part"
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    if size is not None and offset > size:
+        offset = 0
+    if offset and offset == size:
+        # Range: bytes=<크기>- 요청은 416이 되므로 요청하지 않고 완료 처리
+        os.replace(part_path, filepath)
+        return
+    
+    headers = {}
+    if offset:
+        headers['Range'] = f"bytes={offset}-"
+        if etag and not etag.startswith("W/"):  # If-Range에는 강한 ETag만 사용 가능
+            headers['If-Range'] = etag
+    
+    with get_session().get(url, stream=True, headers=headers, timeout=timeout) as response:
+        if offset and response.status_code == 416:
+            # 요청 범위가 파일 끝 이후 (Content-Range: bytes */<전체 크기>): .part가 이미 전체 파일이면 완료
+            remote_size = response.headers.get('content-range', '').rpartition('/')[2]
+            if not remote_size.isdigit() or int(remote_size) == offset:
+                os.replace(part_path, filepath)
+                return
+            # .part가 원격 파일보다 큼 (파일이 바뀜): 처음부터 다시 받기
+            os.remove(part_path)
+            return download_file(url, filepath, size=size, etag=etag, chunk_size=chunk_size, position=position, timeout=timeout)
+        response.raise_for_status()
+        if offset and response.status_code != 206:
+            offset = 0  # 서버가 이어받기를 지원하지 않거나 파일이 바뀜
+        
+        total_size = size
+        if total_size is None and response.headers.get('content-length') is not None:
+            total_size = offset + int(response.headers['content-length'])
+        
+        with open(part_path, 'ab' if offset else 'wb') as f, tqdm(
+            desc=os.path.basename(filepath),
+            total=total_size,
+            initial=offset,
+            unit='B',
+            unit_scale=True,
+            unit_divisor=1024,
+            position=position,
+            leave=False,
+        ) as pbar:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                if chunk:
+                    f.write(chunk)
+                    pbar.update(len(chunk))
+    
+    received = os.path.getsize(part_path)
+    if total_size is not None and received != total_size:
+        raise requests.exceptions.ConnectionError(
+            f"incomplete download: {received}/{total_size} bytes"
+        )
+    os.replace(part_path, filepath)
+
+def fetch_category(category, base_url, output_dir, state, manifest, chunk_size, retries, position):
+    """
+    카테고리 파일 1개 다운로드 (완료된 파일 건너뛰기, 실패 시 이어받기로 재시도, 체크섬 검증)
+    
+    Returns:
+        "downloaded" 또는 "skipped"
+    """
+    filename = f"{category}.ndjson"
+    url = f"{base_url}/{filename}"
+    filepath = os.path.join(output_dir, filename)
+    
+    for attempt in range(1, retries + 1):
+        try:
+            size, etag = remote_info(url)
+            if is_complete(filepath, size, etag, state):
+                status = "skipped"
+            else:
+                download_file(url, filepath, size=size, etag=etag, chunk_size=chunk_size, position=position)
+                status = "downloaded"
+            break
+        except requests.exceptions.RequestException as e:
+            if attempt == retries or (isinstance(e, requests.exceptions.HTTPError) and e.response.status_code == 404):
+                raise
+            # 받은 부분(.part)은 남겨 두고 잠시 후 이어받기
+            time.sleep(min(2 ** attempt, 30))
     
-    total_size = int(response.headers.get('content-length', 0))
+    expected = manifest.get(filename)
+    checksum = sha256_file(filepath) if (expected or status == "downloaded") else state.get(filename, {}).get("sha256")
+    if expected and checksum != expected:
+        os.remove(filepath)
+        raise ValueError(f"체크섬 불일치: {filename} (기대값 {expected[:12]}…, 실제 {checksum[:12]}…)")
     
-    with open(filepath, 'wb') as f, tqdm(
-        desc=os.path.basename(filepath),
-        total=total_size,
-        unit='B',
-        unit_scale=True,
-        unit_divisor=1024,
-    ) as pbar:
-        for chunk in response.iter_content(chunk_size=8192):
-            if chunk:
-                f.write(chunk)
-                pbar.update(len(chunk))
+    with _state_lock:
+        state[filename] = {"size": os.path.getsize(filepath), "etag": etag, "sha256": checksum}
+        save_json(os.path.join(output_dir, STATE_FILE), state)
+    return status
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="QuickDraw 데이터셋 다운로드")
+    parser.add_argument("--categories", default=None, help="쉼표로 구분한 카테고리 (기본: 아래 CATEGORIES)")
+    parser.add_argument("--output-dir", default="data/raw", help="저장 디렉토리")
+    parser.add_argument("--base-url", default=os.getenv("QUICKDRAW_BASE_URL", BASE_URL), help="다운로드 주소")
+    parser.add_argument("--workers", type=int, default=4, help="동시 다운로드 수")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="쓰기 단위 (바이트)")
+    parser.add_argument("--retries", type=int, default=5, help="파일당 최대 시도 횟수")
+    parser.add_argument("--manifest", default=None, help="SHA-256 체크섬 목록 JSON ({파일명: sha256})")
+    parser.add_argument("--update-manifest", action="store_true", help="받은 파일의 체크섬으로 --manifest 갱신")
+    return parser.parse_args()
 
 def main():
     """
@@ -28,37 +193,63 @@ def main():
     클래스 수를 늘리려면 아래 CATEGORIES 리스트를 수정하세요.
     train.py의 CATEGORIES와 동일하게 맞춰주세요.
     """
+    args = parse_args()
+    
     # ============================================================================
     # 설정: train.py의 CATEGORIES와 동일하게 맞춰주세요
     # ============================================================================
     categories = ["cat", "dog", "airplane", "car", "bird"]
     # 클래스 추가 예시:
     # categories = ["cat", "dog", "airplane", "car", "bird", "house", "tree", "sun", "moon", "star"]
+    if args.categories:
+        categories = [category.strip() for category in args.categories.split(",") if category.strip()]
     
     # Create data/raw directory
-    output_dir = "data/raw"
+    output_dir = args.output_dir
     os.makedirs(output_dir, exist_ok=True)
     print(f"Created directory: {output_dir}")
-    print(f"다운로드할 클래스 수: {len(categories)}")
+    print(f"다운로드할 클래스 수: {len(categories)} (동시 {args.workers}개)")
     print(f"클래스 목록: {', '.join(categories)}")
     print("-"*70)
     
-    # Base URL for QuickDraw dataset
-    base_url = "https://storage.googleapis.com/quickdraw_dataset/full/simplified"
+    state = load_json(os.path.join(output_dir, STATE_FILE))
+    manifest = load_json(args.manifest) if args.manifest and not args.update_manifest else {}
     
-    # Download each category
+    # Download categories concurrently
     success_count = 0
-    for idx, category in enumerate(categories, 1):
-        url = f"{base_url}/{category}.ndjson"
-        filepath = os.path.join(output_dir, f"{category}.ndjson")
-        
-        print(f"\n[{idx}/{len(categories)}] Downloading {category}...")
-        try:
-            download_file(url, filepath)
-            print(f"✓ Successfully downloaded {category}.ndjson")
-            success_count += 1
-        except requests.exceptions.RequestException as e:
-            print(f"✗ Error downloading {category}: {e}")
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as executor:
+        futures = {
+            executor.submit(
+                fetch_category,
+                category,
+                args.base_url.rstrip("/"),
+                output_dir,
+                state,
+                manifest,
+                args.chunk_size,
+                max(1, args.retries),
+                idx % max(1, args.workers)
+            ): category
+            for idx, category in enumerate(categories)
+        }
+        for future in as_completed(futures):
+            category = futures[future]
+            try:
+                status = future.result()
+                label = "이미 완료됨, 건너뜀" if status == "skipped" else "Successfully downloaded"
+                tqdm.write(f"✓ {category}.ndjson ({label})")
+                success_count += 1
+            except (requests.exceptions.RequestException, ValueError) as e:
+                tqdm.write(f"✗ Error downloading {category}: {e}")
+    
+    if args.manifest and args.update_manifest:
+        manifest = load_json(args.manifest)
+        for category in categories:
+            entry = state.get(f"{category}.ndjson")
+            if entry and entry.get("sha256"):
+                manifest[f"{category}.ndjson"] = entry["sha256"]
+        save_json(args.manifest, manifest)
+        print(f"✓ 체크섬 목록 저장: {args.manifest}")
     
     print("\n" + "="*70)
     print(f"Download complete! ({success_count}/{len(categories)} 성공)")
@@ -67,4 +258,3 @@ def main():
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,154 @@
+"""
+BiLSTM/LSTM 모델 가중치를 NumPy 추론 엔진용 .npz로 추출하고 ONNX 출력과 일치하는지 검증하는 스크립트
+
+NumPy 엔진(src/numpy_engine.py)은 TensorFlow/onnxruntime 없이 numpy만으로 예측하므로
+프로세스 시작이 빠르고 설치 용량이 작습니다 (predict.py, predict_api.py 모델.npz, 사이드카/엣지 배포용).
+Masking → LSTM 또는 Bidirectional(LSTM) → Dense 구조("bilstm", "lstm")만 지원합니다.
+
+사용법:
+    python scripts/export_numpy.py [--model models/quickdraw_rnn.onnx | models/quickdraw_rnn.keras]
+                                   [--output models/quickdraw_rnn.npz] [--reference models/quickdraw_rnn.onnx]
+                                   [--data-dir data/raw] [--items 200] [--tolerance 1e-4]
+
+검증: --reference ONNX 모델(기본: .onnx 입력이면 그 모델, .keras 입력이면 옆의 같은 이름 .onnx)과
+같은 입력에 대한 확률을 비교해, 최대 차이가 --tolerance를 넘거나 top-1 예측이 하나라도 다르면 종료 코드 1로 끝납니다.
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src import data_loader
+from src.numpy_engine import NumpyLSTMModel, keras_weights, numpy_model_path, onnx_weights, save_weights
+from src.registry import categories_path, load_categories, save_categories
+
+# 모델 옆에 <이름>.categories.json이 없을 때 사용하는 기본 카테고리
+CATEGORIES = ["cat", "dog", "airplane", "car", "bird"]
+
+def extract_weights(model_path):
+    """
+    .keras 또는 float .onnx 모델에서 LSTM/Dense 가중치 추출
+    """
+    if model_path.endswith(".onnx"):
+        return onnx_weights(model_path)
+    
+    import src.model  # conv 구조의 커스텀 레이어 등록 (지원하지 않는 구조도 로드 후 에러로 안내)
+    from tensorflow import keras
+    return keras_weights(keras.models.load_model(model_path))
+
+def load_check_inputs(categories, data_dir, items):
+    """
+    검증 입력: data_dir의 그림 (없으면 길이가 제각각인 임의 스트로크)
+    """
+    try:
+        X, _ = data_loader.load_dataset(categories, base_path=data_dir, max_items=items)
+        return X, "data"
+    except FileNotFoundError as e:
+        print(f"⚠️  검증 데이터를 찾을 수 없어 임의 입력을 사용합니다: {e}")
+    
+    rng = np.random.default_rng(0)
+    X = np.zeros((256, data_loader.MAX_SEQ_LEN, 3), dtype=np.float32)
+    for row, length in zip(X, rng.integers(1, data_loader.MAX_SEQ_LEN + 1, size=len(X))):
+        row[:length, :2] = rng.integers(-20, 21, size=(length, 2)) / 255.0
+        row[:length, 2] = rng.random(length) < 0.1
+    return X, "random"
+
+def time_ms(fn, runs):
+    fn()  # 워밍업
+    start = time.perf_counter()
+    for _ in range(runs):
+        fn()
+    return (time.perf_counter() - start) / runs * 1000.0
+
+def check_parity(npz_path, reference_path, X, tolerance, runs=20):
+    """
+    NumPy 엔진과 ONNX Runtime의 확률 차이, top-1 일치율, 단건/배치(32) 지연 시간 비교
+    
+    Returns:
+        (통과 여부, 리포트 dict)
+    """
+    import onnxruntime as ort
+    
+    engine = NumpyLSTMModel.load(npz_path)
+    session = ort.InferenceSession(reference_path, providers=["CPUExecutionProvider"])
+    input_name = session.get_inputs()[0].name
+    
+    expected = np.concatenate([
+        session.run(None, {input_name: X[i:i + 256]})[0] for i in range(0, len(X), 256)
+    ])
+    actual = engine.predict(X)
+    diff = np.abs(expected - actual)
+    report = {
+        "samples": len(X),
+        "maxAbsDiff": float(diff.max()),
+        "meanAbsDiff": float(diff.mean()),
+        "top1Agreement": float(np.mean(expected.argmax(axis=1) == actual.argmax(axis=1))),
+        "latencyMs": {
+            f"{backend}_{batch_size}": time_ms(fn, runs)
+            for batch_size in (1, 32)
+            for backend, fn in (
+                ("onnxruntime", lambda b=X[:batch_size]: session.run(None, {input_name: b})),
+                ("numpy", lambda b=X[:batch_size]: engine.run(b)),
+            )
+        },
+    }
+    passed = report["maxAbsDiff"] <= tolerance and report["top1Agreement"] == 1.0
+    return passed, report
+
+def export_numpy(model_path, output_path=None):
+    """
+    가중치 추출 → .npz 저장 → 카테고리 파일 복사
+    
+    Returns:
+        저장한 .npz 경로
+    """
+    output_path = output_path or numpy_model_path(model_path)
+    print(f"가중치 추출 중: {model_path}")
+    weights = extract_weights(model_path)
+    save_weights(output_path, weights)
+    directions = "Bidirectional" if "kernel_1" in weights else "단방향"
+    print(f"✓ NumPy 가중치 저장 ({directions} LSTM, {os.path.getsize(output_path)/1024:.1f} KB): {output_path}")
+    
+    if os.path.exists(categories_path(model_path)):
+        print(f"✓ 카테고리 저장: {save_categories(output_path, load_categories(model_path))}")
+    else:
+        print(f"⚠️  카테고리 파일이 없습니다: {categories_path(model_path)} (predict_api.py 기본 CATEGORIES 사용)")
+    return output_path
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="NumPy 추론 엔진용 가중치(.npz) 추출 및 ONNX 일치 검증")
+    parser.add_argument("--model", default="models/quickdraw_rnn.onnx", help="입력 모델 (.keras 또는 float .onnx)")
+    parser.add_argument("--output", default=None, help="출력 .npz 경로 (기본: <모델>.npz)")
+    parser.add_argument("--reference", default=None, help="검증 기준 ONNX 모델 (기본: 입력 모델 또는 옆의 .onnx)")
+    parser.add_argument("--no-check", action="store_true", help="ONNX 일치 검증 생략")
+    parser.add_argument("--data-dir", default="data/raw", help="검증용 ndjson 디렉토리")
+    parser.add_argument("--items", type=int, default=200, help="클래스당 검증 샘플 수")
+    parser.add_argument("--tolerance", type=float, default=1e-4, help="허용 최대 확률 차이")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    npz_path = export_numpy(args.model, args.output)
+    if args.no_check:
+        sys.exit(0)
+    
+    reference = args.reference or (args.model if args.model.endswith(".onnx") else os.path.splitext(args.model)[0] + ".onnx")
+    if not os.path.exists(reference):
+        print(f"⚠️  검증 기준 ONNX 모델이 없어 검증을 생략합니다: {reference}")
+        sys.exit(0)
+    
+    X, source = load_check_inputs(load_categories(args.model, default=CATEGORIES), args.data_dir, args.items)
+    passed, report = check_parity(npz_path, reference, X, args.tolerance)
+    print("\n" + "="*70)
+    print(f"ONNX 일치 검증 ({reference}, {'데이터' if source == 'data' else '임의 입력'} {report['samples']:,}개)")
+    print("="*70)
+    print(f"  최대 확률 차이: {report['maxAbsDiff']:.2e} (허용 {args.tolerance:.0e}) | 평균 {report['meanAbsDiff']:.2e}")
+    print(f"  top-1 일치율: {report['top1Agreement']*100:.2f}%")
+    latency = report["latencyMs"]
+    print(f"  단건: onnxruntime {latency['onnxruntime_1']:.2f} ms | numpy {latency['numpy_1']:.2f} ms")
+    print(f"  배치(32): onnxruntime {latency['onnxruntime_32']:.2f} ms | numpy {latency['numpy_32']:.2f} ms")
+    print(f"  결과: {'✓ 통과' if passed else '✗ 실패'}")
+    print("="*70)
+    sys.exit(0 if passed else 1)
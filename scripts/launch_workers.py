@@ -0,0 +1,143 @@
+"""
+다중 워커(MultiWorkerMirroredStrategy) 학습 실행 스크립트
+
+train.py는 TF_CONFIG 환경 변수(클러스터 스펙)가 있으면 워커끼리 그래디언트를 all-reduce하는
+동기 데이터 병렬 학습을 합니다. 이 스크립트는 워커마다 TF_CONFIG를 만들어 train.py를 실행합니다.
+
+- 한 머신에서 여러 프로세스: --num-workers N 이면 127.0.0.1의 빈 포트로 워커 N개를 띄우고
+  출력 앞에 [w0], [w1] ...을 붙여 보여 줍니다. 워커 하나가 실패하면 나머지도 종료하고,
+  --max-restarts 만큼 전체를 다시 시작합니다 (train.py의 BACKUP_DIR 백업에서 이어서 학습).
+- 여러 머신: 모든 머신에 같은 --workers 목록을 주고 머신마다 자기 --index로 실행합니다.
+
+사용법:
+    python scripts/launch_workers.py --num-workers 2 [--max-restarts 1] [--script train.py] [-- 스크립트 인자...]
+    python scripts/launch_workers.py --workers host1:23456,host2:23456 --index 0   # host1에서
+    python scripts/launch_workers.py --workers host1:23456,host2:23456 --index 1   # host2에서
+"""
+import os
+import sys
+import socket
+import argparse
+import subprocess
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.distributed import TF_CONFIG_ENV, make_config
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def free_ports(count):
+    """
+    로컬 워커용 빈 TCP 포트 count개
+    """
+    sockets = []
+    try:
+        for _ in range(count):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.bind(("127.0.0.1", 0))
+            sockets.append(sock)
+        return [sock.getsockname()[1] for sock in sockets]
+    finally:
+        for sock in sockets:
+            sock.close()
+
+def worker_command(script, script_args):
+    return [sys.executable, script, *script_args]
+
+def worker_env(workers, index):
+    env = dict(os.environ)
+    env[TF_CONFIG_ENV] = make_config(workers, index)
+    return env
+
+def forward_output(process, prefix):
+    for line in iter(process.stdout.readline, b""):
+        sys.stdout.write(f"{prefix} {line.decode(errors='replace')}")
+        sys.stdout.flush()
+
+def run_local_workers(num_workers, script, script_args):
+    """
+    워커 num_workers개를 로컬에서 실행하고 모두 끝날 때까지 대기
+    
+    Returns:
+        모든 워커가 성공하면 0, 아니면 처음 실패한 워커의 종료 코드
+    """
+    workers = [f"127.0.0.1:{port}" for port in free_ports(num_workers)]
+    print(f"워커 {num_workers}개 시작: {', '.join(workers)}")
+    processes = []
+    threads = []
+    for index in range(num_workers):
+        process = subprocess.Popen(
+            worker_command(script, script_args),
+            env=worker_env(workers, index),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            cwd=os.getcwd()
+        )
+        thread = threading.Thread(target=forward_output, args=(process, f"[w{index}]"), daemon=True)
+        thread.start()
+        processes.append(process)
+        threads.append(thread)
+    
+    # 하나라도 실패하면 나머지 워커는 all-reduce에서 멈추므로 모두 종료
+    exit_code = 0
+    remaining = list(processes)
+    try:
+        while remaining:
+            for process in list(remaining):
+                try:
+                    code = process.wait(timeout=0.5)
+                except subprocess.TimeoutExpired:
+                    continue
+                remaining.remove(process)
+                if code != 0 and exit_code == 0:
+                    exit_code = code
+                    print(f"❌ 워커 w{processes.index(process)} 실패 (종료 코드 {code}), 나머지 워커를 종료합니다")
+                    for other in remaining:
+                        other.terminate()
+    finally:
+        for process in processes:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+        for thread in threads:
+            thread.join(timeout=5)
+    return exit_code
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="TF_CONFIG를 만들어 다중 워커 학습(train.py) 실행")
+    parser.add_argument("--num-workers", type=int, default=2, help="이 머신에서 띄울 워커 수")
+    parser.add_argument("--workers", default=None, help="여러 머신: 모든 워커 주소 (host:port,host:port,...)")
+    parser.add_argument("--index", type=int, default=None, help="여러 머신: 이 머신에서 실행할 워커 번호 (--workers와 함께)")
+    parser.add_argument("--max-restarts", type=int, default=0, help="워커 실패 시 전체를 다시 시작할 횟수 (백업에서 이어서 학습)")
+    parser.add_argument("--script", default=os.path.join(ROOT_DIR, "train.py"), help="워커마다 실행할 학습 스크립트")
+    parser.add_argument("script_args", nargs=argparse.REMAINDER, help="-- 뒤의 인자는 학습 스크립트에 전달")
+    args = parser.parse_args()
+    if args.script_args and args.script_args[0] == "--":
+        args.script_args = args.script_args[1:]
+    if (args.workers is None) != (args.index is None):
+        parser.error("--workers와 --index는 함께 지정해야 합니다")
+    return args
+
+if __name__ == "__main__":
+    args = parse_args()
+    
+    if args.workers is not None:
+        # 여러 머신: 이 머신의 워커 하나만 실행 (출력은 그대로)
+        workers = [address.strip() for address in args.workers.split(",") if address.strip()]
+        if not 0 <= args.index < len(workers):
+            print(f"❌ --index {args.index}가 워커 수({len(workers)})를 벗어납니다")
+            sys.exit(2)
+        print(f"워커 {args.index}/{len(workers)} 시작 ({workers[args.index]})")
+        sys.exit(subprocess.call(worker_command(args.script, args.script_args), env=worker_env(workers, args.index)))
+    
+    if args.num_workers < 1:
+        print("❌ --num-workers는 1 이상이어야 합니다")
+        sys.exit(2)
+    for attempt in range(args.max_restarts + 1):
+        if attempt:
+            print(f"\n⚠️  워커를 다시 시작합니다 ({attempt}/{args.max_restarts}), 학습 상태 백업에서 이어서 학습")
+        exit_code = run_local_workers(args.num_workers, args.script, args.script_args)
+        if exit_code == 0:
+            print(f"✓ 워커 {args.num_workers}개 학습 완료")
+            break
+    sys.exit(exit_code)
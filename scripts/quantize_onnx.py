@@ -0,0 +1,248 @@
+"""
+ONNX 모델을 INT8로 양자화하고 float 모델과 비교 리포트를 만드는 스크립트
+
+사용법:
+    python scripts/quantize_onnx.py [--model models/quickdraw_rnn.onnx] [--mode dynamic|static]
+                                    [--data-dir data/raw] [--report models/quantization_report.json]
+
+convert_to_onnx.py --quantize dynamic|static 으로 변환과 함께 실행할 수도 있습니다.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+import onnxruntime as ort
+from onnxruntime.quantization import (
+    CalibrationDataReader,
+    QuantFormat,
+    QuantType,
+    quantize_dynamic,
+    quantize_static,
+)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src import data_loader
+from src.inference import quantized_model_path
+from src.registry import load_categories
+
+# 모델 옆에 <이름>.categories.json이 없을 때 사용하는 기본 카테고리
+CATEGORIES = ["cat", "dog", "airplane", "car", "bird"]
+
+class DrawingCalibrationReader(CalibrationDataReader):
+    """
+    정적 양자화 보정(calibration)용 입력을 배치 단위로 제공
+    """
+    
+    def __init__(self, input_name, X, batch_size=32):
+        self.input_name = input_name
+        self.batches = iter([X[i:i + batch_size] for i in range(0, len(X), batch_size)])
+    
+    def get_next(self):
+        batch = next(self.batches, None)
+        if batch is None:
+            return None
+        return {self.input_name: batch.astype(np.float32)}
+
+def load_samples(categories, data_dir, calibration_items, eval_items):
+    """
+    data/raw 그림에서 클래스별로 보정용/평가용 샘플을 나눠 로드
+    
+    Returns:
+        (X_calib, X_eval, y_eval) - 데이터가 없으면 None
+    """
+    try:
+        X, y = data_loader.load_dataset(
+            categories,
+            base_path=data_dir,
+            max_items=calibration_items + eval_items
+        )
+    except FileNotFoundError as e:
+        print(f"⚠️  평가 데이터를 찾을 수 없습니다: {e}")
+        return None
+    
+    calib_idx = []
+    eval_idx = []
+    for label in range(len(categories)):
+        idx = np.flatnonzero(y == label)
+        calib_idx.extend(idx[:calibration_items])
+        eval_idx.extend(idx[calibration_items:])
+    return X[calib_idx], X[eval_idx], y[eval_idx]
+
+def quantize_model(float_model_path, output_path, mode="dynamic", X_calib=None):
+    """
+    float ONNX 모델을 INT8로 양자화
+    
+    dynamic: 가중치만 INT8로 저장하고 활성값은 실행 시 양자화 (LSTM/MatMul 포함, 보정 데이터 불필요)
+    static: 보정 데이터로 활성값 범위를 미리 계산 (QDQ 형식)
+    """
+    if mode == "dynamic":
+        quantize_dynamic(float_model_path, output_path, weight_type=QuantType.QInt8)
+    elif mode == "static":
+        if X_calib is None or len(X_calib) == 0:
+            raise ValueError("정적 양자화에는 보정용 그림 데이터가 필요합니다 (--data-dir).")
+        input_name = ort.InferenceSession(float_model_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+        quantize_static(
+            float_model_path,
+            output_path,
+            DrawingCalibrationReader(input_name, X_calib),
+            quant_format=QuantFormat.QDQ,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8
+        )
+    else:
+        raise ValueError(f"알 수 없는 양자화 방식: {mode}")
+    print(f"✓ 양자화 모델 저장 ({mode}): {output_path}")
+
+def predict_all(session, X, batch_size=256):
+    input_name = session.get_inputs()[0].name
+    outputs = [
+        session.run(None, {input_name: X[i:i + batch_size].astype(np.float32)})[0]
+        for i in range(0, len(X), batch_size)
+    ]
+    return np.concatenate(outputs, axis=0)
+
+def measure_latency(session, X, batch_size, runs):
+    """
+    batch_size 단위 예측 지연 시간 (ms) 측정
+    """
+    input_name = session.get_inputs()[0].name
+    batch = X[:batch_size].astype(np.float32)
+    session.run(None, {input_name: batch})  # 워밍업
+    
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        session.run(None, {input_name: batch})
+        timings.append((time.perf_counter() - start) * 1000.0)
+    
+    timings = np.array(timings)
+    p50, p95 = np.percentile(timings, [50, 95])
+    return {
+        "batchSize": len(batch),
+        "meanMs": float(timings.mean()),
+        "p50Ms": float(p50),
+        "p95Ms": float(p95),
+        "perSampleMs": float(timings.mean() / len(batch)),
+    }
+
+def describe_model(model_path, X_eval, y_eval, runs):
+    """
+    모델 1개의 크기, 정확도, 단건/배치 지연 시간
+    """
+    session = ort.InferenceSession(model_path, providers=["CPUExecutionProvider"])
+    report = {
+        "path": model_path,
+        "sizeBytes": os.path.getsize(model_path),
+        "accuracy": None,
+        "latency": {
+            "single": measure_latency(session, X_eval, 1, runs),
+            "batched": measure_latency(session, X_eval, 64, max(runs // 4, 5)),
+        },
+    }
+    if y_eval is not None:
+        predictions = predict_all(session, X_eval)
+        report["accuracy"] = float(np.mean(np.argmax(predictions, axis=1) == y_eval))
+    return report, session
+
+def build_report(float_model_path, quant_model_path, mode, X_eval, y_eval, runs=100):
+    """
+    float 모델과 양자화 모델의 정확도, 크기, 지연 시간 비교
+    """
+    float_report, float_session = describe_model(float_model_path, X_eval, y_eval, runs)
+    quant_report, quant_session = describe_model(quant_model_path, X_eval, y_eval, runs)
+    
+    # 두 모델의 top-1 예측 일치율
+    agreement = float(np.mean(
+        np.argmax(predict_all(float_session, X_eval), axis=1) == np.argmax(predict_all(quant_session, X_eval), axis=1)
+    ))
+    
+    return {
+        "mode": mode,
+        "evalSamples": len(X_eval),
+        "float": float_report,
+        "int8": quant_report,
+        "top1Agreement": agreement,
+        "sizeRatio": quant_report["sizeBytes"] / float_report["sizeBytes"],
+        "singleSpeedup": float_report["latency"]["single"]["meanMs"] / quant_report["latency"]["single"]["meanMs"],
+        "batchedSpeedup": float_report["latency"]["batched"]["meanMs"] / quant_report["latency"]["batched"]["meanMs"],
+    }
+
+def print_report(report):
+    print("\n" + "="*70)
+    print(f"양자화 리포트 ({report['mode']}, 평가 샘플 {report['evalSamples']:,}개)")
+    print("="*70)
+    for name in ("float", "int8"):
+        model = report[name]
+        accuracy = f"{model['accuracy']*100:.2f}%" if model["accuracy"] is not None else "-"
+        print(
+            f"  {name:5s} 크기 {model['sizeBytes']/1024:8.1f} KB | 정확도 {accuracy:>7s} | "
+            f"단건 {model['latency']['single']['p50Ms']:.2f} ms | "
+            f"배치(64) {model['latency']['batched']['p50Ms']:.2f} ms"
+        )
+    print(f"  예측 일치율: {report['top1Agreement']*100:.2f}%")
+    print(f"  크기 비율: {report['sizeRatio']:.2f} | 속도 향상: 단건 {report['singleSpeedup']:.2f}x, 배치 {report['batchedSpeedup']:.2f}x")
+    print("="*70)
+
+def run_quantization(
+    float_model_path,
+    mode="dynamic",
+    output_path=None,
+    data_dir="data/raw",
+    categories=None,
+    calibration_items=200,
+    eval_items=500,
+    report_path=None
+):
+    """
+    양자화 → 비교 리포트 생성까지 실행
+    
+    data_dir에 그림이 없으면 (dynamic 한정) 임의 입력으로 크기/지연 시간만 비교합니다.
+    categories를 주지 않으면 모델의 카테고리 파일(없으면 CATEGORIES) 순서로 평가합니다.
+    """
+    categories = categories or load_categories(float_model_path, default=CATEGORIES)
+    output_path = output_path or quantized_model_path(float_model_path)
+    samples = load_samples(categories, data_dir, calibration_items, eval_items)
+    
+    if samples is not None:
+        X_calib, X_eval, y_eval = samples
+    else:
+        X_calib, y_eval = None, None
+        rng = np.random.default_rng(0)
+        X_eval = rng.integers(-20, 21, size=(256, data_loader.MAX_SEQ_LEN, 3)).astype(np.float32) / 255.0
+        X_eval[..., 2] = 0.0
+    
+    quantize_model(float_model_path, output_path, mode=mode, X_calib=X_calib)
+    
+    report = build_report(float_model_path, output_path, mode, X_eval, y_eval)
+    print_report(report)
+    
+    if report_path:
+        with open(report_path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"✓ 리포트 저장: {report_path}")
+    return report
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="ONNX 모델 INT8 양자화 및 비교 리포트")
+    parser.add_argument("--model", default="models/quickdraw_rnn.onnx", help="float ONNX 모델 경로")
+    parser.add_argument("--mode", choices=["dynamic", "static"], default="dynamic", help="양자화 방식")
+    parser.add_argument("--output", default=None, help="출력 경로 (기본: <모델>.int8.onnx)")
+    parser.add_argument("--data-dir", default="data/raw", help="보정/평가용 ndjson 디렉토리")
+    parser.add_argument("--calibration-items", type=int, default=200, help="클래스당 보정 샘플 수")
+    parser.add_argument("--eval-items", type=int, default=500, help="클래스당 평가 샘플 수")
+    parser.add_argument("--report", default=None, help="JSON 리포트 저장 경로")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    run_quantization(
+        args.model,
+        mode=args.mode,
+        output_path=args.output,
+        data_dir=args.data_dir,
+        calibration_items=args.calibration_items,
+        eval_items=args.eval_items,
+        report_path=args.report
+    )
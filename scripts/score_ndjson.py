@@ -0,0 +1,422 @@
+"""
+ndjson 그림 대량 채점(batch scoring) 스크립트
+
+data/raw/*.ndjson 전체나 사용자 제출 덤프처럼 수백만 개의 그림을 한 번에 예측합니다.
+- 입력 파일을 줄 번호 기준 청크(--chunk-lines)로 나눠 워커 프로세스(--workers)에서 JSON 파싱/전처리
+- 메인 프로세스는 그동안 청크를 길이순으로 정렬해 큰 배치(--batch-size)로 ONNX 추론
+  (동적 길이 모델은 배치마다 버킷 길이 25/50/100/200까지만 실행, .npz NumPy 엔진도 사용 가능)
+- 결과는 입력 파일마다 <출력 디렉토리>/<이름>.jsonl (줄마다 top-k 클래스와 확률) 또는
+  <이름>.topk_indices.npy / <이름>.topk_probs.npy (행 i = 입력 i번째 줄) 로 저장
+
+중단 후 재개: 청크 결과를 <출력 디렉토리>/.parts/에 청크 단위로 원자적으로(임시 파일 → rename) 저장하므로
+같은 명령에 --resume을 붙여 다시 실행하면 끝난 청크와 파일은 건너뛰고 이어서 채점합니다.
+설정(모델, 카테고리, top-k, 형식, 청크 크기, 단순화 여부)이 처음 실행과 다르면 재개하지 않습니다.
+
+사용법:
+    python scripts/score_ndjson.py "data/raw/*.ndjson" [--model models/quickdraw_rnn.onnx]
+                                   [--categories cat dog ...] [--output-dir scores] [--format jsonl|npy] [--top-k 5]
+                                   [--batch-size 1024] [--workers 4] [--chunk-lines 10000]
+                                   [--simplify] [--resume | --overwrite]
+"""
+import os
+import sys
+import json
+import glob
+import time
+import shutil
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src import data_loader
+from src.registry import LoadedModel, source_identity
+
+# 카테고리 사이드카(<모델>.categories.json)가 없는 모델에 쓰는 기본 카테고리 (predict_api.py와 동일)
+CATEGORIES = ["cat", "dog", "airplane", "car", "bird"]
+
+# 출력 디렉토리의 채점 설정 파일 (재개 시 설정 일치 확인용)
+MANIFEST_NAME = "scoring.json"
+# 청크별 중간 결과 (파일이 모두 끝나면 합친 뒤 삭제)
+PARTS_DIR = ".parts"
+OUTPUT_FORMATS = ("jsonl", "npy")
+
+def expand_inputs(patterns):
+    """
+    파일 경로/글롭 패턴 → 정렬된 ndjson 파일 목록 (이름이 같은 파일은 출력이 겹치므로 에러)
+    """
+    paths = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        if not matches:
+            raise FileNotFoundError(f"입력 파일이 없습니다: {pattern}")
+        paths.extend(Path(match) for match in matches)
+    
+    stems = {}
+    for path in paths:
+        if not path.is_file():
+            raise FileNotFoundError(f"입력 파일이 없습니다: {path}")
+        if path.stem in stems and stems[path.stem] != path.resolve():
+            raise ValueError(f"이름이 같은 입력 파일이 있습니다 (출력 파일 이름이 겹침): {stems[path.stem]}, {path}")
+        stems[path.stem] = path.resolve()
+    return list(dict.fromkeys(path.resolve() for path in paths))
+
+def parse_chunk(task):
+    """
+    워커: 한 청크(start_line부터 줄 단위 바이트 범위)를 파싱해 길이순으로 정렬한 시퀀스 반환
+    
+    (N, 200, 3) 배열 대신 실제 점만 (P, 3)으로 모아 보내므로 프로세스 간 전송량이 작습니다.
+    
+    Returns:
+        dict: num_lines, order (길이순 행 번호), lengths (order 순서), points (order 순서로 이어 붙인 점),
+              key_ids / words (행 순서), errors ({행 번호: 에러 메시지})
+    """
+    path, start, stop, num_lines, simplify = task
+    with open(path, 'rb') as f:
+        f.seek(start)
+        lines = f.read(stop - start).split(b'\n')[:num_lines]
+    
+    X = np.zeros((len(lines), data_loader.MAX_SEQ_LEN, 3), dtype=np.float32)
+    lengths = np.zeros(len(lines), dtype=np.int32)
+    rows = []
+    key_ids = [None] * num_lines
+    words = [None] * num_lines
+    errors = {}
+    for row, line in enumerate(lines):
+        try:
+            data = json.loads(line)
+        except ValueError:
+            errors[row] = "invalid json"
+            continue
+        drawing = data.get('drawing') if isinstance(data, dict) else None
+        if not isinstance(drawing, list) or len(drawing) == 0:
+            errors[row] = "empty drawing"
+            continue
+        # 그림마다 변환: 형식이 잘못된 그림 하나(예: [[1, 2, 3]])가 청크 전체를 중단시키지 않도록 해당 행만 에러로 기록
+        try:
+            X[len(rows)], lengths[len(rows)] = data_loader.drawing_to_sequence(drawing, return_length=True, simplify=simplify)
+        except (TypeError, ValueError, IndexError) as e:
+            errors[row] = f"invalid drawing: {e}"
+            continue
+        key_ids[row] = data.get('key_id')
+        words[row] = data.get('word')
+        rows.append(row)
+    X, lengths = X[:len(rows)], lengths[:len(rows)]
+    
+    # 길이순 정렬: 메인 프로세스가 연속 구간을 잘라 배치로 쓰면 배치 내 패딩이 최소가 됨
+    by_length = np.argsort(lengths, kind='stable')
+    X, lengths = X[by_length], lengths[by_length]
+    points = X[np.arange(data_loader.MAX_SEQ_LEN)[None, :] < lengths[:, None]]
+    return {
+        "num_lines": num_lines,
+        "order": np.asarray(rows, dtype=np.int64)[by_length],
+        "lengths": lengths,
+        "points": points,
+        "key_ids": key_ids,
+        "words": words,
+        "errors": errors,
+    }
+
+def predict_chunk(model, chunk, batch_size):
+    """
+    길이순으로 정렬된 청크를 batch_size씩 잘라 예측
+    
+    Returns:
+        (num_lines, 클래스 수) float32 확률, 파싱에 실패한 행은 0
+    """
+    probabilities = np.zeros((chunk["num_lines"], len(model.categories)), dtype=np.float32)
+    lengths = chunk["lengths"]
+    offsets = np.concatenate([[0], np.cumsum(lengths, dtype=np.int64)])
+    steps = np.arange(data_loader.MAX_SEQ_LEN)
+    for start in range(0, len(lengths), batch_size):
+        stop = min(start + batch_size, len(lengths))
+        batch_lengths = lengths[start:stop]
+        # 고정 길이 모델은 200, 동적 길이 모델은 배치에서 가장 긴 그림의 버킷 길이로 패딩
+        width = data_loader.bucket_length(int(batch_lengths[-1])) if model.dynamic_length else data_loader.MAX_SEQ_LEN
+        batch = np.zeros((stop - start, width, 3), dtype=np.float32)
+        batch[steps[None, :width] < batch_lengths[:, None]] = chunk["points"][offsets[start]:offsets[stop]]
+        probabilities[chunk["order"][start:stop]] = model.run(batch)
+    return probabilities
+
+def top_k(probabilities, k):
+    """
+    행마다 확률이 높은 순서로 k개 클래스 번호와 확률
+    """
+    indices = np.argpartition(-probabilities, k - 1, axis=1)[:, :k]
+    top_probs = np.take_along_axis(probabilities, indices, axis=1)
+    ranked = np.argsort(-top_probs, axis=1, kind='stable')
+    return np.take_along_axis(indices, ranked, axis=1), np.take_along_axis(top_probs, ranked, axis=1)
+
+def write_atomic(path, write):
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, 'wb') as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+def write_part(part_path, output_format, file_name, first_line, chunk, indices, probs, categories):
+    """
+    청크 1개의 결과를 .parts/에 저장 (rename으로 끝나므로 존재하면 완료된 청크)
+    """
+    errors = chunk["errors"]
+    if output_format == "npy":
+        indices = indices.astype(np.int16)
+        for row in errors:
+            indices[row] = -1
+            probs[row] = 0.0
+        write_atomic(part_path, lambda f: np.savez(f, indices=indices, probs=probs))
+        return
+    
+    records = []
+    for row in range(chunk["num_lines"]):
+        record = {"file": file_name, "line": first_line + row}
+        if row in errors:
+            record["error"] = errors[row]
+        else:
+            record["key_id"] = chunk["key_ids"][row]
+            record["word"] = chunk["words"][row]
+            record["predictions"] = [
+                {"category": categories[idx], "probability": round(float(prob), 6)}
+                for idx, prob in zip(indices[row], probs[row])
+            ]
+        records.append(json.dumps(record, ensure_ascii=False))
+    write_atomic(part_path, lambda f: f.write(("\n".join(records) + "\n").encode() if records else b""))
+
+def output_paths(output_dir, path, output_format):
+    if output_format == "npy":
+        return [output_dir / f"{path.stem}.topk_indices.npy", output_dir / f"{path.stem}.topk_probs.npy"]
+    return [output_dir / f"{path.stem}.jsonl"]
+
+def merge_parts(parts_dir, outputs, output_format, k):
+    """
+    청크 결과를 줄 순서대로 합쳐 최종 출력 파일로 저장하고 청크 디렉토리 삭제
+    """
+    parts = sorted(parts_dir.glob(f"*.{'npz' if output_format == 'npy' else 'jsonl'}"))
+    if output_format == "npy":
+        arrays = {"indices": [np.zeros((0, k), dtype=np.int16)], "probs": [np.zeros((0, k), dtype=np.float32)]}
+        for part in parts:
+            with np.load(part) as data:
+                arrays["indices"].append(data["indices"])
+                arrays["probs"].append(data["probs"])
+        # 확률을 먼저 쓰고 번호를 나중에 써서, 두 파일이 모두 있으면 완료로 판단
+        write_atomic(outputs[1], lambda f: np.save(f, np.concatenate(arrays["probs"])))
+        write_atomic(outputs[0], lambda f: np.save(f, np.concatenate(arrays["indices"])))
+    else:
+        def concatenate(f):
+            for part in parts:
+                with open(part, 'rb') as src:
+                    shutil.copyfileobj(src, f)
+        write_atomic(outputs[0], concatenate)
+    shutil.rmtree(parts_dir)
+
+def prepare_output_dir(output_dir, settings, resume, overwrite):
+    """
+    출력 디렉토리와 설정 파일 준비 (이전 실행이 있으면 --resume / --overwrite 필요)
+    """
+    manifest_path = output_dir / MANIFEST_NAME
+    if manifest_path.exists():
+        if overwrite:
+            shutil.rmtree(output_dir)
+        elif resume:
+            with open(manifest_path) as f:
+                previous = json.load(f)
+            changed = [key for key in settings if previous.get(key) != settings[key]]
+            if changed:
+                raise ValueError(f"이전 실행과 설정이 달라 재개할 수 없습니다 ({', '.join(changed)}). --overwrite로 새로 시작하세요")
+            return
+        else:
+            raise FileExistsError(f"{output_dir}에 이전 실행 결과가 있습니다. 이어서 하려면 --resume, 새로 하려면 --overwrite를 사용하세요")
+    
+    output_dir.mkdir(parents=True, exist_ok=True)
+    write_atomic(manifest_path, lambda f: f.write(json.dumps(settings, ensure_ascii=False, indent=2).encode()))
+
+def plan_tasks(paths, output_dir, output_format, chunk_lines, simplify):
+    """
+    남은 청크 목록: 최종 출력이 있는 파일과 .parts/에 결과가 있는 청크는 제외
+    
+    Returns:
+        (청크 작업 목록 [(path, first_line, task)], 파일별 청크 수 {path: 남은 청크 수}, 건너뛴 줄 수)
+    """
+    tasks = []
+    remaining = {}
+    skipped_lines = 0
+    suffix = "npz" if output_format == "npy" else "jsonl"
+    for path in paths:
+        offsets = data_loader.load_line_index(path)
+        num_lines = len(offsets) - 1
+        if all(output.exists() for output in output_paths(output_dir, path, output_format)):
+            skipped_lines += num_lines
+            continue
+        
+        parts_dir = output_dir / PARTS_DIR / path.stem
+        parts_dir.mkdir(parents=True, exist_ok=True)
+        remaining[path] = 0
+        for first_line in range(0, num_lines, chunk_lines):
+            last_line = min(first_line + chunk_lines, num_lines)
+            if (parts_dir / f"{first_line:012d}.{suffix}").exists():
+                skipped_lines += last_line - first_line
+                continue
+            task = (str(path), int(offsets[first_line]), int(offsets[last_line]), last_line - first_line, simplify)
+            tasks.append((path, first_line, task))
+            remaining[path] += 1
+    return tasks, remaining, skipped_lines
+
+def parsed_chunks(tasks, workers):
+    """
+    청크 파싱 결과를 작업 순서대로 생성 (워커는 최대 workers * 2개까지 미리 파싱)
+    """
+    if workers == 0:
+        for path, first_line, task in tasks:
+            yield path, first_line, parse_chunk(task)
+        return
+    
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        try:
+            for path, first_line, task in tasks:
+                pending.append((path, first_line, pool.submit(parse_chunk, task)))
+                if len(pending) >= workers * 2:
+                    path, first_line, future = pending.popleft()
+                    yield path, first_line, future.result()
+            while pending:
+                path, first_line, future = pending.popleft()
+                yield path, first_line, future.result()
+        finally:
+            for _, _, future in pending:
+                future.cancel()
+
+def score_files(
+    inputs,
+    model_path="models/quickdraw_rnn.onnx",
+    categories=None,
+    output_dir="scores",
+    output_format="jsonl",
+    k=5,
+    batch_size=1024,
+    workers=None,
+    chunk_lines=10000,
+    simplify=False,
+    resume=False,
+    overwrite=False
+):
+    """
+    ndjson 파일들을 채점해 output_dir에 파일별 top-k 결과 저장
+    
+    카테고리는 모델 옆의 <이름>.categories.json, 없으면 categories (기본: CATEGORIES)
+    
+    Returns:
+        요약 dict (files, lines, scored, errors, skippedLines, seconds, drawingsPerSec)
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"지원하지 않는 출력 형식: {output_format} (jsonl 또는 npy)")
+    paths = expand_inputs(inputs)
+    output_dir = Path(output_dir)
+    workers = os.cpu_count() if workers is None else workers
+    
+    model = LoadedModel("batch", model_path, default_categories=categories or CATEGORIES)
+    try:
+        k = min(k, len(model.categories))
+        settings = {
+            "model": model.path,
+            "modelIdentity": source_identity(model.path),
+            "categories": model.categories,
+            "topK": k,
+            "format": output_format,
+            "chunkLines": chunk_lines,
+            "simplify": simplify,
+        }
+        prepare_output_dir(output_dir, settings, resume, overwrite)
+        tasks, remaining, skipped_lines = plan_tasks(paths, output_dir, output_format, chunk_lines, simplify)
+        
+        backend = "NumPy" if model.engine is not None else "ONNX Runtime"
+        print(f"모델: {model.loaded_path} ({backend}, {len(model.categories)}개 클래스, {'동적' if model.dynamic_length else '고정'} 길이)")
+        print(f"입력 파일 {len(paths)}개, 남은 청크 {len(tasks)}개 (건너뛴 줄 {skipped_lines:,}개), 워커 {workers}개")
+        
+        suffix = "npz" if output_format == "npy" else "jsonl"
+        summary = {"files": len(paths), "lines": 0, "scored": 0, "errors": 0, "skippedLines": skipped_lines}
+        start = time.perf_counter()
+        for done, (path, first_line, chunk) in enumerate(parsed_chunks(tasks, workers), 1):
+            probabilities = predict_chunk(model, chunk, batch_size)
+            indices, probs = top_k(probabilities, k)
+            parts_dir = output_dir / PARTS_DIR / path.stem
+            write_part(
+                parts_dir / f"{first_line:012d}.{suffix}",
+                output_format, path.name, first_line, chunk, indices, probs, model.categories
+            )
+            summary["lines"] += chunk["num_lines"]
+            summary["errors"] += len(chunk["errors"])
+            summary["scored"] += chunk["num_lines"] - len(chunk["errors"])
+            
+            remaining[path] -= 1
+            if remaining[path] == 0:
+                merge_parts(parts_dir, output_paths(output_dir, path, output_format), output_format, k)
+            
+            elapsed = time.perf_counter() - start
+            print(f"  [{done}/{len(tasks)}] {path.name}:{first_line:,} | 누적 {summary['lines']:,}줄 | {summary['lines']/elapsed:,.0f}줄/초")
+        
+        # 청크가 모두 끝났지만 합치기 전에 중단된 파일
+        for path, count in remaining.items():
+            parts_dir = output_dir / PARTS_DIR / path.stem
+            if count == 0 and parts_dir.exists():
+                merge_parts(parts_dir, output_paths(output_dir, path, output_format), output_format, k)
+        parts_root = output_dir / PARTS_DIR
+        if parts_root.exists() and not any(parts_root.iterdir()):
+            parts_root.rmdir()
+    finally:
+        model.retire()
+    
+    summary["seconds"] = time.perf_counter() - start
+    summary["drawingsPerSec"] = summary["scored"] / summary["seconds"] if summary["seconds"] > 0 else 0.0
+    return summary
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="ndjson 그림 대량 채점 (top-k 클래스, JSONL/NPY 출력, 중단 후 재개)")
+    parser.add_argument("inputs", nargs="+", help='ndjson 파일 또는 글롭 패턴 (예: "data/raw/*.ndjson")')
+    parser.add_argument("--model", default="models/quickdraw_rnn.onnx", help="ONNX 모델 또는 NumPy 엔진 .npz")
+    parser.add_argument("--categories", nargs="+", default=None, help="카테고리 사이드카가 없는 모델의 카테고리 (기본: cat dog airplane car bird)")
+    parser.add_argument("--output-dir", default="scores", help="결과 저장 디렉토리")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default="jsonl", help="출력 형식")
+    parser.add_argument("--top-k", type=int, default=5, help="그림마다 저장할 상위 클래스 수")
+    parser.add_argument("--batch-size", type=int, default=1024, help="추론 배치 크기")
+    parser.add_argument("--workers", type=int, default=None, help="전처리 워커 프로세스 수 (기본: CPU 수, 0이면 메인 프로세스에서 처리)")
+    parser.add_argument("--chunk-lines", type=int, default=10000, help="청크(작업/재개 단위) 줄 수")
+    parser.add_argument("--simplify", action="store_true", help="원본(비단순화) 스트로크를 정규화/단순화 (사용자 제출 덤프 등)")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--resume", action="store_true", help="중단된 실행을 이어서 채점")
+    group.add_argument("--overwrite", action="store_true", help="이전 결과를 지우고 새로 채점")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.top_k < 1 or args.batch_size < 1 or args.chunk_lines < 1:
+        print("❌ --top-k, --batch-size, --chunk-lines는 1 이상이어야 합니다")
+        sys.exit(2)
+    try:
+        summary = score_files(
+            args.inputs,
+            model_path=args.model,
+            categories=args.categories,
+            output_dir=args.output_dir,
+            output_format=args.format,
+            k=args.top_k,
+            batch_size=args.batch_size,
+            workers=args.workers,
+            chunk_lines=args.chunk_lines,
+            simplify=args.simplify,
+            resume=args.resume,
+            overwrite=args.overwrite
+        )
+    except KeyboardInterrupt:
+        print(f"\n⚠️  중단되었습니다. 같은 명령에 --resume을 붙여 이어서 채점할 수 있습니다")
+        sys.exit(130)
+    except (FileNotFoundError, FileExistsError, ValueError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    
+    print("\n" + "="*70)
+    print(f"채점 완료: {args.output_dir} ({args.format})")
+    print("="*70)
+    print(f"  파일 {summary['files']}개 | 이번 실행 {summary['lines']:,}줄 (예측 {summary['scored']:,}, 실패 {summary['errors']:,}) | 건너뜀 {summary['skippedLines']:,}줄")
+    print(f"  {summary['seconds']:.1f}초, {summary['drawingsPerSec']:,.0f}그림/초")
+    print("="*70)
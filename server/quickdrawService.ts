@@ -1,4 +1,6 @@
 import { spawn } from "child_process";
+import { createConnection } from "net";
+import { createInterface } from "readline";
 import { resolve as pathResolve } from "path";
 import { fileURLToPath } from "url";
 import { dirname } from "path";
@@ -12,92 +14,342 @@ interface PredictionResult {
   allProbabilities: Record<string, number>;
 }
 
-export async function predictDrawing(
-  drawing: number[][][]
-): Promise<PredictionResult> {
-  return new Promise((resolve, reject) => {
-    // 프로젝트 루트 경로 계산
-    let projectRoot: string;
-    
+interface PendingRequest {
+  resolve: (message: any) => void;
+  reject: (error: Error) => void;
+  timer: NodeJS.Timeout;
+}
+
+interface PredictWorker {
+  write: (line: string) => void;
+  ready: Promise<void>;
+  pending: Map<number, PendingRequest>;
+}
+
+// 요청 1개당 최대 대기 시간 (ms)
+const REQUEST_TIMEOUT_MS = parseInt(process.env.PREDICT_TIMEOUT_MS || "10000", 10);
+
+// predict_api.py --pool(프로세스 풀)의 Unix 소켓 경로
+// 설정하면 워커를 직접 띄우지 않고 이미 실행 중인 풀에 연결 (풀이 요청을 여러 워커 프로세스에 분배)
+const PREDICT_SOCKET = process.env.PREDICT_SOCKET || "";
+
+// 워커로 그림을 보내는 형식: "binary"(int16 바이너리, 기본) 또는 "json"(중첩 리스트)
+const WIRE_FORMAT = process.env.PREDICT_WIRE_FORMAT || "binary";
+
+// src/data_loader.py의 pack_drawing과 같은 형식
+// "QDB1" + uint16 획 수 + 획별 uint16 점 수 + 전체 x 좌표 int16 + 전체 y 좌표 int16 (리틀 엔디언)
+const PACKED_MAGIC = Buffer.from("QDB1", "ascii");
+
+let worker: PredictWorker | null = null;
+let nextRequestId = 1;
+
+function getProjectRoot(): string {
+  // 프로젝트 루트 경로 계산
+  try {
+    if (__dirname && __dirname !== "undefined") {
+      return pathResolve(__dirname, "..");
+    }
+  } catch (error) {
+    // 무시하고 현재 작업 디렉토리 사용
+  }
+  return process.cwd();
+}
+
+function failPending(target: PredictWorker, error: Error) {
+  target.pending.forEach((request) => {
+    clearTimeout(request.timer);
+    request.reject(error);
+  });
+  target.pending.clear();
+}
+
+/**
+ * 워커 연결(상주 워커의 stdin/stdout 또는 풀 소켓) 공통 처리
+ * 한 줄 JSON 응답을 같은 id의 요청에 전달하고, fail()이 호출되면 대기 중인 요청을 모두 실패 처리
+ */
+function attachWorker(input: NodeJS.ReadableStream, write: (line: string) => void) {
+  const pending = new Map<number, PendingRequest>();
+  let markReady: () => void = () => {};
+  let markFailed: (error: Error) => void = () => {};
+  const ready = new Promise<void>((resolve, reject) => {
+    markReady = resolve;
+    markFailed = reject;
+  });
+  // 아무도 기다리지 않을 때 unhandled rejection 방지
+  ready.catch(() => {});
+
+  const current: PredictWorker = { write, ready, pending };
+  worker = current;
+
+  const lines = createInterface({ input });
+  // readline이 입력 스트림의 오류를 다시 내보내므로 무시 (오류는 연결 쪽 error 핸들러에서 처리)
+  lines.on("error", () => {});
+
+  lines.on("line", (line) => {
+    const trimmed = line.trim();
+    if (!trimmed.startsWith("{")) {
+      return;
+    }
+
+    let message: any;
     try {
-      if (__dirname && __dirname !== "undefined") {
-        projectRoot = pathResolve(__dirname, "..");
-      } else {
-        projectRoot = process.cwd();
-      }
+      message = JSON.parse(trimmed);
     } catch (error) {
-      projectRoot = process.cwd();
+      console.error("Failed to parse Python output:", trimmed);
+      return;
     }
-    
-    const scriptPath = pathResolve(projectRoot, "predict_api.py");
-    const onnxModelPath = pathResolve(projectRoot, "models", "quickdraw_rnn.onnx");
-    
-    // Python 명령어 (conda 환경 또는 기본 python)
-    const pythonCommand = process.env.PYTHON_PATH || "python";
-    
-    // ONNX 모델 경로를 인자로 전달 (FaceAgeRank 방식)
-    const pythonArgs = [scriptPath, onnxModelPath];
-    
-    const pythonProcess = spawn(pythonCommand, pythonArgs, {
-      cwd: projectRoot,
-      stdio: ["pipe", "pipe", "pipe"],
-    });
-
-    let stdout = "";
-    let stderr = "";
-
-    pythonProcess.stdout.on("data", (data) => {
-      stdout += data.toString();
-    });
-
-    pythonProcess.stderr.on("data", (data) => {
-      stderr += data.toString();
-    });
-
-    pythonProcess.on("close", (code) => {
-      if (code !== 0) {
-        console.error("Python script error:", stderr);
-        reject(new Error(`Python script exited with code ${code}`));
-        return;
+
+    if (message.type === "ready") {
+      if (message.error) {
+        console.error("Python 워커 모델 로드 오류:", message.error);
       }
+      markReady();
+      return;
+    }
 
-      try {
-        // stdout에서 JSON 추출 (마지막 유효한 JSON 라인)
-        const lines = stdout.trim().split('\n');
-        let jsonLine = "";
-        
-        for (let i = lines.length - 1; i >= 0; i--) {
-          const line = lines[i].trim();
-          if (line.startsWith('{') && line.endsWith('}')) {
-            jsonLine = line;
-            break;
-          }
-        }
-        
-        if (!jsonLine) {
-          jsonLine = stdout.trim();
+    const request = pending.get(message.id);
+    if (!request) {
+      return;
+    }
+    pending.delete(message.id);
+    clearTimeout(request.timer);
+
+    if (message.type === "error") {
+      request.reject(new Error(message.error || "Failed to parse prediction result"));
+    } else {
+      request.resolve(message);
+    }
+  });
+
+  const fail = (error: Error) => {
+    if (worker === current) {
+      worker = null;
+    }
+    markFailed(error);
+    failPending(current, error);
+  };
+
+  return { current, fail };
+}
+
+/**
+ * predict_api.py를 상주 워커(--serve)로 한 번만 띄우고 재사용
+ * 워커가 종료되면 다음 요청 때 다시 띄운다.
+ */
+function spawnWorker(): PredictWorker {
+  const projectRoot = getProjectRoot();
+  const scriptPath = pathResolve(projectRoot, "predict_api.py");
+  const onnxModelPath = pathResolve(projectRoot, "models", "quickdraw_rnn.onnx");
+
+  // Python 명령어 (conda 환경 또는 기본 python)
+  const pythonCommand = process.env.PYTHON_PATH || "python";
+
+  // ONNX 모델 경로를 인자로 전달 (FaceAgeRank 방식)
+  // ONNX_MODEL_PATHS(쉼표 구분, "이름=경로")가 있으면 워커가 환경 변수에서 여러 모델을 로드
+  const pythonArgs = process.env.ONNX_MODEL_PATHS
+    ? [scriptPath, "--serve"]
+    : [scriptPath, onnxModelPath, "--serve"];
+
+  const pythonProcess = spawn(pythonCommand, pythonArgs, {
+    cwd: projectRoot,
+    stdio: ["pipe", "pipe", "pipe"],
+  });
+
+  const { current, fail } = attachWorker(pythonProcess.stdout, (line) => {
+    pythonProcess.stdin.write(line);
+  });
+  // 워커가 죽은 뒤의 쓰기(EPIPE 등)가 처리되지 않은 예외로 서버 전체를 종료시키지 않도록 연결 실패로 처리
+  pythonProcess.stdin.on("error", (error) => {
+    fail(new Error(`Python 워커에 요청을 보낼 수 없습니다: ${error.message}`));
+  });
+  let stderr = "";
+
+  pythonProcess.stderr.on("data", (data) => {
+    // 최근 로그만 보관 (종료 시 원인 출력용)
+    stderr = (stderr + data.toString()).slice(-4000);
+  });
+
+  // 워커 로그(모델 로드, 재로드, 오류 등)를 줄 단위로 서버 로그에 출력
+  // 양은 워커의 PREDICT_LOG_LEVEL(debug/info/warning/error)로 조절
+  createInterface({ input: pythonProcess.stderr }).on("line", (line) => {
+    if (line.trim()) {
+      console.log(`[predict_api] ${line}`);
+    }
+  });
+
+  pythonProcess.on("close", (code) => {
+    if (code !== 0) {
+      console.error("Python script error:", stderr);
+    }
+    fail(new Error(`Python script exited with code ${code}`));
+  });
+
+  pythonProcess.on("error", (error: any) => {
+    fail(error.code === "ENOENT"
+      ? new Error(`Python 실행 파일을 찾을 수 없습니다. (${pythonCommand}) PYTHON_PATH 환경 변수를 설정하거나 Python이 설치되어 있는지 확인하세요.`)
+      : new Error(`Python 스크립트 실행 중 오류: ${error.message}`));
+  });
+
+  return current;
+}
+
+/**
+ * 이미 실행 중인 프로세스 풀(predict_api.py --pool)의 Unix 소켓에 연결
+ * 상주 워커와 같은 한 줄 JSON 프로토콜을 사용하며, 연결이 끊기면 다음 요청 때 다시 연결한다.
+ */
+function connectPool(socketPath: string): PredictWorker {
+  const socket = createConnection(socketPath);
+  const { current, fail } = attachWorker(socket, (line) => {
+    socket.write(line);
+  });
+
+  socket.on("error", (error: any) => {
+    fail(error.code === "ENOENT" || error.code === "ECONNREFUSED"
+      ? new Error(`예측 풀 소켓에 연결할 수 없습니다. (${socketPath}) python predict_api.py --pool 이 실행 중인지 확인하세요.`)
+      : new Error(`예측 풀 연결 오류: ${error.message}`));
+  });
+
+  socket.on("close", () => {
+    fail(new Error(`예측 풀 연결이 끊어졌습니다. (${socketPath})`));
+  });
+
+  return current;
+}
+
+function getWorker(): PredictWorker {
+  if (worker) {
+    return worker;
+  }
+  return PREDICT_SOCKET ? connectPool(PREDICT_SOCKET) : spawnWorker();
+}
+
+/**
+ * 워커에 요청 1개를 보내고 같은 id의 응답 메시지를 기다림
+ */
+async function sendRequest(payload: Record<string, unknown>): Promise<any> {
+  const current = getWorker();
+
+  return new Promise((resolve, reject) => {
+    const id = nextRequestId++;
+    // 제한 시간은 워커 준비(모델 로드, 풀 연결) 대기부터 포함
+    let timedOut = false;
+    const timer = setTimeout(() => {
+      timedOut = true;
+      current.pending.delete(id);
+      reject(new Error(`Prediction timed out after ${REQUEST_TIMEOUT_MS}ms`));
+    }, REQUEST_TIMEOUT_MS);
+
+    current.ready.then(
+      () => {
+        if (timedOut) {
+          return;
         }
+        current.pending.set(id, { resolve, reject, timer });
 
-        const result = JSON.parse(jsonLine) as PredictionResult;
-        resolve(result);
-      } catch (error) {
-        console.error("Failed to parse Python output:", stdout);
-        reject(new Error("Failed to parse prediction result"));
+        // 요청을 한 줄 JSON으로 stdin에 전송
+        current.write(JSON.stringify({ ...payload, id }) + "\n");
+      },
+      (error: Error) => {
+        clearTimeout(timer);
+        reject(error);
       }
-    });
+    );
+  });
+}
+
+/**
+ * 그림을 바이너리 형식으로 변환
+ * 정수가 아니거나 int16 범위를 벗어난 좌표가 있으면 결과가 달라지지 않도록 null 반환 (JSON으로 전송)
+ */
+export function packDrawing(drawing: number[][][]): Buffer | null {
+  if (drawing.length > 0xffff) {
+    return null;
+  }
+
+  const counts = drawing.map((stroke) => (Array.isArray(stroke?.[0]) ? stroke[0].length : -1));
+  if (counts.some((count, idx) => count < 0 || count > 0xffff || !Array.isArray(drawing[idx][1]) || drawing[idx][1].length < count)) {
+    return null;
+  }
+  const totalPoints = counts.reduce((sum, count) => sum + count, 0);
+
+  const buffer = Buffer.alloc(PACKED_MAGIC.length + 2 + 2 * counts.length + 4 * totalPoints);
+  PACKED_MAGIC.copy(buffer, 0);
+  let offset = PACKED_MAGIC.length;
+  buffer.writeUInt16LE(counts.length, offset);
+  offset += 2;
+  for (const count of counts) {
+    buffer.writeUInt16LE(count, offset);
+    offset += 2;
+  }
 
-    pythonProcess.on("error", (error: any) => {
-      if (error.code === "ENOENT") {
-        reject(new Error(`Python 실행 파일을 찾을 수 없습니다. (${pythonCommand}) PYTHON_PATH 환경 변수를 설정하거나 Python이 설치되어 있는지 확인하세요.`));
-      } else {
-        reject(new Error(`Python 스크립트 실행 중 오류: ${error.message}`));
+  for (const axis of [0, 1]) {
+    for (let strokeIdx = 0; strokeIdx < drawing.length; strokeIdx++) {
+      const coords = drawing[strokeIdx][axis];
+      for (let pointIdx = 0; pointIdx < counts[strokeIdx]; pointIdx++) {
+        const value = coords[pointIdx];
+        if (!Number.isInteger(value) || value < -0x8000 || value > 0x7fff) {
+          return null;
+        }
+        buffer.writeInt16LE(value, offset);
+        offset += 2;
       }
-    });
+    }
+  }
+  return buffer;
+}
 
-    // JSON 데이터를 stdin으로 전송
-    const input = JSON.stringify({ drawing });
-    pythonProcess.stdin.write(input);
-    pythonProcess.stdin.end();
-  });
+/**
+ * model: 워커에 로드된 모델 이름 (predict_api.py의 "이름=경로" 또는 파일 이름), 없으면 기본 모델
+ */
+export async function predictDrawing(
+  drawing: number[][][],
+  model?: string
+): Promise<PredictionResult> {
+  const packed = WIRE_FORMAT === "binary" ? packDrawing(drawing) : null;
+  const payload = packed ? { packed: packed.toString("base64") } : { drawing };
+  const message = await sendRequest(model ? { ...payload, model } : payload);
+  return message.result as PredictionResult;
+}
+
+/**
+ * 이미 바이너리 형식(application/octet-stream)으로 받은 그림을 그대로 워커에 전달
+ */
+export async function predictPackedDrawing(packed: Buffer, model?: string): Promise<PredictionResult> {
+  const payload = { packed: packed.toString("base64") };
+  const message = await sendRequest(model ? { ...payload, model } : payload);
+  return message.result as PredictionResult;
 }
 
+/**
+ * 워커 계측 스냅샷: "prometheus"면 Prometheus 텍스트, "json"이면 JSON 객체
+ */
+export async function getMetrics(format: "prometheus" | "json" = "prometheus"): Promise<string | Record<string, unknown>> {
+  const message = await sendRequest({ type: "metrics", format });
+  return format === "prometheus" ? message.text : message.metrics;
+}
+
+/**
+ * 워커에 로드된 모델 목록 (이름별 경로, 카테고리, 재로드 횟수 등)
+ */
+export async function listModels(): Promise<Record<string, unknown>> {
+  const message = await sendRequest({ type: "models" });
+  return message.models;
+}
+
+/**
+ * 증분 예측: 그림 세션에 새로 추가된 점만 보내고 갱신된 예측을 받음
+ * strokes의 첫 구간은 열려 있던 획을 이어 그린 것이며, closed면 마지막 획이 끝난 것
+ */
+export async function predictDrawingStream(
+  session: string,
+  strokes: number[][][],
+  closed: boolean
+): Promise<PredictionResult> {
+  const message = await sendRequest({ type: "stream", session, strokes, closed });
+  return message.result as PredictionResult;
+}
+
+export async function endDrawingStream(session: string): Promise<boolean> {
+  const message = await sendRequest({ type: "stream_end", session });
+  return Boolean(message.closed);
+}
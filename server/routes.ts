@@ -1,17 +1,31 @@
-import { Router } from "express";
-import { predictDrawing } from "./quickdrawService.js";
+import express, { Router } from "express";
+import { predictDrawing, predictPackedDrawing, predictDrawingStream, endDrawingStream, listModels, getMetrics } from "./quickdrawService.js";
 
 const router = Router();
 
-router.post("/predict", async (req, res) => {
+// Content-Type: application/octet-stream이면 바이너리 그림(src/data_loader.py pack_drawing 형식)을 받음
+// 모델 선택: JSON 본문의 model 또는 ?model= (바이너리 본문일 때)
+router.post("/predict", express.raw({ type: "application/octet-stream", limit: "1mb" }), async (req, res) => {
   try {
-    const { drawing } = req.body;
+    const queryModel = typeof req.query.model === "string" ? req.query.model : undefined;
+
+    if (Buffer.isBuffer(req.body)) {
+      if (req.body.length < 6) {
+        return res.status(400).json({ error: "Invalid drawing data" });
+      }
+      return res.json(await predictPackedDrawing(req.body, queryModel));
+    }
+
+    const { drawing, model } = req.body;
 
     if (!drawing || !Array.isArray(drawing)) {
       return res.status(400).json({ error: "Invalid drawing data" });
     }
+    if (model !== undefined && typeof model !== "string") {
+      return res.status(400).json({ error: "Invalid model" });
+    }
 
-    const result = await predictDrawing(drawing);
+    const result = await predictDrawing(drawing, model ?? queryModel);
     res.json(result);
   } catch (error) {
     console.error("예측 오류:", error);
@@ -19,5 +33,58 @@ router.post("/predict", async (req, res) => {
   }
 });
 
+router.get("/models", async (_req, res) => {
+  try {
+    res.json(await listModels());
+  } catch (error) {
+    console.error("모델 목록 오류:", error);
+    res.status(500).json({ error: "모델 목록 조회 실패" });
+  }
+});
+
+// 워커 계측 (Prometheus 스크레이프용 텍스트, ?format=json이면 JSON)
+router.get("/metrics", async (req, res) => {
+  try {
+    if (req.query.format === "json") {
+      return res.json(await getMetrics("json"));
+    }
+    res.type("text/plain; version=0.0.4").send(await getMetrics("prometheus"));
+  } catch (error) {
+    console.error("계측 조회 오류:", error);
+    res.status(500).json({ error: "계측 조회 실패" });
+  }
+});
+
+router.post("/predict/stream", async (req, res) => {
+  try {
+    const { session, strokes, closed } = req.body;
+
+    if (typeof session !== "string" || !Array.isArray(strokes)) {
+      return res.status(400).json({ error: "Invalid stream data" });
+    }
+
+    const result = await predictDrawingStream(session, strokes, Boolean(closed));
+    res.json(result);
+  } catch (error) {
+    console.error("증분 예측 오류:", error);
+    res.status(500).json({ error: "예측 실패" });
+  }
+});
+
+router.post("/predict/stream/end", async (req, res) => {
+  try {
+    const { session } = req.body;
+
+    if (typeof session !== "string") {
+      return res.status(400).json({ error: "Invalid session" });
+    }
+
+    res.json({ closed: await endDrawingStream(session) });
+  } catch (error) {
+    console.error("세션 종료 오류:", error);
+    res.status(500).json({ error: "세션 종료 실패" });
+  }
+});
+
 export default router;
 
@@ -1,10 +1,364 @@
+import os
 import json
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+from multiprocessing import resource_tracker, shared_memory
 from pathlib import Path
 
 MAX_SEQ_LEN = 200
+# Padded lengths for length-bucketed batching and inference (last one is MAX_SEQ_LEN)
+BUCKET_LENGTHS = (25, 50, 100, MAX_SEQ_LEN)
 
-def drawing_to_sequence(drawing):
+# Bump when the cache layout or drawing_to_sequence output changes
+CACHE_VERSION = 1
+# Δx, Δy are multiples of 1/255 for integer coordinates, so they fit int16 exactly
+CACHE_SCALE = 255.0
+DECODE_CHUNK = 4096
+# Byte-range size of one parallel parsing task
+PARSE_CHUNK_BYTES = 16 * 1024 * 1024
+
+# Stroke simplification (same steps as Google's "simplified" QuickDraw data):
+# align to the top-left and scale uniformly to 0-255, optionally resample at a fixed
+# spacing, then Ramer-Douglas-Peucker with this epsilon and round to integers
+SIMPLIFY_EPSILON = 2.0
+RESAMPLE_SPACING = None  # e.g. 1.0 to resample strokes at 1-pixel spacing before RDP
+
+# Line-offset index saved next to each ndjson file (<stem>.idx.npy): offsets[i] is the
+# byte offset of line i and offsets[-1] the end of the last line, so line i is
+# file[offsets[i]:offsets[i + 1]] and a sample of K lines costs K seeks
+LINE_INDEX_SUFFIX = ".idx.npy"
+INDEX_BLOCK_BYTES = 16 * 1024 * 1024
+
+# How load_category_sample picks K lines of a file
+# "first": the first K lines (what max_items does), "random": uniform without replacement,
+# "stratified": one random line from each of K equal slices of the file,
+# "reservoir": uniform without replacement in one pass over the file, no index needed
+SAMPLING_METHODS = ("first", "random", "stratified", "reservoir")
+
+# Packed binary drawing: magic, uint16 stroke count, uint16 point count per stroke,
+# then all x coordinates and all y coordinates as int16 (everything little-endian)
+PACKED_MAGIC = b"QDB1"
+PACKED_HEADER = len(PACKED_MAGIC) + 2
+
+def _fill_points(xs, ys, lengths, out):
+    """
+    Write the (Δx, Δy, end_flag) sequence of concatenated stroke points into a zeroed array.
+    
+    Args:
+        xs, ys: float64 coordinates of (at least) the first min(sum(lengths), len(out)) points
+        lengths: int64 array with the number of points of each stroke
+        out: Zero-filled float32 array of shape (seq_len, 3)
+    
+    Returns:
+        Number of points written (before padding)
+    """
+    n_points = min(int(lengths.sum()), len(out))
+    if n_points == 0:
+        return 0
+    
+    # First point of the entire drawing keeps a zero delta
+    out[1:n_points, 0] = np.diff(xs[:n_points]) / 255.0
+    out[1:n_points, 1] = np.diff(ys[:n_points]) / 255.0
+    
+    # end_flag is 1 at the last point of each non-empty stroke
+    ends = np.cumsum(lengths)[lengths > 0] - 1
+    out[ends[ends < n_points], 2] = 1.0
+    
+    return n_points
+
+def _fill_sequence(drawing, out, simplify=False):
+    """
+    Write the (Δx, Δy, end_flag) sequence of one drawing into a zeroed array.
+    
+    Strokes are concatenated, deltas come from np.diff over the whole drawing
+    (so the first point of a stroke is relative to the last point of the
+    previous stroke), and end flags are set at the stroke offsets. Only the
+    first len(out) points are read.
+    
+    Args:
+        drawing: List of strokes, where each stroke is [x_coords, y_coords]
+        out: Zero-filled float32 array of shape (seq_len, 3)
+        simplify: Run simplify_points on the drawing first
+    
+    Returns:
+        Number of points written (before padding)
+    """
+    if simplify:
+        return _fill_points(*simplify_points(*drawing_to_points(drawing)), out)
+    
+    lengths = np.fromiter((len(stroke[0]) for stroke in drawing), dtype=np.int64, count=len(drawing))
+    n_points = min(int(lengths.sum()), len(out))
+    if n_points == 0:
+        return 0
+    
+    # Coordinates are read as float64 so the deltas match Python's int/float arithmetic exactly
+    xs = np.fromiter(chain.from_iterable(stroke[0] for stroke in drawing), dtype=np.float64, count=n_points)
+    # Extra y values of a stroke are ignored (stroke length is len(x)), so later strokes stay aligned
+    ys = np.fromiter(
+        chain.from_iterable(stroke[1][:len(stroke[0])] for stroke in drawing),
+        dtype=np.float64,
+        count=n_points
+    )
+    
+    return _fill_points(xs, ys, lengths, out)
+
+def drawing_to_points(drawing):
+    """
+    Flatten a drawing into coordinate arrays.
+    
+    Args:
+        drawing: List of strokes, where each stroke is [x_coords, y_coords]
+    
+    Returns:
+        Tuple (xs, ys, lengths): float64 coordinates of all points (strokes
+        concatenated) and the number of points of each stroke
+    """
+    lengths = np.fromiter((len(stroke[0]) for stroke in drawing), dtype=np.int64, count=len(drawing))
+    n_points = int(lengths.sum())
+    xs = np.fromiter(chain.from_iterable(stroke[0] for stroke in drawing), dtype=np.float64, count=n_points)
+    ys = np.fromiter(
+        chain.from_iterable(stroke[1][:len(stroke[0])] for stroke in drawing),
+        dtype=np.float64,
+        count=n_points
+    )
+    return xs, ys, lengths
+
+def normalize_points(xs, ys):
+    """
+    Align a drawing to the top-left corner and scale it uniformly so the larger
+    side spans 0-255 (aspect ratio is kept).
+    
+    Returns:
+        Tuple (xs, ys) of float64 arrays
+    """
+    xs = np.asarray(xs, dtype=np.float64)
+    ys = np.asarray(ys, dtype=np.float64)
+    if len(xs) == 0:
+        return xs, ys
+    xs = xs - xs.min()
+    ys = ys - ys.min()
+    extent = max(xs.max(), ys.max())
+    if extent > 0:
+        xs *= 255.0 / extent
+        ys *= 255.0 / extent
+    return xs, ys
+
+def resample_stroke(x, y, spacing):
+    """
+    Resample one stroke at a fixed arc-length spacing (endpoints are kept).
+    
+    Returns:
+        Tuple (x, y) of float64 arrays
+    """
+    if len(x) < 2:
+        return x, y
+    distance = np.concatenate([[0.0], np.cumsum(np.hypot(np.diff(x), np.diff(y)))])
+    if distance[-1] == 0:
+        return x[:1], y[:1]
+    targets = np.arange(0.0, distance[-1], spacing)
+    targets = np.append(targets, distance[-1])
+    return np.interp(targets, distance, x), np.interp(targets, distance, y)
+
+def rdp_mask(x, y, epsilon, lengths=None):
+    """
+    Ramer-Douglas-Peucker simplification of concatenated strokes.
+    
+    All open segments of all strokes are split in one vectorized step per
+    recursion level (distances to each segment's chord, per-segment maximum
+    with reduceat), so the Python loop runs once per level instead of once
+    per segment. Ties go to the first point, as in the recursive algorithm.
+    
+    Args:
+        x, y: Coordinates of all points, strokes concatenated
+        epsilon: Maximum distance of a dropped point from the simplified stroke
+        lengths: Number of points of each stroke (None for a single stroke)
+    
+    Returns:
+        Boolean array, True for points to keep
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    lengths = np.array([len(x)] if lengths is None else lengths, dtype=np.int64)
+    keep = np.zeros(len(x), dtype=bool)
+    
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+    nonempty = lengths > 0
+    keep[starts[nonempty]] = True
+    keep[ends[nonempty] - 1] = True
+    
+    # Segments (first, last point index) that still have interior points
+    seg_start = starts[lengths > 2]
+    seg_end = ends[lengths > 2] - 1
+    while len(seg_start):
+        counts = seg_end - seg_start - 1
+        offsets = np.cumsum(counts) - counts
+        seg_id = np.repeat(np.arange(len(counts)), counts)
+        points = seg_start[seg_id] + 1 + (np.arange(int(counts.sum())) - offsets[seg_id])
+        
+        chord_x = (x[seg_end] - x[seg_start])[seg_id]
+        chord_y = (y[seg_end] - y[seg_start])[seg_id]
+        px = x[points] - x[seg_start][seg_id]
+        py = y[points] - y[seg_start][seg_id]
+        chord = np.hypot(chord_x, chord_y)
+        distances = np.where(
+            chord > 0,
+            np.abs(chord_x * py - chord_y * px) / np.where(chord > 0, chord, 1.0),
+            np.hypot(px, py)
+        )
+        
+        seg_max = np.maximum.reduceat(distances, offsets)
+        positions = np.where(distances == seg_max[seg_id], np.arange(len(distances)), len(distances))
+        first_max = np.minimum.reduceat(positions, offsets)
+        
+        split = seg_max > epsilon
+        mids = points[first_max[split]]
+        keep[mids] = True
+        
+        seg_start = np.concatenate([seg_start[split], mids])
+        seg_end = np.concatenate([mids, seg_end[split]])
+        has_interior = seg_end - seg_start >= 2
+        seg_start = seg_start[has_interior]
+        seg_end = seg_end[has_interior]
+    return keep
+
+def simplify_points(xs, ys, lengths, epsilon=SIMPLIFY_EPSILON, resample_spacing=RESAMPLE_SPACING):
+    """
+    Bring raw canvas strokes to the form of the simplified QuickDraw training data.
+    
+    The drawing is normalized to 0-255 (normalize_points), each stroke is
+    optionally resampled (resample_stroke), simplified with RDP (rdp_mask) and
+    rounded to integer coordinates.
+    
+    Args:
+        xs, ys: Coordinates of all points, strokes concatenated
+        lengths: Number of points of each stroke
+        epsilon: RDP epsilon in 0-255 units
+        resample_spacing: Resampling spacing (None to skip resampling)
+    
+    Returns:
+        Tuple (xs, ys, lengths) of the simplified drawing (float64 integer-valued coordinates)
+    """
+    lengths = np.asarray(lengths, dtype=np.int64)
+    xs, ys = normalize_points(xs, ys)
+    
+    if resample_spacing:
+        bounds = np.concatenate([[0], np.cumsum(lengths)])
+        strokes = [
+            resample_stroke(xs[bounds[idx]:bounds[idx + 1]], ys[bounds[idx]:bounds[idx + 1]], resample_spacing)
+            for idx in range(len(lengths))
+        ]
+        lengths = np.array([len(x) for x, _ in strokes], dtype=np.int64)
+        xs = np.concatenate([x for x, _ in strokes]) if strokes else xs
+        ys = np.concatenate([y for _, y in strokes]) if strokes else ys
+    
+    keep = rdp_mask(xs, ys, epsilon, lengths)
+    kept_before = np.concatenate([[0], np.cumsum(keep)])
+    ends = np.cumsum(lengths)
+    new_lengths = kept_before[ends] - kept_before[ends - lengths]
+    return np.rint(xs[keep]), np.rint(ys[keep]), new_lengths
+
+def pack_drawing(drawing):
+    """
+    Encode a drawing in the packed binary format (see PACKED_MAGIC).
+    
+    Args:
+        drawing: List of strokes with integer coordinates in the int16 range
+    
+    Returns:
+        bytes
+    """
+    lengths = np.array([len(stroke[0]) for stroke in drawing], dtype=np.int64)
+    if len(lengths) > 0xFFFF or (lengths > 0xFFFF).any():
+        raise ValueError("Too many strokes or points per stroke for the packed format")
+    
+    xs = np.fromiter(chain.from_iterable(stroke[0] for stroke in drawing), dtype=np.int64, count=int(lengths.sum()))
+    ys = np.fromiter(
+        chain.from_iterable(stroke[1][:len(stroke[0])] for stroke in drawing),
+        dtype=np.int64,
+        count=int(lengths.sum())
+    )
+    coords = np.concatenate([xs, ys])
+    if len(coords) and (coords.min() < -0x8000 or coords.max() > 0x7FFF):
+        raise ValueError("Coordinates out of int16 range for the packed format")
+    
+    return b"".join([
+        PACKED_MAGIC,
+        np.uint16(len(lengths)).astype('<u2').tobytes(),
+        lengths.astype('<u2').tobytes(),
+        coords.astype('<i2').tobytes(),
+    ])
+
+def unpack_drawing(data):
+    """
+    Decode a packed binary drawing without building Python lists.
+    
+    Args:
+        data: bytes-like object produced by pack_drawing
+    
+    Returns:
+        Tuple (xs, ys, lengths): int16 coordinate arrays of all points and
+        the number of points of each stroke (int64)
+    """
+    data = memoryview(data)
+    if len(data) < PACKED_HEADER or bytes(data[:len(PACKED_MAGIC)]) != PACKED_MAGIC:
+        raise ValueError("Not a packed drawing (bad magic)")
+    
+    n_strokes = int(np.frombuffer(data, dtype='<u2', count=1, offset=len(PACKED_MAGIC))[0])
+    if len(data) < PACKED_HEADER + 2 * n_strokes:
+        raise ValueError("Truncated packed drawing")
+    lengths = np.frombuffer(data, dtype='<u2', count=n_strokes, offset=PACKED_HEADER).astype(np.int64)
+    
+    n_points = int(lengths.sum())
+    offset = PACKED_HEADER + 2 * n_strokes
+    if len(data) != offset + 4 * n_points:
+        raise ValueError(f"Packed drawing size mismatch: {len(data)} bytes for {n_points} points")
+    coords = np.frombuffer(data, dtype='<i2', count=2 * n_points, offset=offset)
+    return coords[:n_points], coords[n_points:], lengths
+
+def points_to_sequence(xs, ys, lengths, return_length=False, simplify=False):
+    """
+    drawing_to_sequence for flat coordinate arrays (see unpack_drawing).
+    
+    Args:
+        xs, ys: Coordinates of all points, strokes concatenated
+        lengths: Number of points of each stroke
+        return_length: Also return the number of real (unpadded) timesteps
+        simplify: Run simplify_points first
+    
+    Returns:
+        numpy array of shape (MAX_SEQ_LEN, 3), or (sequence, length) if return_length is True
+    """
+    if simplify:
+        xs, ys, lengths = simplify_points(xs, ys, lengths)
+    sequence = np.zeros((MAX_SEQ_LEN, 3), dtype=np.float32)
+    length = _fill_points(
+        np.asarray(xs, dtype=np.float64),
+        np.asarray(ys, dtype=np.float64),
+        np.asarray(lengths, dtype=np.int64),
+        sequence
+    )
+    if return_length:
+        return sequence, length
+    return sequence
+
+def packed_to_sequence(data, return_length=False, simplify=False):
+    """
+    drawing_to_sequence for a packed binary drawing.
+    
+    Args:
+        data: bytes-like object produced by pack_drawing
+        return_length: Also return the number of real (unpadded) timesteps
+        simplify: Run simplify_points first
+    
+    Returns:
+        numpy array of shape (MAX_SEQ_LEN, 3), identical to drawing_to_sequence
+        of the unpacked drawing, or (sequence, length) if return_length is True
+    """
+    return points_to_sequence(*unpack_drawing(data), return_length=return_length, simplify=simplify)
+
+def drawing_to_sequence(drawing, return_length=False, simplify=False):
     """
     Convert strokes into a time sequence.
     Compute (Δx, Δy, end_flag) for each point.
@@ -13,60 +367,76 @@ def drawing_to_sequence(drawing):
     
     Args:
         drawing: List of strokes, where each stroke is [x_coords, y_coords]
+        return_length: Also return the number of real (unpadded) timesteps
+        simplify: Normalize and simplify raw strokes first (see simplify_points)
     
     Returns:
-        numpy array of shape (MAX_SEQ_LEN, 3) with (Δx, Δy, end_flag)
+        numpy array of shape (MAX_SEQ_LEN, 3) with (Δx, Δy, end_flag),
+        or (sequence, length) if return_length is True
     """
-    sequence = []
-    prev_x = None
-    prev_y = None
+    sequence = np.zeros((MAX_SEQ_LEN, 3), dtype=np.float32)
+    length = _fill_sequence(drawing, sequence, simplify)
+    if return_length:
+        return sequence, length
+    return sequence
+
+def drawings_to_sequences(drawings, return_lengths=False, simplify=False):
+    """
+    Convert many drawings at once into a single preallocated batch.
     
-    for stroke_idx, stroke in enumerate(drawing):
-        x_coords = stroke[0]
-        y_coords = stroke[1]
-        
-        # Convert to sequence of points
-        for point_idx in range(len(x_coords)):
-            curr_x = x_coords[point_idx]
-            curr_y = y_coords[point_idx]
-            
-            if prev_x is None:
-                # First point of the entire drawing: delta is 0
-                dx = 0
-                dy = 0
-            else:
-                # Compute delta from previous point
-                dx = curr_x - prev_x
-                dy = curr_y - prev_y
-            
-            # Normalize by dividing by 255
-            dx_normalized = dx / 255.0
-            dy_normalized = dy / 255.0
-            
-            # end_flag is 1 if this is the last point of the stroke, 0 otherwise
-            end_flag = 1.0 if point_idx == len(x_coords) - 1 else 0.0
-            
-            sequence.append([dx_normalized, dy_normalized, end_flag])
-            
-            # Update previous coordinates
-            prev_x = curr_x
-            prev_y = curr_y
-    
-    # Convert to numpy array
-    sequence = np.array(sequence, dtype=np.float32)
-    
-    # Pad or truncate to MAX_SEQ_LEN
-    if len(sequence) < MAX_SEQ_LEN:
-        # Pad with zeros
-        padding = np.zeros((MAX_SEQ_LEN - len(sequence), 3), dtype=np.float32)
-        sequence = np.vstack([sequence, padding])
-    elif len(sequence) > MAX_SEQ_LEN:
-        # Truncate
-        sequence = sequence[:MAX_SEQ_LEN]
+    Args:
+        drawings: List of drawings (see drawing_to_sequence)
+        return_lengths: Also return the number of real timesteps of each drawing
+        simplify: Normalize and simplify raw strokes first (see simplify_points)
     
-    return sequence
+    Returns:
+        numpy array of shape (N, MAX_SEQ_LEN, 3), row i equal to drawing_to_sequence(drawings[i]),
+        or (sequences, lengths) if return_lengths is True
+    """
+    sequences = np.zeros((len(drawings), MAX_SEQ_LEN, 3), dtype=np.float32)
+    lengths = np.zeros(len(drawings), dtype=np.int32)
+    for idx, drawing in enumerate(drawings):
+        lengths[idx] = _fill_sequence(drawing, sequences[idx], simplify)
+    if return_lengths:
+        return sequences, lengths
+    return sequences
+
+def sequence_lengths(X):
+    """
+    Number of timesteps up to the last non-padding row of padded sequences.
+    
+    The last real point of a drawing always has end_flag = 1, so trailing
+    all-zero rows are exactly the padding.
+    
+    Args:
+        X: Array of shape (N, T, 3) or (T, 3)
+    
+    Returns:
+        int32 array of shape (N,) (or a single int for a 2D input)
+    """
+    nonzero = np.any(np.asarray(X) != 0, axis=-1)
+    steps = nonzero.shape[-1]
+    lengths = steps - np.argmax(nonzero[..., ::-1], axis=-1)
+    lengths = np.where(nonzero.any(axis=-1), lengths, 0).astype(np.int32)
+    return int(lengths) if lengths.ndim == 0 else lengths
+
+def bucket_length(length, bucket_lengths=BUCKET_LENGTHS):
+    """
+    Smallest bucket length that fits a sequence of the given length.
+    
+    Args:
+        length: Number of real timesteps
+        bucket_lengths: Increasing padded lengths to choose from
+    
+    Returns:
+        Padded length to run the sequence at
+    """
+    for bucket in bucket_lengths:
+        if length <= bucket:
+            return bucket
+    return bucket_lengths[-1]
 
-def load_category_ndjson(path, label_index, max_items=None):
+def load_category_ndjson(path, label_index, max_items=None, simplify=False):
     """
     Reads ndjson file and returns (X, y) converted from QuickDraw drawing format.
     
@@ -74,13 +444,17 @@ def load_category_ndjson(path, label_index, max_items=None):
         path: Path to the ndjson file
         label_index: Integer label for this category
         max_items: Maximum number of items to load (None for all)
+        simplify: Normalize and simplify strokes (for raw, unsimplified QuickDraw data)
     
     Returns:
         Tuple (X, y) where X is numpy array of sequences and y is numpy array of labels
     """
     path = Path(path)
-    X = []
-    y = []
+    
+    # Preallocated output, grown by doubling when the item count is unknown
+    capacity = max_items if max_items is not None else 1024
+    X = np.zeros((capacity, MAX_SEQ_LEN, 3), dtype=np.float32)
+    count = 0
     
     with open(path, 'r') as f:
         for line_idx, line in enumerate(f):
@@ -96,18 +470,539 @@ def load_category_ndjson(path, label_index, max_items=None):
             if len(drawing) == 0:
                 continue
             
-            # Convert drawing to sequence
-            sequence = drawing_to_sequence(drawing)
+            if count == len(X):
+                X = np.concatenate([X, np.zeros_like(X)], axis=0)
+            
+            # Convert drawing to sequence directly into the output row
+            _fill_sequence(drawing, X[count], simplify)
+            count += 1
+    
+    X = X[:count].copy() if count < len(X) else X
+    y = np.full(count, label_index, dtype=np.int32)
+    
+    return X, y
+
+def _prefix_end(path, max_lines):
+    """
+    Byte offset just past the first max_lines lines of a file (file size if shorter).
+    """
+    size = os.path.getsize(path)
+    if max_lines is None:
+        return size
+    
+    seen = 0
+    offset = 0
+    with open(path, 'rb') as f:
+        while seen < max_lines:
+            block = f.read(1024 * 1024)
+            if not block:
+                return size
+            newlines = block.count(b'\n')
+            if seen + newlines >= max_lines:
+                pos = -1
+                for _ in range(max_lines - seen):
+                    pos = block.index(b'\n', pos + 1)
+                return offset + pos + 1
+            seen += newlines
+            offset += len(block)
+    return offset
+
+def _chunk_ranges(path, end, chunk_bytes):
+    """
+    Split [0, end) of a file into byte ranges that start and end on line boundaries.
+    """
+    ranges = []
+    start = 0
+    with open(path, 'rb') as f:
+        while start < end:
+            stop = min(start + chunk_bytes, end)
+            if stop < end:
+                f.seek(stop)
+                f.readline()
+                stop = min(f.tell(), end)
+            ranges.append((start, stop))
+            start = stop
+    return ranges
+
+def _read_lines(path, start, stop):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        lines = f.read(stop - start).split(b'\n')
+    if lines and not lines[-1]:
+        lines.pop()
+    return lines
+
+def _count_chunk_lines(task):
+    path, start, stop = task
+    return len(_read_lines(path, start, stop))
+
+def _parse_chunk(task):
+    """
+    Pool worker: parse one byte range into its rows of the shared output array.
+    
+    Returns:
+        Number of rows written (drawings that were not empty)
+    """
+    shm_name, total_rows, path, start, stop, row_offset, simplify = task
+    # Workers share the parent's resource tracker (started before the pool), which
+    # keeps one registration per name, so attaching here needs no unregister
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        out = np.ndarray((total_rows, MAX_SEQ_LEN, 3), dtype=np.float32, buffer=shm.buf)
+        count = 0
+        for line in _read_lines(path, start, stop):
+            drawing = json.loads(line.strip()).get('drawing', [])
+            if len(drawing) == 0:
+                continue
+            _fill_sequence(drawing, out[row_offset + count], simplify)
+            count += 1
+        del out
+        return count
+    finally:
+        shm.close()
+
+def load_ndjson_parallel(paths, max_items=None, num_workers=None, chunk_bytes=PARSE_CHUNK_BYTES, simplify=False):
+    """
+    Parse several ndjson files on a process pool, per file and per byte-range chunk.
+    
+    Every chunk gets a fixed slice of one shared-memory array sized by its line
+    count, so workers write sequences in place and only return row counts.
+    Rows are then compacted in (file, line) order, which makes the output
+    identical to calling load_category_ndjson on each file in turn.
+    
+    Args:
+        paths: List of ndjson file paths
+        max_items: Maximum number of lines to read per file (None for all)
+        num_workers: Number of worker processes (None for os.cpu_count())
+        chunk_bytes: Approximate byte size of one parsing task
+        simplify: Normalize and simplify strokes (see load_category_ndjson)
+    
+    Returns:
+        Tuple (X, counts) where X is the float32 array of all sequences in file order
+        and counts is the number of sequences from each file
+    """
+    ranges = []
+    for file_idx, path in enumerate(paths):
+        end = _prefix_end(path, max_items)
+        ranges.extend((file_idx, str(path), start, stop) for start, stop in _chunk_ranges(path, end, chunk_bytes))
+    
+    # Start the tracker before forking so workers inherit it instead of each starting
+    # their own (which would report the parent's segment as leaked on exit)
+    resource_tracker.ensure_running()
+    with ProcessPoolExecutor(max_workers=num_workers) as pool:
+        line_counts = list(pool.map(_count_chunk_lines, [(path, start, stop) for _, path, start, stop in ranges]))
+        row_offsets = np.concatenate([[0], np.cumsum(line_counts, dtype=np.int64)])
+        total_rows = int(row_offsets[-1])
+        
+        shm = shared_memory.SharedMemory(create=True, size=max(1, total_rows * MAX_SEQ_LEN * 3 * 4))
+        try:
+            shared = np.ndarray((total_rows, MAX_SEQ_LEN, 3), dtype=np.float32, buffer=shm.buf)
+            shared.fill(0)
+            tasks = [
+                (shm.name, total_rows, path, start, stop, int(row_offsets[idx]), simplify)
+                for idx, (_, path, start, stop) in enumerate(ranges)
+            ]
+            written = list(pool.map(_parse_chunk, tasks))
             
-            X.append(sequence)
-            y.append(label_index)
+            # Compact: keep the written prefix of every chunk's slice, in order
+            X = np.empty((sum(written), MAX_SEQ_LEN, 3), dtype=np.float32)
+            counts = np.zeros(len(paths), dtype=np.int64)
+            pos = 0
+            for idx, (file_idx, _, _, _) in enumerate(ranges):
+                n = written[idx]
+                X[pos:pos + n] = shared[row_offsets[idx]:row_offsets[idx] + n]
+                counts[file_idx] += n
+                pos += n
+            del shared
+        finally:
+            shm.close()
+            shm.unlink()
+    
+    return X, counts
+
+def line_index_path(path):
+    """
+    Path of the line-offset index for an ndjson file (<stem>.idx.npy in the same directory).
+    """
+    path = Path(path)
+    return path.with_name(path.stem + LINE_INDEX_SUFFIX)
+
+def build_line_index(path, block_bytes=INDEX_BLOCK_BYTES):
+    """
+    Scan an ndjson file once and save the byte offset of every line next to it.
+    
+    Offsets are stored as uint32 when the file is smaller than 4 GiB (uint64
+    otherwise), i.e. 4 bytes per drawing. The file is written under a temporary
+    name and renamed, so a partial index is never picked up.
+    
+    Args:
+        path: Path to the ndjson file
+        block_bytes: Read size while scanning for newlines
+    
+    Returns:
+        The offsets array (number of lines + 1 entries)
+    """
+    path = Path(path)
+    size = os.path.getsize(path)
+    dtype = np.uint32 if size < 2 ** 32 else np.uint64
+    
+    parts = [np.zeros(1, dtype=dtype)]
+    offset = 0
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(block_bytes)
+            if not block:
+                break
+            newlines = np.flatnonzero(np.frombuffer(block, dtype=np.uint8) == 0x0A)
+            parts.append((newlines + offset + 1).astype(dtype))
+            offset += len(block)
+    offsets = np.concatenate(parts)
+    if offsets[-1] != size:
+        # Last line without a trailing newline
+        offsets = np.append(offsets, dtype(size))
+    
+    index_path = line_index_path(path)
+    tmp_path = index_path.with_name(f"{index_path.stem}.{os.getpid()}.tmp.npy")
+    np.save(tmp_path, offsets)
+    os.replace(tmp_path, index_path)
+    return offsets
+
+def open_line_index(path):
+    """
+    Open the line-offset index of an ndjson file with np.memmap, if it is still valid.
+    
+    The index is valid if it ends at the current file size and is not older than the file.
+    
+    Returns:
+        Read-only memmap of the offsets, or None if there is no valid index
+    """
+    path = Path(path)
+    index_path = line_index_path(path)
+    if not index_path.exists():
+        return None
+    
+    stat = os.stat(path)
+    if os.stat(index_path).st_mtime_ns < stat.st_mtime_ns:
+        return None
+    try:
+        offsets = np.load(index_path, mmap_mode='r')
+    except (OSError, ValueError):
+        return None
+    if offsets.ndim != 1 or not len(offsets) or int(offsets[-1]) != stat.st_size:
+        return None
+    return offsets
+
+def load_line_index(path):
+    """
+    Line-offset index of an ndjson file, built on first use.
+    """
+    offsets = open_line_index(path)
+    if offsets is None:
+        offsets = build_line_index(path)
+    return offsets
+
+def sample_line_indices(num_lines, k, method="random", rng=None):
+    """
+    Choose which lines of a file to load.
+    
+    Args:
+        num_lines: Number of lines in the file
+        k: Number of lines to choose (all lines if k is None or >= num_lines)
+        method: "first", "random" or "stratified" (see SAMPLING_METHODS)
+        rng: numpy Generator (a fresh unseeded one if None)
+    
+    Returns:
+        Sorted int64 array of line numbers
+    """
+    if k is None or k >= num_lines:
+        return np.arange(num_lines, dtype=np.int64)
+    if method == "first":
+        return np.arange(k, dtype=np.int64)
+    
+    rng = rng if rng is not None else np.random.default_rng()
+    if method == "random":
+        return np.sort(rng.choice(num_lines, size=k, replace=False)).astype(np.int64)
+    if method == "stratified":
+        # Slice boundaries are distinct because k < num_lines
+        bounds = (np.arange(k + 1, dtype=np.int64) * num_lines) // k
+        return bounds[:-1] + (rng.random(k) * (bounds[1:] - bounds[:-1])).astype(np.int64)
+    raise ValueError(f"Unknown sampling method: {method} (choose from {SAMPLING_METHODS})")
+
+def _reservoir_lines(path, k, rng):
+    """
+    Uniform sample of k raw lines in one pass (Algorithm L), without an index.
+    
+    Returns:
+        The sampled lines in file order
+    """
+    reservoir = []
+    with open(path, 'rb') as f:
+        for line_idx, line in enumerate(f):
+            reservoir.append((line_idx, line))
+            if len(reservoir) == k:
+                break
+        
+        if len(reservoir) == k:
+            w = np.exp(np.log(1.0 - rng.random()) / k)
+            while True:
+                # Number of lines to skip before the next one that enters the reservoir
+                skip = int(np.floor(np.log(1.0 - rng.random()) / np.log1p(-w)))
+                line = b""
+                for _ in range(skip + 1):
+                    line = f.readline()
+                    if not line:
+                        break
+                    line_idx += 1
+                if not line:
+                    break
+                reservoir[rng.integers(k)] = (line_idx, line)
+                w *= np.exp(np.log(1.0 - rng.random()) / k)
+    
+    reservoir.sort(key=lambda item: item[0])
+    return [line for _, line in reservoir]
+
+def load_category_sample(path, label_index, k, method="random", seed=None, simplify=False):
+    """
+    Load a sample of K drawings of one category without parsing the whole file.
+    
+    "first", "random" and "stratified" use the line-offset index (built next to
+    the file on first use) to seek straight to the chosen lines, so the cost is
+    O(K) instead of O(file). "reservoir" needs no index but reads the whole file once
+    (it still parses only the K chosen lines).
+    Lines with an empty drawing are skipped, so fewer than K rows can be returned.
+    
+    Args:
+        path: Path to the ndjson file
+        label_index: Integer label for this category
+        k: Number of drawings to sample (None for all)
+        method: One of SAMPLING_METHODS
+        seed: Seed for the sample; the same (seed, label_index) gives the same lines
+        simplify: Normalize and simplify strokes (see load_category_ndjson)
+    
+    Returns:
+        Tuple (X, y) where X is numpy array of sequences and y is numpy array of labels
+    """
+    if method not in SAMPLING_METHODS:
+        raise ValueError(f"Unknown sampling method: {method} (choose from {SAMPLING_METHODS})")
+    rng = np.random.default_rng(None if seed is None else [seed, label_index])
+    
+    if method == "reservoir" and k is not None:
+        lines = _reservoir_lines(path, k, rng)
+    else:
+        offsets = load_line_index(path)
+        chosen = sample_line_indices(len(offsets) - 1, k, method, rng)
+        starts = offsets[chosen].astype(np.int64)
+        stops = offsets[chosen + 1].astype(np.int64)
+        lines = []
+        with open(path, 'rb') as f:
+            for start, stop in zip(starts, stops):
+                f.seek(start)
+                lines.append(f.read(stop - start))
     
-    X = np.array(X, dtype=np.float32)
-    y = np.array(y, dtype=np.int32)
+    X = np.zeros((len(lines), MAX_SEQ_LEN, 3), dtype=np.float32)
+    count = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        drawing = json.loads(line).get('drawing', [])
+        if len(drawing) == 0:
+            continue
+        _fill_sequence(drawing, X[count], simplify)
+        count += 1
     
+    X = X[:count].copy() if count < len(X) else X
+    y = np.full(count, label_index, dtype=np.int32)
     return X, y
 
-def load_dataset(categories, base_path="data/raw", max_items=None):
+def _sample_category(task):
+    return load_category_sample(*task)[0]
+
+def quantize_sequences(X):
+    """
+    Encode float32 sequences as int16 (Δx, Δy scaled by CACHE_SCALE, end_flag as 0/1).
+    
+    Args:
+        X: float32 array of shape (N, MAX_SEQ_LEN, 3)
+    
+    Returns:
+        int16 array of the same shape, or None if decoding it would not reproduce X exactly
+        (e.g. drawings with non-integer coordinates)
+    """
+    scaled = X.astype(np.float64)
+    scaled[..., :2] *= CACHE_SCALE
+    if len(X) and np.abs(scaled).max() > np.iinfo(np.int16).max:
+        return None
+    
+    q = np.rint(scaled).astype(np.int16)
+    if not np.array_equal(decode_sequences(q, CACHE_SCALE), X):
+        return None
+    return q
+
+def decode_sequences(q, scale):
+    """
+    Decode cached sequences back to float32, bit-identical to drawing_to_sequence.
+    
+    Division happens in float64 before the float32 cast, as in drawing_to_sequence.
+    Works on memmaps chunk by chunk to keep temporaries small.
+    
+    Args:
+        q: int16 (or float32) array of shape (N, MAX_SEQ_LEN, 3)
+        scale: Scale factor stored with the cache (None for float32 caches)
+    
+    Returns:
+        float32 array of shape (N, MAX_SEQ_LEN, 3)
+    """
+    if scale is None:
+        return np.array(q, dtype=np.float32)
+    
+    X = np.empty(q.shape, dtype=np.float32)
+    for start in range(0, len(q), DECODE_CHUNK):
+        chunk = q[start:start + DECODE_CHUNK].astype(np.float64)
+        chunk[..., :2] /= scale
+        X[start:start + DECODE_CHUNK] = chunk
+    return X
+
+def _cache_meta(path, max_items, simplify=False):
+    stat = os.stat(path)
+    return {
+        "version": CACHE_VERSION,
+        "source": str(Path(path).resolve()),
+        "source_size": stat.st_size,
+        "source_mtime_ns": stat.st_mtime_ns,
+        "max_seq_len": MAX_SEQ_LEN,
+        "max_items": max_items,
+        # Absent (None) for caches of unsimplified sequences, so older caches stay valid
+        "simplify": [SIMPLIFY_EPSILON, RESAMPLE_SPACING] if simplify else None,
+    }
+
+def open_sequence_cache(path, max_items=None, cache_dir="data/cache", simplify=False):
+    """
+    Open the cache for one ndjson file with np.memmap, if it is still valid.
+    
+    The cache is valid only if it was built from the same source file
+    (path, size, mtime), the same MAX_SEQ_LEN, the same max_items and the
+    same simplification settings.
+    
+    Args:
+        path: Path to the source ndjson file
+        max_items: max_items the cache must have been built with
+        cache_dir: Directory holding the cache files
+        simplify: Whether the cache must hold simplified sequences
+    
+    Returns:
+        Tuple (sequences, scale) where sequences is a read-only memmap of shape
+        (N, MAX_SEQ_LEN, 3), or None if there is no valid cache
+    """
+    path = Path(path)
+    data_path = Path(cache_dir) / f"{path.stem}.npy"
+    meta_path = Path(cache_dir) / f"{path.stem}.json"
+    
+    if not data_path.exists() or not meta_path.exists():
+        return None
+    
+    try:
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    
+    expected = _cache_meta(path, max_items, simplify)
+    if any(meta.get(key) != value for key, value in expected.items()):
+        return None
+    
+    # A truncated or foreign .npy is treated like a missing cache and rebuilt
+    try:
+        sequences = np.load(data_path, mmap_mode='r')
+    except (OSError, ValueError):
+        return None
+    if sequences.shape != (meta["count"], MAX_SEQ_LEN, 3):
+        return None
+    return sequences, meta["scale"]
+
+def build_sequence_cache(path, max_items=None, cache_dir="data/cache", X=None, simplify=False):
+    """
+    Parse one ndjson file and write its sequence cache.
+    
+    Sequences are stored as int16 when they round-trip exactly, float32 otherwise.
+    Files are written under temporary names and renamed, metadata last, so an
+    interrupted build never leaves a cache that looks valid.
+    
+    Args:
+        path: Path to the source ndjson file
+        max_items: Maximum number of items to load (None for all)
+        cache_dir: Directory to write the cache files to
+        X: Already parsed sequences of this file (parsed here if None)
+        simplify: Normalize and simplify strokes when parsing
+    
+    Returns:
+        Tuple (sequences, scale) as returned by open_sequence_cache
+    """
+    path = Path(path)
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    data_path = cache_dir / f"{path.stem}.npy"
+    meta_path = cache_dir / f"{path.stem}.json"
+    
+    meta = _cache_meta(path, max_items, simplify)
+    if X is None:
+        X, _ = load_category_ndjson(path, 0, max_items=max_items, simplify=simplify)
+    
+    q = quantize_sequences(X)
+    scale = CACHE_SCALE if q is not None else None
+    stored = q if q is not None else X
+    
+    # Per-process temporary names: several training workers may build the same cache at once
+    tmp_data_path = cache_dir / f"{path.stem}.{os.getpid()}.tmp.npy"
+    np.save(tmp_data_path, stored)
+    os.replace(tmp_data_path, data_path)
+    
+    meta.update({"count": len(stored), "dtype": str(stored.dtype), "scale": scale})
+    tmp_meta_path = cache_dir / f"{path.stem}.json.{os.getpid()}.tmp"
+    with open(tmp_meta_path, 'w') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_meta_path, meta_path)
+    
+    return np.load(data_path, mmap_mode='r'), scale
+
+def load_category_cached(path, label_index, max_items=None, cache_dir="data/cache", simplify=False):
+    """
+    Same as load_category_ndjson, but reads from the sequence cache when valid
+    and builds it otherwise.
+    
+    Only opening the cache is near-constant time: the memmap is decoded into a
+    full float32 array here, so time and memory are still O(N), without the
+    JSON parsing. Callers that can work batch by batch (the streaming input
+    pipeline) should use open_sequence_cache and decode_sequences per row or batch.
+    
+    Args:
+        path: Path to the ndjson file
+        label_index: Integer label for this category
+        max_items: Maximum number of items to load (None for all)
+        cache_dir: Directory holding the cache files
+        simplify: Normalize and simplify strokes (see load_category_ndjson)
+    
+    Returns:
+        Tuple (X, y) where X is numpy array of sequences and y is numpy array of labels
+    """
+    cached = open_sequence_cache(path, max_items=max_items, cache_dir=cache_dir, simplify=simplify)
+    if cached is None:
+        cached = build_sequence_cache(path, max_items=max_items, cache_dir=cache_dir, simplify=simplify)
+    
+    sequences, scale = cached
+    X = decode_sequences(sequences, scale)
+    y = np.full(len(X), label_index, dtype=np.int32)
+    return X, y
+
+def load_dataset(
+    categories,
+    base_path="data/raw",
+    max_items=None,
+    cache_dir=None,
+    num_workers=1,
+    simplify=False,
+    sample=None,
+    seed=None
+):
     """
     Loads all categories and returns combined (X, y) as NumPy arrays.
     
@@ -115,21 +1010,64 @@ def load_dataset(categories, base_path="data/raw", max_items=None):
         categories: List of category names
         base_path: Base path to the raw data directory
         max_items: Maximum number of items per category (None for all)
+        cache_dir: Directory for the per-category sequence cache (None to always parse ndjson)
+        num_workers: Number of processes for ndjson parsing (1 for serial, None for all cores)
+        simplify: Normalize and simplify strokes (for raw, unsimplified QuickDraw data)
+        sample: Sampling method for the max_items drawings of each category
+            (see load_category_sample); None takes the first max_items lines.
+            Samples are read through the line-offset index and bypass cache_dir.
+        seed: Seed for sample
     
     Returns:
         Tuple (X, y) where X is numpy array of all sequences and y is numpy array of all labels
     """
     base_path = Path(base_path)
-    all_X = []
-    all_y = []
+    paths = []
     
-    for label_index, category in enumerate(categories):
+    for category in categories:
         filepath = base_path / f"{category}.ndjson"
         
         if not filepath.exists():
             raise FileNotFoundError(f"File not found: {filepath}")
-        
-        X, y = load_category_ndjson(filepath, label_index, max_items=max_items)
+        paths.append(filepath)
+    
+    parallel = num_workers is None or num_workers > 1
+    
+    if sample is not None:
+        tasks = [(path, label_index, max_items, sample, seed, simplify) for label_index, path in enumerate(paths)]
+        if parallel:
+            with ProcessPoolExecutor(max_workers=num_workers) as pool:
+                all_X = list(pool.map(_sample_category, tasks))
+        else:
+            all_X = [_sample_category(task) for task in tasks]
+        y = np.repeat(np.arange(len(paths), dtype=np.int32), [len(X) for X in all_X])
+        return np.concatenate(all_X, axis=0), y
+    
+    if cache_dir is None and parallel:
+        X, counts = load_ndjson_parallel(paths, max_items=max_items, num_workers=num_workers, simplify=simplify)
+        y = np.repeat(np.arange(len(paths), dtype=np.int32), counts)
+        return X, y
+    
+    if cache_dir is not None and parallel:
+        # Parse every category without a valid cache in one parallel pass
+        missing = [
+            path for path in paths
+            if open_sequence_cache(path, max_items=max_items, cache_dir=cache_dir, simplify=simplify) is None
+        ]
+        if missing:
+            X, counts = load_ndjson_parallel(missing, max_items=max_items, num_workers=num_workers, simplify=simplify)
+            for path, part in zip(missing, np.split(X, np.cumsum(counts)[:-1])):
+                build_sequence_cache(path, max_items=max_items, cache_dir=cache_dir, X=part, simplify=simplify)
+            del X
+    
+    all_X = []
+    all_y = []
+    
+    for label_index, filepath in enumerate(paths):
+        if cache_dir is not None:
+            X, y = load_category_cached(filepath, label_index, max_items=max_items, cache_dir=cache_dir, simplify=simplify)
+        else:
+            X, y = load_category_ndjson(filepath, label_index, max_items=max_items, simplify=simplify)
         all_X.append(X)
         all_y.append(y)
     
@@ -138,4 +1076,3 @@ def load_dataset(categories, base_path="data/raw", max_items=None):
     y = np.concatenate(all_y, axis=0)
     
     return X, y
-
@@ -0,0 +1,245 @@
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+
+# Softmax temperature of the KD loss: higher values expose more of the
+# teacher's ranking of the wrong classes ("dark knowledge")
+DEFAULT_TEMPERATURE = 4.0
+# Weight of the KD loss; the rest goes to cross-entropy on the true labels
+DEFAULT_ALPHA = 0.9
+# Batch size for computing teacher logits over the training set
+SOFT_TARGET_BATCH_SIZE = 1024
+
+def logits_function(model):
+    """
+    Pre-softmax logits of a classifier whose last layer is Dense(softmax).
+    
+    Computed from the input of the output layer with the layer's own kernel
+    and bias, so no log(probabilities) round trip (and no clipping) is needed.
+    
+    Args:
+        model: Keras model built by src.model.build_model
+    
+    Returns:
+        Function (x, training) -> float32 logits (batch, num_classes)
+    """
+    dense = model.layers[-1]
+    if not isinstance(dense, keras.layers.Dense):
+        raise ValueError(f"Last layer of {model.name} must be Dense, got {type(dense).__name__}")
+    features = keras.Model(model.inputs, dense.input)
+    
+    def logits(x, training=False):
+        h = tf.cast(features(x, training=training), dense.kernel.dtype)
+        return tf.matmul(h, dense.kernel) + dense.bias
+    
+    return logits
+
+def teacher_logits(teacher, X, batch_size=SOFT_TARGET_BATCH_SIZE):
+    """
+    Teacher logits for every sequence of X, computed in batches.
+    
+    Returns:
+        float32 array of shape (N, num_classes)
+    """
+    logits = tf.function(logits_function(teacher), reduce_retracing=True)
+    outputs = [
+        logits(tf.constant(X[start:start + batch_size], tf.float32)).numpy()
+        for start in range(0, len(X), batch_size)
+    ]
+    return np.concatenate(outputs, axis=0).astype(np.float32)
+
+def soft_targets_path(teacher_path, X, cache_dir):
+    """
+    Cache file for the teacher logits of X.
+    
+    The name depends on the teacher file (path, size, mtime) and the contents
+    of X, so a retrained teacher or a different training split never reuses
+    stale targets.
+    """
+    stat = os.stat(teacher_path)
+    digest = hashlib.sha1(json.dumps([
+        str(Path(teacher_path).resolve()), stat.st_size, stat.st_mtime_ns, X.shape,
+    ]).encode())
+    digest.update(np.ascontiguousarray(X).data)
+    return Path(cache_dir) / f"soft_targets_{Path(teacher_path).stem}_{digest.hexdigest()[:16]}.npy"
+
+def load_soft_targets(teacher, teacher_path, X, cache_dir=None, batch_size=SOFT_TARGET_BATCH_SIZE):
+    """
+    Teacher logits for X, read from cache_dir if they were computed before.
+    
+    Args:
+        teacher: Loaded teacher model
+        teacher_path: Teacher .keras file (part of the cache key)
+        X: Training sequences (N, T, 3)
+        cache_dir: Directory for the cached logits (None disables the cache)
+        batch_size: Batch size for the teacher
+    
+    Returns:
+        Tuple (logits (N, num_classes), True if they came from the cache)
+    """
+    if cache_dir is None:
+        return teacher_logits(teacher, X, batch_size), False
+    
+    path = soft_targets_path(teacher_path, X, cache_dir)
+    if path.exists():
+        logits = np.load(path)
+        if logits.shape == (len(X), teacher.output_shape[-1]):
+            return logits, True
+    
+    logits = teacher_logits(teacher, X, batch_size)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.stem}.{os.getpid()}.tmp.npy")
+    np.save(tmp_path, logits)
+    os.replace(tmp_path, path)
+    return logits, False
+
+def kd_loss(teacher_logits, student_logits, temperature):
+    """
+    Temperature-scaled distillation loss: T^2 * KL(softmax(t / T) || softmax(s / T)), per sample.
+    
+    The T^2 factor keeps the gradient scale independent of the temperature
+    (Hinton et al., "Distilling the Knowledge in a Neural Network").
+    """
+    teacher_probs = tf.nn.softmax(teacher_logits / temperature)
+    teacher_log_probs = tf.nn.log_softmax(teacher_logits / temperature)
+    student_log_probs = tf.nn.log_softmax(student_logits / temperature)
+    kl = tf.reduce_sum(teacher_probs * (teacher_log_probs - student_log_probs), axis=-1)
+    return kl * temperature ** 2
+
+class Distiller(keras.Model):
+    """
+    Trains a student model on precomputed teacher logits.
+    
+    Training batches are (x, (labels, teacher_logits)); the loss is
+    alpha * kd_loss + (1 - alpha) * cross-entropy on the labels.
+    Validation batches are plain (x, labels) and report the student's
+    cross-entropy and accuracy, so val_loss is comparable with a normal run.
+    Calling the distiller runs the student, and its weights are the
+    student's weights; save the student itself rather than the distiller.
+    
+    Args:
+        student: Model built by src.model.build_model
+        temperature: KD softmax temperature
+        alpha: Weight of the KD loss
+    """
+    
+    def __init__(self, student, temperature=DEFAULT_TEMPERATURE, alpha=DEFAULT_ALPHA):
+        super().__init__()
+        self.student = student
+        self.temperature = temperature
+        self.alpha = alpha
+        self.student_logits = logits_function(student)
+        
+        self.loss_tracker = keras.metrics.Mean(name="loss")
+        self.kd_tracker = keras.metrics.Mean(name="kd_loss")
+        self.ce_tracker = keras.metrics.Mean(name="ce_loss")
+        self.accuracy = keras.metrics.SparseCategoricalAccuracy(name="accuracy")
+        self._evaluating = False
+    
+    @property
+    def metrics(self):
+        # Must match the keys test_step returns: Keras then reads the final results
+        # from the metrics (aggregated over all workers) instead of the last step's output
+        if self._evaluating:
+            return [self.loss_tracker, self.accuracy]
+        return [self.loss_tracker, self.kd_tracker, self.ce_tracker, self.accuracy]
+    
+    def evaluate(self, *args, **kwargs):
+        self._evaluating = True
+        try:
+            return super().evaluate(*args, **kwargs)
+        finally:
+            self._evaluating = False
+    
+    def call(self, inputs, training=False):
+        return self.student(inputs, training=training)
+    
+    def train_step(self, data):
+        x, (y, teacher_logits) = data
+        with tf.GradientTape() as tape:
+            logits = self.student_logits(x, training=True)
+            ce = keras.losses.sparse_categorical_crossentropy(y, logits, from_logits=True)
+            kd = kd_loss(teacher_logits, logits, self.temperature)
+            loss = tf.reduce_mean(self.alpha * kd + (1 - self.alpha) * ce)
+            # Gradients are summed over replicas (multi-worker training), so each
+            # replica contributes its share of the global mean, as in Model.train_step
+            scaled_loss = loss / tf.distribute.get_strategy().num_replicas_in_sync
+        self.optimizer.minimize(scaled_loss, self.student.trainable_variables, tape=tape)
+        
+        self.loss_tracker.update_state(loss)
+        self.kd_tracker.update_state(kd)
+        self.ce_tracker.update_state(ce)
+        self.accuracy.update_state(y, logits)
+        return {m.name: m.result() for m in self.metrics}
+    
+    def test_step(self, data):
+        x, y = data
+        logits = self.student_logits(x, training=False)
+        ce = keras.losses.sparse_categorical_crossentropy(y, logits, from_logits=True)
+        self.loss_tracker.update_state(ce)
+        self.accuracy.update_state(y, logits)
+        return {"loss": self.loss_tracker.result(), "accuracy": self.accuracy.result()}
+
+def measure_latency(model, X, batch_size, runs=50):
+    """
+    CPU/GPU inference latency of a Keras model on one fixed batch (compiled call, no tf.data).
+    
+    Returns:
+        Dict with batchSize, meanMs, p50Ms, p95Ms, perSampleMs
+    """
+    predict = tf.function(lambda x: model(x, training=False))
+    batch = tf.constant(X[:batch_size], tf.float32)
+    predict(batch)  # trace + warm-up
+    
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        predict(batch).numpy()
+        timings.append((time.perf_counter() - start) * 1000.0)
+    
+    timings = np.array(timings)
+    p50, p95 = np.percentile(timings, [50, 95])
+    return {
+        "batchSize": int(batch.shape[0]),
+        "meanMs": float(timings.mean()),
+        "p50Ms": float(p50),
+        "p95Ms": float(p95),
+        "perSampleMs": float(timings.mean() / batch.shape[0]),
+    }
+
+def compare_models(teacher, student, X, y, runs=50, batch_size=SOFT_TARGET_BATCH_SIZE):
+    """
+    Accuracy, parameter count and latency (single drawing / batch of 64) of teacher and student.
+    
+    Returns:
+        Dict {"teacher": {...}, "student": {...}, "top1Agreement", "singleSpeedup", "batchedSpeedup"}
+    """
+    report = {}
+    predictions = {}
+    for name, model in (("teacher", teacher), ("student", student)):
+        probs = np.concatenate([
+            model(tf.constant(X[start:start + batch_size], tf.float32), training=False).numpy()
+            for start in range(0, len(X), batch_size)
+        ])
+        predictions[name] = np.argmax(probs, axis=1)
+        report[name] = {
+            "parameters": int(model.count_params()),
+            "accuracy": float(np.mean(predictions[name] == y)),
+            "latency": {
+                "single": measure_latency(model, X, 1, runs),
+                "batched": measure_latency(model, X, 64, max(runs // 4, 5)),
+            },
+        }
+    
+    report["top1Agreement"] = float(np.mean(predictions["teacher"] == predictions["student"]))
+    for kind in ("single", "batched"):
+        report[f"{kind}Speedup"] = (
+            report["teacher"]["latency"][kind]["meanMs"] / report["student"]["latency"][kind]["meanMs"]
+        )
+    return report
@@ -0,0 +1,148 @@
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import tensorflow as tf
+
+# Cluster spec of a multi-worker run, in the standard tf.distribute format:
+# {"cluster": {"worker": ["host1:port", "host2:port"]}, "task": {"type": "worker", "index": 0}}
+TF_CONFIG_ENV = "TF_CONFIG"
+
+def cluster_config(environ=os.environ):
+    """
+    Parse the TF_CONFIG cluster spec.
+    
+    Returns:
+        Tuple (worker addresses, task type, task index), or None if TF_CONFIG is not set
+    
+    Raises:
+        ValueError: TF_CONFIG is not valid JSON or has no worker list / task
+    """
+    raw = environ.get(TF_CONFIG_ENV)
+    if not raw:
+        return None
+    try:
+        config = json.loads(raw)
+        workers = list(config["cluster"]["worker"])
+        task_type = config["task"]["type"]
+        task_index = int(config["task"]["index"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Invalid {TF_CONFIG_ENV}: {e}") from e
+    if task_type == "worker" and not 0 <= task_index < len(workers):
+        raise ValueError(f"{TF_CONFIG_ENV} task index {task_index} is out of range for {len(workers)} workers")
+    return workers, task_type, task_index
+
+def make_config(workers, index):
+    """
+    TF_CONFIG value for worker `index` of a cluster (as set by scripts/launch_workers.py).
+    """
+    return json.dumps({"cluster": {"worker": list(workers)}, "task": {"type": "worker", "index": index}})
+
+def make_strategy(environ=os.environ):
+    """
+    Distribution strategy for this process.
+    
+    MultiWorkerMirroredStrategy (synchronous data parallelism with all-reduce
+    over gRPC) when TF_CONFIG lists a cluster, otherwise the default
+    single-device strategy. Must be called before any other TensorFlow op.
+    
+    Returns:
+        tf.distribute.Strategy
+    """
+    if cluster_config(environ) is None:
+        return tf.distribute.get_strategy()
+    return tf.distribute.MultiWorkerMirroredStrategy()
+
+def worker_info(strategy):
+    """
+    Position of this process in the cluster.
+    
+    Returns:
+        Tuple (number of workers, worker index, True if this is the chief worker)
+    """
+    resolver = getattr(strategy, "cluster_resolver", None)
+    if resolver is None or not resolver.cluster_spec().as_dict():
+        return 1, 0, True
+    num_workers = len(resolver.cluster_spec().as_dict().get("worker", []))
+    task_type, task_id = resolver.task_type, resolver.task_id
+    is_chief = task_type == "chief" or (task_type == "worker" and task_id == 0)
+    return num_workers, task_id or 0, is_chief
+
+def shard_arrays(arrays, num_shards, index):
+    """
+    Deterministic equal-size shard of aligned arrays: rows index, index + num_shards, ...
+    
+    Every shard is cut to the size of the smallest one, so all workers run
+    the same number of steps (a worker that finishes early would leave the
+    others waiting in the all-reduce).
+    
+    Args:
+        arrays: Sequence of arrays with the same first dimension
+        num_shards: Number of workers
+        index: This worker's index
+    
+    Returns:
+        List of sharded arrays
+    """
+    size = len(arrays[0]) // num_shards
+    return [np.asarray(array)[index::num_shards][:size] for array in arrays]
+
+def distribute_dataset(strategy, dataset_fn):
+    """
+    Per-worker input pipeline for strategy.
+    
+    dataset_fn() builds this worker's already-sharded dataset batched per
+    replica, so the global batch is the per-replica batch size times
+    strategy.num_replicas_in_sync. Auto-sharding is off because every
+    worker reads its own shard.
+    
+    Args:
+        strategy: Strategy from make_strategy
+        dataset_fn: Function () -> tf.data.Dataset
+    
+    Returns:
+        tf.distribute.DistributedDataset, or the dataset itself for a single process
+    """
+    if not isinstance(strategy, tf.distribute.MultiWorkerMirroredStrategy):
+        return dataset_fn()
+    
+    def make(input_context):
+        options = tf.data.Options()
+        options.experimental_distribute.auto_shard_policy = tf.data.experimental.AutoShardPolicy.OFF
+        return dataset_fn().with_options(options)
+    
+    return strategy.distribute_datasets_from_function(make)
+
+def barrier(strategy):
+    """
+    Block until every worker reaches this point (a one-element all-reduce).
+    
+    Keeps workers alive until the chief has finished its own work after
+    training, since a worker that exits early is reported as failed.
+    """
+    if isinstance(strategy, tf.distribute.MultiWorkerMirroredStrategy):
+        strategy.reduce(tf.distribute.ReduceOp.SUM, strategy.run(lambda: tf.constant(1.0)), axis=None)
+
+def save_on_chief(save_fn, path, is_chief, worker_index):
+    """
+    Save a model from every worker, keeping only the chief's file.
+    
+    All workers take part in saving (variables may be read with collective
+    ops), so non-chief workers write to a temporary directory that is
+    deleted afterwards.
+    
+    Args:
+        save_fn: Function (path) -> None, e.g. model.save
+        path: Destination of the chief's file
+        is_chief, worker_index: From worker_info
+    """
+    if is_chief:
+        save_fn(path)
+        return
+    tmp_dir = tempfile.mkdtemp(prefix=f"worker{worker_index}_")
+    try:
+        save_fn(os.path.join(tmp_dir, os.path.basename(path)))
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
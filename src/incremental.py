@@ -0,0 +1,141 @@
+import time
+
+import numpy as np
+
+from src.data_loader import MAX_SEQ_LEN
+
+class IncrementalSession:
+    """
+    Incremental prediction state for one drawing in progress.
+    
+    Points are fed as they are drawn. All points whose end_flag is final are
+    pushed through the recurrent model once and only the LSTM state is kept.
+    The last point of a stroke that is still open is not committed: it is
+    evaluated tentatively as the end of the drawing (end_flag = 1, exactly as
+    drawing_to_sequence would encode the partial drawing) from a copy of the
+    state, and committed with its real flag once the next point arrives.
+    Each update therefore costs time proportional to the new points only.
+    
+    Args:
+        run_step: Function (points (1, T, 3), state_h, state_c) -> (probabilities, state_h, state_c)
+        state_size: Number of LSTM units
+    """
+    
+    def __init__(self, run_step, state_size):
+        self.run_step = run_step
+        self.state_h = np.zeros((1, state_size), dtype=np.float32)
+        self.state_c = np.zeros((1, state_size), dtype=np.float32)
+        self.probabilities = None
+        self.num_points = 0
+        self.last_point = None
+        self.pending = None
+        self.updated_at = time.monotonic()
+    
+    def _encode(self, x, y, end_flag):
+        if self.last_point is None:
+            dx = dy = 0
+        else:
+            dx = x - self.last_point[0]
+            dy = y - self.last_point[1]
+        self.last_point = (x, y)
+        return [dx / 255.0, dy / 255.0, end_flag]
+    
+    def append(self, strokes, closed=False):
+        """
+        Add newly drawn points and return the updated class probabilities.
+        
+        Args:
+            strokes: New points as [[x_coords, y_coords], ...]. The first segment
+                continues the currently open stroke (if any); every segment but the
+                last one ends its stroke; the last one ends its stroke only if closed.
+            closed: Whether the stroke of the last segment is finished
+        
+        Returns:
+            float32 array of class probabilities for the drawing so far (None if it has no points)
+        """
+        self.updated_at = time.monotonic()
+        
+        # (x, y, ends_stroke) for every new point, with the pending point first
+        points = [] if self.pending is None else [self.pending]
+        self.pending = None
+        for seg_idx, stroke in enumerate(strokes):
+            xs, ys = stroke[0], stroke[1]
+            for point_idx in range(len(xs)):
+                points.append([xs[point_idx], ys[point_idx], False])
+            is_last_segment = seg_idx == len(strokes) - 1
+            if points and (not is_last_segment or closed):
+                points[-1][2] = True
+        if not strokes and closed and points:
+            points[-1][2] = True
+        
+        # drawing_to_sequence truncates at MAX_SEQ_LEN points
+        room = max(MAX_SEQ_LEN - self.num_points, 0)
+        truncated = len(points) > room
+        points = points[:room]
+        if not points:
+            return self.probabilities
+        
+        # The last point of an open stroke stays pending (unless later points were cut off,
+        # in which case its flag is already final)
+        if not points[-1][2] and not truncated:
+            self.pending = points.pop()
+        
+        if points:
+            committed = np.array(
+                [self._encode(x, y, 1.0 if ends else 0.0) for x, y, ends in points],
+                dtype=np.float32
+            )
+            self.num_points += len(committed)
+            probabilities, self.state_h, self.state_c = self.run_step(
+                committed[None], self.state_h, self.state_c
+            )
+            self.probabilities = probabilities[0]
+        
+        if self.pending is not None:
+            # Tentative: treat the pending point as the end of the drawing, keep the state unchanged
+            saved_last_point = self.last_point
+            tentative = np.array([self._encode(self.pending[0], self.pending[1], 1.0)], dtype=np.float32)
+            self.last_point = saved_last_point
+            probabilities, _, _ = self.run_step(tentative[None], self.state_h, self.state_c)
+            return probabilities[0]
+        
+        return self.probabilities
+
+class SessionStore:
+    """
+    Incremental sessions by id, bounded in count and idle time.
+    
+    Args:
+        create_session: Function returning a new IncrementalSession
+        max_sessions: Maximum number of live sessions (least recently updated are dropped)
+        ttl_seconds: Sessions idle for longer than this are dropped
+    """
+    
+    def __init__(self, create_session, max_sessions=1000, ttl_seconds=300.0):
+        self.create_session = create_session
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._sessions = {}
+    
+    def get(self, session_id):
+        self._expire()
+        session = self._sessions.pop(session_id, None)
+        if session is None:
+            session = self.create_session()
+            while len(self._sessions) >= self.max_sessions:
+                self._sessions.pop(next(iter(self._sessions)))
+        # Re-insert so dict order stays least recently used first
+        self._sessions[session_id] = session
+        return session
+    
+    def close(self, session_id):
+        return self._sessions.pop(session_id, None) is not None
+    
+    def __len__(self):
+        return len(self._sessions)
+    
+    def _expire(self):
+        now = time.monotonic()
+        expired = [key for key, session in self._sessions.items() if now - session.updated_at > self.ttl_seconds]
+        for key in expired:
+            del self._sessions[key]
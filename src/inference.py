@@ -0,0 +1,472 @@
+import os
+import hashlib
+import logging
+import threading
+import time
+import queue
+from collections import deque
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+STATS_WINDOW = 1000
+
+# Names of onnxruntime.GraphOptimizationLevel / ExecutionMode members
+GRAPH_OPTIMIZATION_LEVELS = {
+    "disable": "ORT_DISABLE_ALL",
+    "basic": "ORT_ENABLE_BASIC",
+    "extended": "ORT_ENABLE_EXTENDED",
+    "all": "ORT_ENABLE_ALL",
+}
+
+EXECUTION_MODES = {
+    "sequential": "ORT_SEQUENTIAL",
+    "parallel": "ORT_PARALLEL",
+}
+
+# Model file contents read by a pre-forking supervisor (preload_model) and
+# inherited by its workers, keyed by model_identity of the file
+_preloaded_models = {}
+
+def _onnxruntime():
+    # Imported on first use, so processes serving NumPy models (src/numpy_engine.py) never load it
+    import onnxruntime
+    return onnxruntime
+
+def quantized_model_path(model_path):
+    """
+    Path of the INT8 artifact produced for a float ONNX model (<stem>.int8.onnx).
+    """
+    model_path = Path(model_path)
+    return str(model_path.with_name(f"{model_path.stem}.int8{model_path.suffix}"))
+
+def optimized_model_path(model_path):
+    """
+    Path of the graph-optimized artifact saved for an ONNX model (<stem>.opt.onnx).
+    """
+    model_path = Path(model_path)
+    return str(model_path.with_name(f"{model_path.stem}.opt{model_path.suffix}"))
+
+def make_session_options(
+    graph_optimization="all",
+    intra_op_threads=0,
+    inter_op_threads=0,
+    execution_mode="sequential",
+    enable_mem_arena=True,
+    enable_mem_pattern=True,
+    optimized_model_filepath=None
+):
+    """
+    Build ONNX Runtime session options.
+    
+    Args:
+        graph_optimization: One of GRAPH_OPTIMIZATION_LEVELS
+        intra_op_threads: Threads used inside one operator (0 = ONNX Runtime default)
+        inter_op_threads: Threads used across operators in parallel mode (0 = default)
+        execution_mode: One of EXECUTION_MODES
+        enable_mem_arena: Keep the CPU memory arena (faster allocation, higher resident memory)
+        enable_mem_pattern: Pre-plan allocations from the first run's shapes
+        optimized_model_filepath: If set, the optimized graph is written here when the session is created
+    
+    Returns:
+        onnxruntime.SessionOptions
+    """
+    if graph_optimization not in GRAPH_OPTIMIZATION_LEVELS:
+        raise ValueError(f"Unknown graph optimization level: {graph_optimization} (choose from {tuple(GRAPH_OPTIMIZATION_LEVELS)})")
+    if execution_mode not in EXECUTION_MODES:
+        raise ValueError(f"Unknown execution mode: {execution_mode} (choose from {tuple(EXECUTION_MODES)})")
+    
+    ort = _onnxruntime()
+    options = ort.SessionOptions()
+    options.graph_optimization_level = getattr(ort.GraphOptimizationLevel, GRAPH_OPTIMIZATION_LEVELS[graph_optimization])
+    options.intra_op_num_threads = int(intra_op_threads)
+    options.inter_op_num_threads = int(inter_op_threads)
+    options.execution_mode = getattr(ort.ExecutionMode, EXECUTION_MODES[execution_mode])
+    options.enable_cpu_mem_arena = bool(enable_mem_arena)
+    options.enable_mem_pattern = bool(enable_mem_pattern)
+    if optimized_model_filepath:
+        options.optimized_model_filepath = str(optimized_model_filepath)
+    return options
+
+def session_options_from_env(environ=os.environ):
+    """
+    Session options configured through ORT_* environment variables.
+    
+    ORT_GRAPH_OPTIMIZATION (disable/basic/extended/all, default all),
+    ORT_INTRA_OP_THREADS and ORT_INTER_OP_THREADS (default 0 = ONNX Runtime decides),
+    ORT_EXECUTION_MODE (sequential/parallel), ORT_ENABLE_MEM_ARENA and
+    ORT_ENABLE_MEM_PATTERN (1/0, default 1).
+    
+    Returns:
+        onnxruntime.SessionOptions
+    """
+    def flag(name):
+        return environ.get(name, "1").strip().lower() not in ("0", "false", "no", "off")
+    
+    return make_session_options(
+        graph_optimization=environ.get("ORT_GRAPH_OPTIMIZATION", "all"),
+        intra_op_threads=int(environ.get("ORT_INTRA_OP_THREADS", "0")),
+        inter_op_threads=int(environ.get("ORT_INTER_OP_THREADS", "0")),
+        execution_mode=environ.get("ORT_EXECUTION_MODE", "sequential"),
+        enable_mem_arena=flag("ORT_ENABLE_MEM_ARENA"),
+        enable_mem_pattern=flag("ORT_ENABLE_MEM_PATTERN")
+    )
+
+def save_optimized_model(model_path, output_path=None, graph_optimization="extended"):
+    """
+    Run ONNX Runtime's graph optimizations once and save the result.
+    
+    A server that loads the saved file can skip optimization at startup
+    (see resolve_model_path). "all" adds layout optimizations tied to the
+    CPU the artifact was built on, so "extended" is the portable default.
+    
+    Args:
+        model_path: Source ONNX model
+        output_path: Destination (default: optimized_model_path(model_path))
+        graph_optimization: One of GRAPH_OPTIMIZATION_LEVELS
+    
+    Returns:
+        Path of the saved optimized model
+    """
+    output_path = output_path or optimized_model_path(model_path)
+    options = make_session_options(graph_optimization=graph_optimization, optimized_model_filepath=output_path)
+    _onnxruntime().InferenceSession(str(model_path), options, providers=["CPUExecutionProvider"])
+    return output_path
+
+def resolve_model_path(model_path):
+    """
+    Pick the pre-optimized artifact for model_path if it is present and up to date.
+    
+    Returns:
+        (path to load, whether it is the pre-optimized artifact)
+    """
+    candidate = optimized_model_path(model_path)
+    if os.path.exists(candidate) and os.path.getmtime(candidate) >= os.path.getmtime(model_path):
+        return candidate, True
+    return str(model_path), False
+
+def preload_model(model_path, prefer_optimized=True):
+    """
+    Read the file load_session would load for model_path into memory once.
+    
+    A supervisor calls this before forking its workers (src/worker_pool.py):
+    the bytes are shared copy-on-write with every worker, so each worker's
+    load_session builds its session from memory instead of reading the file
+    again. The entry is only used while the file on disk is unchanged, so a
+    replaced model is still read from disk.
+    
+    Returns:
+        Path whose contents were preloaded
+    """
+    load_path = resolve_model_path(model_path)[0] if prefer_optimized else str(model_path)
+    identity = model_identity(load_path)
+    with open(load_path, "rb") as f:
+        data = f.read()
+    _preloaded_models[identity] = data
+    return load_path
+
+def load_session(model_path, options=None, prefer_optimized=True):
+    """
+    Create a CPU inference session, loading the pre-optimized artifact when available.
+    
+    Graph optimization is switched off for a pre-optimized artifact, since it
+    was already applied when the artifact was saved.
+    
+    Args:
+        model_path: ONNX model path
+        options: onnxruntime.SessionOptions (default: session_options_from_env())
+        prefer_optimized: Use <stem>.opt.onnx if it is newer than model_path
+    
+    Returns:
+        (onnxruntime.InferenceSession, path that was loaded)
+    """
+    ort = _onnxruntime()
+    options = options or session_options_from_env()
+    load_path, pre_optimized = resolve_model_path(model_path) if prefer_optimized else (str(model_path), False)
+    if pre_optimized:
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+    # Contents preloaded by preload_model, if the file has not changed since
+    source = _preloaded_models.get(model_identity(load_path), load_path)
+    session = ort.InferenceSession(source, options, providers=["CPUExecutionProvider"])
+    return session, load_path
+
+def warm_up_session(session, batch_sizes=(1,), lengths=(None,), runs=1):
+    """
+    Run a session on synthetic inputs so one-time costs (kernel setup, arena
+    growth, memory pattern planning) are paid before the first real request.
+    
+    Dynamic axes are filled with the batch size (first axis) and the sequence
+    length (other axes); fixed axes keep their size. Inputs are small non-zero
+    values so masking layers do not skip the recurrent work.
+    
+    Args:
+        session: onnxruntime.InferenceSession with float32 inputs
+        batch_sizes: Batch sizes to warm up
+        lengths: Lengths for dynamic non-batch axes (None = 1)
+        runs: Runs per shape
+    
+    Returns:
+        Elapsed seconds
+    """
+    start = time.perf_counter()
+    for batch_size in batch_sizes:
+        for length in lengths:
+            feeds = {}
+            for model_input in session.get_inputs():
+                shape = [
+                    dim if isinstance(dim, int) else (batch_size if axis == 0 else (length or 1))
+                    for axis, dim in enumerate(model_input.shape)
+                ]
+                feeds[model_input.name] = np.full(shape, 0.01, dtype=np.float32)
+            for _ in range(runs):
+                session.run(None, feeds)
+    return time.perf_counter() - start
+
+def model_identity(model_path):
+    """
+    Identity of a model file on disk: path, size and modification time.
+    
+    Returns:
+        String that changes whenever the file is replaced or rewritten (None if it does not exist)
+    """
+    try:
+        stat = os.stat(model_path)
+    except OSError:
+        return None
+    return f"{os.path.abspath(model_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+class PredictionCache:
+    """
+    Bounded LRU cache of model outputs keyed by the preprocessed input.
+    
+    The key is a hash of the (200, 3) sequence bytes plus the model identity,
+    so drawings that preprocess to the same sequence (e.g. the same shape drawn
+    at a different offset) share an entry. Entries older than ttl_seconds are
+    treated as misses. Each loaded model version owns its cache (a changed model
+    file is loaded into a new version with an empty cache), so the identity is
+    fixed for the cache's lifetime.
+    
+    Args:
+        identity: Identity of the loaded model version (see source_identity in src.registry)
+        max_entries: Maximum number of cached results (0 disables the cache)
+        ttl_seconds: Maximum age of an entry
+    """
+    
+    def __init__(self, identity, max_entries=1024, ttl_seconds=60.0):
+        self.identity = identity
+        self.max_entries = max(0, int(max_entries))
+        self.ttl_seconds = float(ttl_seconds)
+        
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._identity_bytes = str(identity).encode()
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+    
+    def key(self, sequence):
+        """
+        Cache key for one preprocessed sequence under this model version.
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(self._identity_bytes)
+        digest.update(np.ascontiguousarray(sequence, dtype=np.float32).tobytes())
+        return digest.hexdigest()
+    
+    def get(self, key):
+        """
+        Cached output for key, or None on a miss.
+        """
+        if not self.max_entries:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None and now - entry[1] > self.ttl_seconds:
+                self._counters["expirations"] += 1
+                entry = None
+            if entry is None:
+                self._counters["misses"] += 1
+                return None
+            # Re-insert so dict order stays least recently used first
+            self._entries[key] = entry
+            self._counters["hits"] += 1
+            return entry[0]
+    
+    def put(self, key, value):
+        """
+        Store an output, evicting the least recently used entries beyond max_entries.
+        """
+        if not self.max_entries:
+            return
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (value, time.monotonic())
+            while len(self._entries) > self.max_entries:
+                self._entries.pop(next(iter(self._entries)))
+                self._counters["evictions"] += 1
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self):
+        """
+        Returns:
+            Dict with size, limits, hit/miss/eviction/expiration counts and hit rate
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            size = len(self._entries)
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            "size": size,
+            "maxEntries": self.max_entries,
+            "ttlSeconds": self.ttl_seconds,
+            **counters,
+            "hitRate": counters["hits"] / lookups if lookups else None,
+        }
+
+class MicroBatcher:
+    """
+    Gather concurrent inference requests into a single batch.
+    
+    Requests submitted from any thread are queued. A background thread takes
+    the oldest request, then keeps collecting until either max_batch_size
+    requests are gathered or max_wait_ms has passed since the first one,
+    stacks them into one (N, ...) array and calls run_batch once.
+    Results are split back per request and handed to each callback. If
+    run_batch raises, every request of the batch gets the error; an exception
+    from a callback is logged and does not stop the thread.
+    
+    Args:
+        run_batch: Function taking an (N, ...) float32 array and returning
+            an array whose first axis has length N
+        max_batch_size: Maximum number of requests per batch
+        max_wait_ms: Maximum time to wait for more requests after the first
+    """
+    
+    def __init__(self, run_batch, max_batch_size=32, max_wait_ms=5.0):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = deque(maxlen=STATS_WINDOW)
+        self._queue_waits = deque(maxlen=STATS_WINDOW)
+        self._total_batches = 0
+        self._total_requests = 0
+        
+        self._thread = threading.Thread(target=self._loop, name="micro-batcher", daemon=True)
+        self._thread.start()
+    
+    def submit(self, sample, callback):
+        """
+        Queue one sample; callback(output, error) is called from the batch thread.
+        
+        Args:
+            sample: Input array for a single request (without batch axis)
+            callback: Called with (output_row, None) on success or (None, exception)
+        """
+        self._queue.put((sample, callback, time.perf_counter()))
+    
+    def close(self):
+        """
+        Process everything already queued, then stop the batch thread.
+        """
+        self._queue.put(None)
+        self._thread.join()
+    
+    def _collect(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+        
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Put the sentinel back so the loop stops after this batch
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+    
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            
+            started = time.perf_counter()
+            waits = [started - enqueued for _, _, enqueued in batch]
+            
+            try:
+                outputs = self.run_batch(np.stack([sample for sample, _, _ in batch]))
+                if len(outputs) != len(batch):
+                    raise ValueError(f"run_batch returned {len(outputs)} rows for a batch of {len(batch)}")
+                error = None
+            except Exception as e:
+                outputs = None
+                error = e
+            
+            with self._stats_lock:
+                self._total_batches += 1
+                self._total_requests += len(batch)
+                self._batch_sizes.append(len(batch))
+                self._queue_waits.extend(waits)
+            
+            # A failing callback must not stop the thread (every later request would hang)
+            # or keep the rest of the batch from getting its reply
+            for idx, (_, callback, _) in enumerate(batch):
+                try:
+                    if error is None:
+                        callback(outputs[idx], None)
+                    else:
+                        callback(None, error)
+                except Exception:
+                    logger.exception("Micro-batch callback failed")
+    
+    def stats(self):
+        """
+        Summary of recent batch sizes and queue waits (last STATS_WINDOW entries).
+        
+        Returns:
+            Dict with totals, batch size distribution and queue wait percentiles in ms
+        """
+        with self._stats_lock:
+            sizes = np.array(self._batch_sizes, dtype=np.float64)
+            waits_ms = np.array(self._queue_waits, dtype=np.float64) * 1000.0
+            total_batches = self._total_batches
+            total_requests = self._total_requests
+        
+        result = {
+            "maxBatchSize": self.max_batch_size,
+            "maxWaitMs": self.max_wait * 1000.0,
+            "totalBatches": total_batches,
+            "totalRequests": total_requests,
+            "batchSize": None,
+            "queueWaitMs": None,
+        }
+        if len(sizes):
+            result["batchSize"] = {
+                "mean": float(sizes.mean()),
+                "max": int(sizes.max()),
+                "histogram": {int(size): int(count) for size, count in zip(*np.unique(sizes, return_counts=True))},
+            }
+        if len(waits_ms):
+            p50, p95, p99 = np.percentile(waits_ms, [50, 95, 99])
+            result["queueWaitMs"] = {
+                "mean": float(waits_ms.mean()),
+                "p50": float(p50),
+                "p95": float(p95),
+                "p99": float(p99),
+                "max": float(waits_ms.max()),
+            }
+        return result
@@ -0,0 +1,246 @@
+import json
+import re
+import zlib
+from pathlib import Path
+
+import numpy as np
+import tensorflow as tf
+
+from src import data_loader
+
+SPLIT_BUCKETS = 10000
+# Lines whose drawing is missing or empty, detected without parsing the JSON
+EMPTY_DRAWING = re.compile(rb'"drawing"\s*:\s*\[\s*\]')
+
+def is_validation(category, item_index, validation_split):
+    """
+    Deterministic train/val assignment of one drawing.
+    
+    The decision depends only on the category name and the drawing's index
+    among the non-empty drawings of its file, so it is the same on every run,
+    machine and data source (ndjson or cache).
+    
+    Args:
+        category: Category name
+        item_index: Index of the drawing among non-empty drawings in its file
+        validation_split: Fraction of drawings assigned to validation
+    
+    Returns:
+        True if the drawing belongs to the validation split
+    """
+    bucket = zlib.crc32(f"{category}:{item_index}".encode()) % SPLIT_BUCKETS
+    return bucket < validation_split * SPLIT_BUCKETS
+
+def _iter_ndjson_lines(path, max_items):
+    """
+    Yield the raw JSON line of every non-empty drawing, reading line by line.
+    """
+    with open(path, 'rb') as f:
+        for line_idx, line in enumerate(f):
+            if max_items is not None and line_idx >= max_items:
+                break
+            # Same skip rule as load_category_ndjson, so item indices line up with the cache
+            if b'"drawing"' not in line or EMPTY_DRAWING.search(line):
+                continue
+            yield line
+
+def _iter_cache_rows(sequences):
+    """
+    Yield the encoded bytes of every cached sequence row from a memmap.
+    """
+    for item_index in range(len(sequences)):
+        yield sequences[item_index].tobytes()
+
+class _CategorySources:
+    """
+    Per-category streaming sources, shared by the generator and the map function.
+    """
+    
+    def __init__(self, categories, base_path, max_items, cache_dir, simplify=False):
+        base_path = Path(base_path)
+        self.entries = []
+        for category in categories:
+            filepath = base_path / f"{category}.ndjson"
+            
+            if not filepath.exists():
+                raise FileNotFoundError(f"File not found: {filepath}")
+            
+            cached = None
+            if cache_dir is not None:
+                cached = data_loader.open_sequence_cache(
+                    filepath,
+                    max_items=max_items,
+                    cache_dir=cache_dir,
+                    simplify=simplify
+                )
+            self.entries.append((category, filepath, cached))
+        self.max_items = max_items
+        self.simplify = simplify
+    
+    def __len__(self):
+        return len(self.entries)
+    
+    def generate(self, label_index, validation, validation_split, num_shards=1, shard_index=0):
+        category, filepath, cached = self.entries[label_index]
+        if cached is not None:
+            payloads = _iter_cache_rows(cached[0])
+        else:
+            payloads = _iter_ndjson_lines(filepath, self.max_items)
+        
+        split_index = 0
+        for item_index, payload in enumerate(payloads):
+            if is_validation(category, item_index, validation_split) == validation:
+                # Shards take every num_shards-th drawing of the split, before any parsing
+                if split_index % num_shards == shard_index:
+                    yield payload, label_index
+                split_index += 1
+    
+    def count(self, label_index, validation, validation_split):
+        category, filepath, cached = self.entries[label_index]
+        num_items = len(cached[0]) if cached is not None else sum(1 for _ in _iter_ndjson_lines(filepath, self.max_items))
+        return sum(
+            is_validation(category, item_index, validation_split) == validation
+            for item_index in range(num_items)
+        )
+    
+    def preprocess(self, payload, label_index):
+        _, _, cached = self.entries[label_index]
+        if cached is not None:
+            sequences, scale = cached
+            row = np.frombuffer(payload, dtype=sequences.dtype).reshape(1, data_loader.MAX_SEQ_LEN, 3)
+            return data_loader.decode_sequences(row, scale)[0]
+        
+        drawing = json.loads(payload).get('drawing', [])
+        return data_loader.drawing_to_sequence(drawing, simplify=self.simplify)
+
+def bucket_batches(ds, batch_size, bucket_lengths=data_loader.BUCKET_LENGTHS):
+    """
+    Batch (sequence, label) pairs by length instead of always padding to MAX_SEQ_LEN.
+    
+    Each padded sequence is trimmed to its real length, grouped with sequences
+    of a similar length and padded only up to its bucket length, so the
+    recurrent layers run over far fewer timesteps for short drawings.
+    The model must accept a variable time axis (build_model(variable_length=True)).
+    
+    Args:
+        ds: Unbatched tf.data.Dataset of (sequence (T, 3), label)
+        batch_size: Batch size of every bucket
+        bucket_lengths: Increasing padded lengths, the last one >= any sequence length
+    
+    Returns:
+        Batched tf.data.Dataset with sequences of shape (batch, bucket_length, 3)
+    """
+    def trim(sequence, label):
+        nonzero = tf.cast(tf.reduce_any(tf.not_equal(sequence, 0), axis=-1), tf.int32)
+        length = tf.shape(sequence)[0] - tf.argmax(tf.reverse(nonzero, [0]), output_type=tf.int32)
+        length = tf.maximum(length * tf.reduce_max(nonzero), 1)
+        return sequence[:length], label
+    
+    ds = ds.map(trim, num_parallel_calls=tf.data.AUTOTUNE)
+    return ds.bucket_by_sequence_length(
+        element_length_func=lambda sequence, label: tf.shape(sequence)[0],
+        # Boundaries are exclusive, and padding goes to boundary - 1 = bucket length
+        bucket_boundaries=[length + 1 for length in bucket_lengths],
+        bucket_batch_sizes=[batch_size] * (len(bucket_lengths) + 1),
+        pad_to_bucket_boundary=True
+    )
+
+def count_split_items(
+    categories,
+    base_path="data/raw",
+    max_items=None,
+    cache_dir=None,
+    validation=False,
+    validation_split=0.2,
+    simplify=False
+):
+    """
+    Number of drawings per category in one split of make_streaming_dataset.
+    
+    Reads the ndjson lines (or the cache length) without parsing any drawing.
+    
+    Returns:
+        int64 array with one count per category
+    """
+    sources = _CategorySources(categories, base_path, max_items, cache_dir, simplify)
+    return np.array([sources.count(idx, validation, validation_split) for idx in range(len(sources))], dtype=np.int64)
+
+def make_streaming_dataset(
+    categories,
+    base_path="data/raw",
+    max_items=None,
+    cache_dir=None,
+    validation=False,
+    validation_split=0.2,
+    batch_size=64,
+    shuffle_buffer=10000,
+    seed=42,
+    bucket_lengths=None,
+    simplify=False,
+    num_shards=1,
+    shard_index=0
+):
+    """
+    Build a tf.data pipeline that streams drawings without materializing the dataset.
+    
+    Each category is read by its own generator (from the memmap cache when a valid
+    one exists, otherwise line by line from ndjson) and the categories are
+    interleaved one sample at a time. Parsing / decoding runs in a parallel map,
+    and shuffling uses a bounded buffer, so memory use depends on shuffle_buffer
+    and batch_size only, not on the dataset size.
+    
+    Args:
+        categories: List of category names (label = position in the list)
+        base_path: Base path to the raw data directory
+        max_items: Maximum number of lines per category (None for all)
+        cache_dir: Directory of the sequence cache to prefer (None to always stream ndjson)
+        validation: True for the validation split, False for the training split
+        validation_split: Fraction of drawings assigned to validation
+        batch_size: Batch size
+        shuffle_buffer: Shuffle buffer size (training split only)
+        seed: Shuffle seed
+        bucket_lengths: Length buckets for bucket_batches (None for fixed MAX_SEQ_LEN batches)
+        simplify: Normalize and simplify strokes (see data_loader.simplify_points)
+        num_shards, shard_index: Read only every num_shards-th drawing of each
+            category's split, starting at shard_index (one shard per training worker)
+    
+    Returns:
+        tf.data.Dataset yielding (sequences, labels) batches
+    """
+    sources = _CategorySources(categories, base_path, max_items, cache_dir, simplify)
+    
+    def category_dataset(label_index):
+        return tf.data.Dataset.from_generator(
+            lambda idx: sources.generate(int(idx), validation, validation_split, num_shards, shard_index),
+            args=(label_index,),
+            output_signature=(
+                tf.TensorSpec((), tf.string),
+                tf.TensorSpec((), tf.int32)
+            )
+        )
+    
+    def preprocess(payload, label):
+        sequence = tf.numpy_function(
+            lambda p, l: sources.preprocess(p, int(l)).astype(np.float32),
+            [payload, label],
+            tf.float32
+        )
+        sequence = tf.ensure_shape(sequence, (data_loader.MAX_SEQ_LEN, 3))
+        return sequence, label
+    
+    # One generator per category, interleaved sample by sample for class balance
+    ds = tf.data.Dataset.range(len(sources)).interleave(
+        category_dataset,
+        cycle_length=len(sources),
+        block_length=1
+    )
+    ds = ds.map(preprocess, num_parallel_calls=tf.data.AUTOTUNE, deterministic=validation)
+    
+    if not validation:
+        ds = ds.shuffle(buffer_size=shuffle_buffer, seed=seed, reshuffle_each_iteration=True)
+    
+    if bucket_lengths is not None:
+        ds = bucket_batches(ds, batch_size, bucket_lengths)
+    else:
+        ds = ds.batch(batch_size)
+    return ds.prefetch(tf.data.AUTOTUNE)
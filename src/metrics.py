@@ -0,0 +1,243 @@
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds (seconds) for stage durations: 50 µs .. 2.5 s
+DURATION_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5,
+)
+
+# Upper bounds for batch sizes (powers of two up to the largest useful batch)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _format_labels(label_names, label_values, extra=()):
+    pairs = list(zip(label_names, label_values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+class Counter:
+    """
+    Monotonic counter, optionally split by labels.
+    
+    Args:
+        name: Metric name (Prometheus style, e.g. "quickdraw_requests_total")
+        help: One-line description
+        label_names: Names of the labels every inc() call passes
+    """
+    
+    kind = "counter"
+    
+    def __init__(self, name, help, label_names=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+        self._values = {}
+    
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+    
+    def snapshot(self):
+        """
+        Returns:
+            List of {"labels": {...}, "value": ...}
+        """
+        with self._lock:
+            values = dict(self._values)
+        return [
+            {"labels": dict(zip(self.label_names, key)), "value": value}
+            for key, value in sorted(values.items())
+        ]
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram (Prometheus semantics), optionally split by labels.
+    
+    Args:
+        name: Metric name (e.g. "quickdraw_stage_duration_seconds")
+        help: One-line description
+        buckets: Sorted upper bounds; +Inf is added automatically
+        label_names: Names of the labels every observe() call passes
+    """
+    
+    kind = "histogram"
+    
+    def __init__(self, name, help, buckets=DURATION_BUCKETS, label_names=()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+        self._series = {}
+    
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        # First bucket whose upper bound is >= value (non-cumulative counts are stored)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            series["counts"][idx] += 1
+            series["sum"] += value
+            series["count"] += 1
+    
+    @contextmanager
+    def time(self, **labels):
+        """
+        Observe the duration of the block in seconds.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+    
+    def _cumulative(self):
+        with self._lock:
+            series = {key: (list(s["counts"]), s["sum"], s["count"]) for key, s in self._series.items()}
+        result = []
+        for key, (counts, total, count) in sorted(series.items()):
+            cumulative = []
+            running = 0
+            for c in counts:
+                running += c
+                cumulative.append(running)
+            result.append((key, cumulative, total, count))
+        return result
+    
+    def snapshot(self):
+        """
+        Returns:
+            List of {"labels", "count", "sum", "mean", "buckets": {upper bound: cumulative count}}
+        """
+        return [
+            {
+                "labels": dict(zip(self.label_names, key)),
+                "count": count,
+                "sum": total,
+                "mean": total / count if count else None,
+                "buckets": {_format_value(bound): c for bound, c in zip(self.buckets, cumulative)},
+            }
+            for key, cumulative, total, count in self._cumulative()
+        ]
+
+
+class Metrics:
+    """
+    Set of counters and histograms exported together as JSON or Prometheus text.
+    """
+    
+    def __init__(self):
+        self._metrics = []
+        self.started_at = time.time()
+    
+    def counter(self, name, help, label_names=()):
+        metric = Counter(name, help, label_names)
+        self._metrics.append(metric)
+        return metric
+    
+    def histogram(self, name, help, buckets=DURATION_BUCKETS, label_names=()):
+        metric = Histogram(name, help, buckets, label_names)
+        self._metrics.append(metric)
+        return metric
+    
+    def snapshot(self):
+        """
+        Returns:
+            Dict of metric name -> {"type", "help", "series"} plus uptime
+        """
+        return {
+            "uptimeSeconds": time.time() - self.started_at,
+            "metrics": {
+                metric.name: {"type": metric.kind, "help": metric.help, "series": metric.snapshot()}
+                for metric in self._metrics
+            },
+        }
+    
+    def prometheus_text(self):
+        """
+        Prometheus text exposition format (version 0.0.4).
+        """
+        return snapshot_prometheus_text(self.snapshot())
+
+def merge_snapshots(snapshots):
+    """
+    Combine Metrics.snapshot() results of several processes serving the same metrics.
+    
+    Counter values and histogram counts, sums and buckets of series with the
+    same labels are added; uptime is the longest one.
+    
+    Args:
+        snapshots: List of Metrics.snapshot() dicts
+    
+    Returns:
+        Snapshot dict in the same format
+    """
+    merged = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot["metrics"].items():
+            target = merged.setdefault(name, {"type": metric["type"], "help": metric["help"], "series": {}})
+            for series in metric["series"]:
+                key = tuple(series["labels"].items())
+                current = target["series"].get(key)
+                if current is None:
+                    current = target["series"][key] = dict(series)
+                    if "buckets" in series:
+                        current["buckets"] = dict(series["buckets"])
+                elif metric["type"] == "counter":
+                    current["value"] += series["value"]
+                else:
+                    current["count"] += series["count"]
+                    current["sum"] += series["sum"]
+                    for bound, count in series["buckets"].items():
+                        current["buckets"][bound] = current["buckets"].get(bound, 0) + count
+    
+    for metric in merged.values():
+        metric["series"] = [metric["series"][key] for key in sorted(metric["series"])]
+        if metric["type"] == "histogram":
+            for series in metric["series"]:
+                series["mean"] = series["sum"] / series["count"] if series["count"] else None
+    return {
+        "uptimeSeconds": max((snapshot["uptimeSeconds"] for snapshot in snapshots), default=0.0),
+        "metrics": merged,
+    }
+
+def snapshot_prometheus_text(snapshot):
+    """
+    Prometheus text exposition format (version 0.0.4) of a Metrics.snapshot() dict.
+    """
+    lines = []
+    for name, metric in snapshot["metrics"].items():
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        for series in metric["series"]:
+            label_names, label_values = tuple(series["labels"]), tuple(series["labels"].values())
+            if metric["type"] == "counter":
+                lines.append(f"{name}{_format_labels(label_names, label_values)} {_format_value(series['value'])}")
+                continue
+            for bound, count in series["buckets"].items():
+                labels = _format_labels(label_names, label_values, [("le", bound)])
+                lines.append(f"{name}_bucket{labels} {count}")
+            labels = _format_labels(label_names, label_values)
+            lines.append(f"{name}_sum{labels} {_format_value(series['sum'])}")
+            lines.append(f"{name}_count{labels} {series['count']}")
+    return "\n".join(lines) + "\n"
@@ -1,33 +1,224 @@
+import tensorflow as tf
 from tensorflow import keras
 from tensorflow.keras import layers
 
 MAX_SEQ_LEN = 200
 N_FEATURES = 3
+LSTM_UNITS = 128
 
-def build_model(num_classes):
+# "bilstm": default Bidirectional(LSTM) classifier
+# "lstm": unidirectional LSTM, can be exported as a stateful step model for incremental prediction
+# "conv": stack of causal dilated/strided 1D convolutions with masked global pooling (no recurrence)
+# "conv_lstm": the same convolution stack followed by a small LSTM over the downsampled sequence
+ARCHITECTURES = ("bilstm", "lstm", "conv", "conv_lstm")
+
+# Convolution stack of the "conv" architectures: (filters, kernel_size, strides, dilation_rate).
+# The two strided blocks downsample 200 points to 50 steps; the dilated blocks widen
+# the receptive field to the whole sequence without more parameters.
+CONV_BLOCKS = (
+    (64, 5, 1, 1),
+    (64, 5, 2, 1),
+    (128, 3, 1, 2),
+    (128, 3, 2, 1),
+    (128, 3, 1, 4),
+    (128, 3, 1, 8),
+)
+CONV_LSTM_UNITS = 64
+
+# CPU flags that give native bfloat16 matmuls (oneDNN); without them mixed_bfloat16 is emulated and slower
+BF16_CPU_FLAGS = ("avx512_bf16", "amx_bf16")
+
+def cpu_supports_bfloat16():
+    """
+    Whether the CPU advertises native bfloat16 instructions (Linux /proc/cpuinfo).
+    
+    Returns:
+        True if any of BF16_CPU_FLAGS is present, False otherwise (or if unknown)
+    """
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("flags"):
+                    flags = set(line.split(":", 1)[1].split())
+                    return any(flag in flags for flag in BF16_CPU_FLAGS)
+    except OSError:
+        pass
+    return False
+
+def mixed_precision_policy():
+    """
+    Pick a mixed-precision policy for the available hardware.
+    
+    Returns:
+        "mixed_float16" on GPU, "mixed_bfloat16" on CPUs with native bfloat16,
+        otherwise "float32" (mixed precision would only add casts)
+    """
+    if tf.config.list_physical_devices('GPU'):
+        return "mixed_float16"
+    if cpu_supports_bfloat16():
+        return "mixed_bfloat16"
+    return "float32"
+
+@keras.saving.register_keras_serializable(package="quickdraw")
+class TimestepMask(layers.Layer):
+    """
+    (batch, T, features) -> (batch, T, 1) mask: 1.0 where any feature is non-zero.
+    
+    Same rule as Masking(mask_value=0), but returned as a tensor so it can be
+    downsampled and multiplied into convolution outputs.
+    """
+    
+    def call(self, inputs):
+        mask = tf.reduce_any(tf.not_equal(inputs, 0), axis=-1, keepdims=True)
+        return tf.cast(mask, self.compute_dtype)
+
+@keras.saving.register_keras_serializable(package="quickdraw")
+class MaskedGlobalPooling(layers.Layer):
+    """
+    Mean and max over the unmasked time steps: [(batch, T, C), (batch, T, 1)] -> (batch, 2 * C).
+    
+    Expects non-negative (ReLU) features that are already zero at masked steps,
+    so the max is not affected by padding.
+    """
+    
+    def call(self, inputs):
+        features, mask = inputs
+        count = tf.maximum(tf.reduce_sum(mask, axis=1), 1)
+        mean = tf.reduce_sum(features, axis=1) / count
+        return tf.concat([mean, tf.reduce_max(features, axis=1)], axis=-1)
+
+def _build_conv_model(num_classes, seq_len, recurrent):
+    """
+    Convolutional classifier over the (T, 3) point sequence.
+    
+    All convolutions are causal and padded positions are zeroed after every
+    block, so the output for a drawing does not depend on how much trailing
+    padding follows it (length buckets and dynamic-length ONNX exports give
+    the same result as the full MAX_SEQ_LEN input).
+    """
+    inputs = keras.Input((seq_len, N_FEATURES), name="points")
+    mask = TimestepMask(name="timestep_mask")(inputs)
+    x = inputs
+    for i, (filters, kernel_size, strides, dilation_rate) in enumerate(CONV_BLOCKS):
+        x = layers.Conv1D(
+            filters,
+            kernel_size,
+            strides=strides,
+            dilation_rate=dilation_rate,
+            padding="causal",
+            activation="relu",
+            name=f"conv_{i}"
+        )(x)
+        if strides > 1:
+            # Causal output step j ends at input step j * strides
+            mask = layers.MaxPooling1D(pool_size=1, strides=strides, name=f"mask_stride_{i}")(mask)
+        x = layers.Multiply(name=f"mask_conv_{i}")([x, mask])
+    
+    if recurrent:
+        x = layers.Masking(mask_value=0)(x)
+        x = layers.LSTM(CONV_LSTM_UNITS)(x)
+    else:
+        x = MaskedGlobalPooling(name="masked_pooling")([x, mask])
+    
+    x = layers.Dropout(0.5)(x)
+    outputs = layers.Dense(num_classes, activation='softmax', dtype='float32')(x)
+    return keras.Model(inputs, outputs)
+
+def build_model(
+    num_classes,
+    variable_length=False,
+    architecture="bilstm",
+    jit_compile=False,
+    steps_per_execution=1
+):
     """
     Build and compile a model for QuickDraw classification.
     
     Args:
         num_classes: Number of output classes
+        variable_length: Accept sequences of any length (time axis None) instead of
+            exactly MAX_SEQ_LEN, for length-bucketed batches
+        architecture: One of ARCHITECTURES
+        jit_compile: Compile the train/predict steps with XLA
+        steps_per_execution: Number of batches run per tf.function call
+            (fewer Python round trips per epoch)
+    
+    The layers follow the global keras.mixed_precision policy; the output
+    layer always computes in float32 so the softmax and loss stay stable.
     
     Returns:
         Compiled Keras model
     """
-    model = keras.Sequential([
-        layers.Masking(mask_value=0, input_shape=(MAX_SEQ_LEN, N_FEATURES)),
-        layers.Bidirectional(layers.LSTM(128)),
-        layers.Dropout(0.5),
-        layers.Dense(num_classes, activation='softmax')
-    ])
+    if architecture not in ARCHITECTURES:
+        raise ValueError(f"Unknown architecture: {architecture} (choose from {ARCHITECTURES})")
+    
+    seq_len = None if variable_length else MAX_SEQ_LEN
+    
+    if architecture in ("conv", "conv_lstm"):
+        model = _build_conv_model(num_classes, seq_len, recurrent=architecture == "conv_lstm")
+    else:
+        if architecture == "lstm":
+            recurrent = layers.LSTM(LSTM_UNITS)
+        else:
+            recurrent = layers.Bidirectional(layers.LSTM(LSTM_UNITS))
+        
+        model = keras.Sequential([
+            layers.Masking(mask_value=0, input_shape=(seq_len, N_FEATURES)),
+            recurrent,
+            layers.Dropout(0.5),
+            layers.Dense(num_classes, activation='softmax', dtype='float32')
+        ])
     
     optimizer = keras.optimizers.Adam(learning_rate=1e-3)
     
     model.compile(
         optimizer=optimizer,
         loss='sparse_categorical_crossentropy',
-        metrics=['accuracy']
+        metrics=['accuracy'],
+        jit_compile=jit_compile,
+        steps_per_execution=steps_per_execution
     )
     
     return model
 
+def build_step_model(model):
+    """
+    Build a stateful step model from a trained unidirectional ("lstm") model.
+    
+    The step model takes a chunk of new points plus the LSTM state after the
+    previous points and returns the class probabilities and the updated state,
+    so a drawing can be fed incrementally and still give the same result as
+    running the full sequence at once.
+    
+    Inputs: points (batch, T, 3), state_h (batch, units), state_c (batch, units)
+    Outputs: probabilities (batch, num_classes), state_h, state_c
+    
+    Args:
+        model: Trained model built with architecture="lstm"
+    
+    Returns:
+        Keras functional model sharing the trained weights (dropout removed)
+    """
+    lstm = next((layer for layer in model.layers if isinstance(layer, layers.LSTM)), None)
+    dense = model.layers[-1]
+    if lstm is None or any(isinstance(layer, layers.Conv1D) for layer in model.layers):
+        raise ValueError("Step models need a unidirectional LSTM model (architecture='lstm')")
+    
+    units = lstm.units
+    points = keras.Input((None, N_FEATURES), name="points")
+    state_h = keras.Input((units,), name="state_h")
+    state_c = keras.Input((units,), name="state_c")
+    
+    x = layers.Masking(mask_value=0)(points)
+    step_lstm = layers.LSTM(units, return_state=True)
+    _, new_h, new_c = step_lstm(x, initial_state=[state_h, state_c])
+    step_dense = layers.Dense(dense.units, activation='softmax')
+    probabilities = step_dense(new_h)
+    
+    step_lstm.set_weights(lstm.get_weights())
+    step_dense.set_weights(dense.get_weights())
+    
+    return keras.Model(
+        inputs=[points, state_h, state_c],
+        outputs=[probabilities, new_h, new_c]
+    )
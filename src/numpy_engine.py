@@ -0,0 +1,240 @@
+import re
+from pathlib import Path
+
+import numpy as np
+
+# Weights of a Masking -> (Bi)LSTM -> Dense model, extracted once by scripts/export_numpy.py
+NUMPY_MODEL_SUFFIX = ".npz"
+FORMAT_VERSION = 1
+
+# Layers the engine can run (anything else, e.g. Conv1D, is rejected at export time)
+SUPPORTED_KERAS_LAYERS = ("InputLayer", "Masking", "LSTM", "Bidirectional", "Dropout", "Dense")
+
+# Initializer scopes of tf2onnx exports: .../forward_lstm/..., .../backward_lstm_1/..., .../lstm/...
+ONNX_LSTM_SCOPE = re.compile(r"/((?:forward_|backward_)?lstm(?:_\d+)?)/")
+ONNX_DENSE_KERNEL = re.compile(r"/dense(?:_\d+)?/MatMul/")
+ONNX_DENSE_BIAS = re.compile(r"/dense(?:_\d+)?/BiasAdd/")
+
+def numpy_model_path(model_path):
+    """
+    Path of the NumPy weights exported for a model (<stem>.npz).
+    """
+    return str(Path(model_path).with_suffix(NUMPY_MODEL_SUFFIX))
+
+def keras_weights(model):
+    """
+    Extract LSTM and Dense weights from a Keras model built by src.model.build_model.
+    
+    Args:
+        model: Loaded "bilstm" or "lstm" Keras model
+    
+    Returns:
+        Dict of arrays for save_weights
+    
+    Raises:
+        ValueError: The model has layers the engine cannot run
+    """
+    directions = None
+    dense = None
+    for layer in model.layers:
+        kind = type(layer).__name__
+        if kind not in SUPPORTED_KERAS_LAYERS:
+            raise ValueError(f"NumPy engine supports Masking -> (Bi)LSTM -> Dense models only, found {kind}")
+        if kind == "Bidirectional":
+            if layer.merge_mode != "concat":
+                raise ValueError(f"Unsupported Bidirectional merge_mode: {layer.merge_mode}")
+            directions = [layer.forward_layer, layer.backward_layer]
+        elif kind == "LSTM":
+            directions = [layer]
+        elif kind == "Dense":
+            dense = layer
+    if directions is None or dense is None:
+        raise ValueError("Model has no LSTM/Bidirectional layer or no Dense output layer")
+    
+    for lstm in directions:
+        if lstm.return_sequences or not lstm.use_bias:
+            raise ValueError(f"Unsupported LSTM configuration in {lstm.name}")
+        if lstm.activation.__name__ != "tanh" or lstm.recurrent_activation.__name__ != "sigmoid":
+            raise ValueError(f"{lstm.name} must use tanh/sigmoid activations")
+    
+    weights = {}
+    for index, lstm in enumerate(directions):
+        kernel, recurrent_kernel, bias = lstm.get_weights()
+        weights[f"kernel_{index}"] = kernel
+        weights[f"recurrent_kernel_{index}"] = recurrent_kernel
+        weights[f"bias_{index}"] = bias
+    weights["dense_kernel"], weights["dense_bias"] = dense.get_weights()
+    return weights
+
+def onnx_weights(model_path):
+    """
+    Extract LSTM and Dense weights from a float ONNX model exported by scripts/convert_to_onnx.py.
+    
+    tf2onnx unrolls a masked Keras LSTM into a Loop and keeps the Keras
+    variables (gate order i, f, c, o) as initializers named after their
+    layer, so they are picked up by layer scope and shape.
+    
+    Raises:
+        ValueError: Not a float (Bi)LSTM export (e.g. convolutional or INT8 model)
+    """
+    import onnx
+    from onnx import numpy_helper
+    
+    model = onnx.load(str(model_path))
+    op_types = {node.op_type for node in model.graph.node}
+    unsupported = op_types & {"Conv", "LSTM", "DynamicQuantizeLinear", "QuantizeLinear", "MatMulInteger"}
+    if unsupported:
+        raise ValueError(f"NumPy engine cannot run this ONNX graph (ops: {', '.join(sorted(unsupported))}); export from the .keras model instead")
+    
+    scopes = {}
+    dense_kernel = dense_bias = None
+    for initializer in model.graph.initializer:
+        array = numpy_helper.to_array(initializer)
+        if ONNX_DENSE_KERNEL.search(initializer.name) and array.ndim == 2:
+            dense_kernel = array
+        elif ONNX_DENSE_BIAS.search(initializer.name) and array.ndim == 1:
+            dense_bias = array
+        else:
+            match = ONNX_LSTM_SCOPE.search(initializer.name)
+            if match and array.ndim in (1, 2):
+                scopes.setdefault(match.group(1), []).append(array)
+    
+    if not scopes or len(scopes) > 2 or dense_kernel is None or dense_bias is None:
+        raise ValueError(f"Could not find (Bi)LSTM and Dense weights in {model_path}")
+    
+    # Forward (or the only) direction first
+    names = sorted(scopes, key=lambda name: name.startswith("backward_"))
+    weights = {}
+    for index, name in enumerate(names):
+        arrays = scopes[name]
+        bias = [a for a in arrays if a.ndim == 1]
+        recurrent = [a for a in arrays if a.ndim == 2 and a.shape[0] * 4 == a.shape[1]]
+        kernel = [a for a in arrays if a.ndim == 2 and a.shape[0] * 4 != a.shape[1]]
+        if len(bias) != 1 or len(recurrent) != 1 or len(kernel) != 1:
+            raise ValueError(f"Unexpected initializers for {name} in {model_path}")
+        weights[f"kernel_{index}"] = kernel[0]
+        weights[f"recurrent_kernel_{index}"] = recurrent[0]
+        weights[f"bias_{index}"] = bias[0]
+    weights["dense_kernel"] = dense_kernel
+    weights["dense_bias"] = dense_bias
+    return weights
+
+def save_weights(path, weights):
+    """
+    Write extracted weights as an uncompressed .npz (float32).
+    """
+    arrays = {name: np.asarray(value, dtype=np.float32) for name, value in weights.items()}
+    with open(path, 'wb') as f:
+        np.savez(f, format_version=np.int32(FORMAT_VERSION), **arrays)
+    return path
+
+def _sigmoid(x):
+    # Same as 1 / (1 + exp(-x)) without overflow warnings for large |x|
+    return 0.5 * (1.0 + np.tanh(0.5 * x))
+
+class NumpyLSTMModel:
+    """
+    Pure-NumPy forward pass of a Masking -> LSTM / Bidirectional(LSTM) -> Dense(softmax) model.
+    
+    Follows Keras masking semantics: a time step whose features are all zero
+    keeps the previous state, the backward direction reads the sequence in
+    reverse, and the output is the final state of each direction. The batch
+    is trimmed to its longest drawing, and both directions run as one stacked
+    matmul per time step.
+    
+    Meant for fast process start and small batches (one drawing at a time);
+    for large batches ONNX Runtime's GEMM kernels have higher throughput.
+    
+    Args:
+        directions: List of (kernel (F, 4U), recurrent_kernel (U, 4U), bias (4U,)), forward first
+        dense_kernel: (D * U, num_classes)
+        dense_bias: (num_classes,)
+    """
+    
+    def __init__(self, directions, dense_kernel, dense_bias):
+        if len(directions) not in (1, 2):
+            raise ValueError(f"Expected 1 or 2 LSTM directions, got {len(directions)}")
+        self.kernels = np.stack([kernel for kernel, _, _ in directions]).astype(np.float32)
+        self.recurrent_kernels = np.stack([recurrent for _, recurrent, _ in directions]).astype(np.float32)
+        self.biases = np.stack([bias for _, _, bias in directions]).astype(np.float32)
+        self.dense_kernel = np.asarray(dense_kernel, dtype=np.float32)
+        self.dense_bias = np.asarray(dense_bias, dtype=np.float32)
+        self.units = self.recurrent_kernels.shape[1]
+        self.num_classes = self.dense_kernel.shape[1]
+        if self.dense_kernel.shape[0] != len(directions) * self.units:
+            raise ValueError(f"Dense kernel {self.dense_kernel.shape} does not match {len(directions)} x {self.units} LSTM units")
+    
+    @property
+    def bidirectional(self):
+        return len(self.kernels) == 2
+    
+    @classmethod
+    def load(cls, path):
+        """
+        Load weights written by save_weights.
+        """
+        with np.load(path, allow_pickle=False) as data:
+            version = int(data["format_version"])
+            if version != FORMAT_VERSION:
+                raise ValueError(f"{path} has format version {version}, expected {FORMAT_VERSION}")
+            directions = [
+                (data[f"kernel_{i}"], data[f"recurrent_kernel_{i}"], data[f"bias_{i}"])
+                for i in range(2) if f"kernel_{i}" in data
+            ]
+            return cls(directions, data["dense_kernel"], data["dense_bias"])
+    
+    def run(self, X):
+        """
+        Class probabilities for one batch of (N, T, 3) sequences.
+        
+        Returns:
+            float32 array (N, num_classes)
+        """
+        X = np.asarray(X, dtype=np.float32)
+        mask = np.any(X != 0, axis=-1)
+        valid = mask.any(axis=0)
+        length = int(np.flatnonzero(valid)[-1]) + 1 if valid.any() else 1
+        X, mask = X[:, :length], mask[:, :length]
+        
+        # The backward direction reads the reversed sequence
+        if self.bidirectional:
+            X = np.stack([X, X[:, ::-1]])
+            mask = np.stack([mask, mask[:, ::-1]])
+        else:
+            X, mask = X[None], mask[None]
+        
+        # Input projections of every step at once (D, N, T, 4U), indexed time-major below
+        projected = np.matmul(X, self.kernels[:, None]) + self.biases[:, None, None, :]
+        projected = projected.transpose(2, 0, 1, 3)
+        step_mask = mask.transpose(2, 0, 1)[..., None]
+        
+        units = self.units
+        state_h = np.zeros((len(self.kernels), X.shape[1], units), dtype=np.float32)
+        state_c = np.zeros_like(state_h)
+        for t in range(length):
+            z = projected[t] + np.matmul(state_h, self.recurrent_kernels)
+            input_gate = _sigmoid(z[..., :units])
+            forget_gate = _sigmoid(z[..., units:2 * units])
+            candidate = np.tanh(z[..., 2 * units:3 * units])
+            output_gate = _sigmoid(z[..., 3 * units:])
+            new_c = forget_gate * state_c + input_gate * candidate
+            new_h = output_gate * np.tanh(new_c)
+            keep = step_mask[t]
+            state_c = np.where(keep, new_c, state_c)
+            state_h = np.where(keep, new_h, state_h)
+        
+        features = np.concatenate(list(state_h), axis=-1)
+        logits = features @ self.dense_kernel + self.dense_bias
+        logits -= logits.max(axis=-1, keepdims=True)
+        probabilities = np.exp(logits)
+        probabilities /= probabilities.sum(axis=-1, keepdims=True)
+        return probabilities.astype(np.float32)
+    
+    def predict(self, X, batch_size=32):
+        """
+        Class probabilities for any number of sequences, run in batches
+        (batches bound the (T, D, N, 4U) projection buffer).
+        """
+        if len(X) == 0:
+            return np.zeros((0, self.num_classes), dtype=np.float32)
+        return np.concatenate([self.run(X[start:start + batch_size]) for start in range(0, len(X), batch_size)])
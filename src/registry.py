@@ -0,0 +1,411 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+from src import data_loader
+from src.inference import (
+    MicroBatcher,
+    PredictionCache,
+    load_session,
+    model_identity,
+    optimized_model_path,
+)
+from src.numpy_engine import NUMPY_MODEL_SUFFIX, NumpyLSTMModel
+
+logger = logging.getLogger(__name__)
+
+# Sidecar next to a model file holding its category list, in output order
+CATEGORIES_SUFFIX = ".categories.json"
+
+# Suffixes of artifacts derived from a model (convert_to_onnx.py --quantize/--optimize)
+# that share the source model's sidecar
+DERIVED_SUFFIXES = (".opt", ".int8")
+
+def categories_path(model_path):
+    """
+    Path of the category sidecar for a model (<stem>.categories.json).
+    
+    <stem>.int8.onnx and <stem>.opt.onnx resolve to the sidecar of <stem>.
+    """
+    path = Path(model_path)
+    stem = path.stem
+    for suffix in DERIVED_SUFFIXES:
+        if stem.endswith(suffix):
+            stem = stem[:-len(suffix)]
+    return str(path.with_name(stem + CATEGORIES_SUFFIX))
+
+def save_categories(model_path, categories):
+    """
+    Write the category sidecar for a model.
+    
+    Returns:
+        Path of the sidecar
+    """
+    sidecar = categories_path(model_path)
+    tmp_path = f"{sidecar}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(list(categories), f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, sidecar)
+    return sidecar
+
+def load_categories(model_path, default=None):
+    """
+    Read the category list of a model from its sidecar.
+    
+    Args:
+        model_path: Model file (.keras / .onnx / derived artifact)
+        default: Categories to use when there is no sidecar
+    
+    Returns:
+        List of category names
+    
+    Raises:
+        FileNotFoundError: No sidecar and no default
+        ValueError: Sidecar is not a non-empty list of strings
+    """
+    sidecar = categories_path(model_path)
+    if not os.path.exists(sidecar):
+        if default is None:
+            raise FileNotFoundError(f"Category sidecar not found: {sidecar}")
+        return list(default)
+    
+    with open(sidecar) as f:
+        categories = json.load(f)
+    if not categories or not isinstance(categories, list) or not all(isinstance(c, str) for c in categories):
+        raise ValueError(f"{sidecar} must contain a non-empty list of category names")
+    return categories
+
+def source_identity(model_path):
+    """
+    Identity of everything a model load reads: the model, its optimized artifact and its sidecar.
+    """
+    return "|".join(str(model_identity(path)) for path in (
+        model_path,
+        optimized_model_path(model_path),
+        categories_path(model_path),
+    ))
+
+class LoadedModel:
+    """
+    One loaded version of a model: ONNX session (or NumPy engine for .npz weights),
+    categories, micro-batcher and prediction cache.
+    
+    Instances are never modified after loading; a changed model file is
+    loaded into a new instance which the registry swaps in. Requests that
+    acquired this version keep using it, and retire() waits for them before
+    draining the batch queue and stopping its thread.
+    
+    Args:
+        name: Registry name
+        model_path: ONNX model file, or .npz weights from scripts/export_numpy.py
+        default_categories: Categories used when the model has no sidecar
+        max_batch_size, max_wait_ms: MicroBatcher settings
+        cache_size, cache_ttl: PredictionCache settings
+        observe_run: Optional function (name, batch_size, seconds) called after every session run
+    """
+    
+    def __init__(
+        self,
+        name,
+        model_path,
+        default_categories=None,
+        max_batch_size=32,
+        max_wait_ms=5.0,
+        cache_size=1024,
+        cache_ttl=60.0,
+        observe_run=None
+    ):
+        self.name = name
+        self.observe_run = observe_run
+        self.path = os.path.abspath(model_path)
+        # Read before loading, so a write during the load shows up as a change on the next check
+        self.identity = source_identity(self.path)
+        self.categories = load_categories(self.path, default_categories)
+        if self.path.endswith(NUMPY_MODEL_SUFFIX):
+            self.session = None
+            self.engine = NumpyLSTMModel.load(self.path)
+            self.loaded_path = self.path
+            self.dynamic_length = True
+            num_outputs = self.engine.num_classes
+        else:
+            self.engine = None
+            self.session, self.loaded_path = load_session(self.path)
+            self.input_name = self.session.get_inputs()[0].name
+            self.output_name = self.session.get_outputs()[0].name
+            self.dynamic_length = not isinstance(self.session.get_inputs()[0].shape[1], int)
+            num_outputs = self.session.get_outputs()[0].shape[-1]
+        self.loaded_at = time.time()
+        
+        if isinstance(num_outputs, int) and num_outputs != len(self.categories):
+            raise ValueError(
+                f"{self.path} has {num_outputs} outputs but {len(self.categories)} categories "
+                f"(check {categories_path(self.path)})"
+            )
+        
+        self.batcher = MicroBatcher(self.run, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+        self.cache = PredictionCache(self.identity, max_entries=cache_size, ttl_seconds=cache_ttl)
+        
+        self._users = 0
+        self._cond = threading.Condition()
+    
+    def run(self, input_array):
+        """
+        Predict an (N, 200, 3) batch and return (N, num_categories) probabilities.
+        
+        Models with a dynamic time axis only run up to the bucket length of
+        the longest drawing in the batch (trailing padding is masked anyway).
+        """
+        start = time.perf_counter()
+        if self.dynamic_length:
+            max_length = int(np.max(data_loader.sequence_lengths(input_array), initial=1))
+            input_array = input_array[:, :data_loader.bucket_length(max_length)]
+        if self.engine is not None:
+            outputs = self.engine.run(input_array)
+        else:
+            outputs = self.session.run([self.output_name], {self.input_name: input_array.astype(np.float32)})[0]
+        if self.observe_run is not None:
+            self.observe_run(self.name, len(input_array), time.perf_counter() - start)
+        return outputs
+    
+    def acquire(self):
+        with self._cond:
+            self._users += 1
+    
+    def release(self):
+        with self._cond:
+            self._users -= 1
+            if not self._users:
+                self._cond.notify_all()
+    
+    def retire(self):
+        """
+        Wait until no request holds this version, then finish its queued batches and stop.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: not self._users)
+        self.batcher.close()
+    
+    def describe(self):
+        return {
+            "path": self.path,
+            "loadedPath": self.loaded_path,
+            "backend": "numpy" if self.engine is not None else "onnxruntime",
+            "categories": self.categories,
+            "dynamicLength": self.dynamic_length,
+            "loadedAt": self.loaded_at,
+        }
+
+class ModelRegistry:
+    """
+    Named set of models served from one process, with atomic hot reload.
+    
+    check_for_updates() (or the watcher thread from start_watching) reloads a
+    model whose file, optimized artifact or sidecar changed. The new version
+    is fully loaded (and warmed up by the loader) before it replaces the old
+    one under the registry lock, so requests never wait on a load and never
+    see a half-loaded model; the old version is retired once its in-flight
+    requests are done. A change is only picked up after the files were
+    unchanged for one check, so a model that is still being written is not
+    loaded. If a reload fails, the previous version keeps serving.
+    
+    Load failures and reloads are reported through the "src.registry" logger.
+    
+    Args:
+        loader: Function (name, path) -> LoadedModel
+    """
+    
+    def __init__(self, loader):
+        self.loader = loader
+        self.default_name = None
+        
+        self._lock = threading.Lock()
+        self._paths = {}
+        self._models = {}
+        self._errors = {}
+        self._pending = {}
+        self._failed = {}
+        self._reloads = {}
+        self._watcher = None
+        self._stop = threading.Event()
+    
+    def add(self, name, model_path):
+        """
+        Register and load a model; a load error is recorded instead of raised.
+        
+        The first registered model is the default for requests without a model name.
+        """
+        model_path = os.path.abspath(model_path)
+        with self._lock:
+            if name in self._paths:
+                raise ValueError(f"Duplicate model name: {name}")
+            self._paths[name] = model_path
+            self._reloads[name] = 0
+            if self.default_name is None:
+                self.default_name = name
+        identity = source_identity(model_path)
+        if not self._load(name, model_path):
+            self._failed[name] = identity
+    
+    def names(self):
+        with self._lock:
+            return list(self._paths)
+    
+    def error(self, name=None):
+        """
+        Load error of a model (None if it is loaded or unknown).
+        """
+        with self._lock:
+            return self._errors.get(name or self.default_name)
+    
+    def get(self, name=None):
+        """
+        Current version of a model without acquiring it (for read-only access).
+        
+        Raises:
+            KeyError: Unknown name or the model is not loaded
+        """
+        with self._lock:
+            return self._current(name)
+    
+    def _current(self, name):
+        # Caller holds the lock
+        name = name or self.default_name
+        if name not in self._paths:
+            raise KeyError(f"Unknown model: {name} (available: {', '.join(self._paths)})")
+        model = self._models.get(name)
+        if model is None:
+            raise KeyError(self._errors.get(name) or f"Model is not loaded: {name}")
+        return model
+    
+    @contextmanager
+    def acquire(self, name=None):
+        """
+        Use the current version of a model; a reload during the block does not affect it.
+        
+        Raises:
+            KeyError: Unknown name or the model is not loaded
+        """
+        with self._lock:
+            model = self._current(name)
+            model.acquire()
+        try:
+            yield model
+        finally:
+            model.release()
+    
+    def _load(self, name, model_path):
+        try:
+            model = self.loader(name, model_path)
+        except Exception as e:
+            with self._lock:
+                self._errors[name] = str(e)
+            logger.error("Failed to load model %s: %s", name, e)
+            return False
+        
+        with self._lock:
+            old = self._models.get(name)
+            self._models[name] = model
+            self._errors.pop(name, None)
+            if old is not None:
+                self._reloads[name] += 1
+        if old is not None:
+            old.retire()
+            logger.info("Reloaded model %s: %s", name, model.loaded_path)
+        return True
+    
+    def check_for_updates(self):
+        """
+        Reload every model whose files changed since it was loaded.
+        
+        Returns:
+            Names of the models that were reloaded
+        """
+        with self._lock:
+            targets = [
+                (name, path, self._models[name].identity if name in self._models else None)
+                for name, path in self._paths.items()
+            ]
+        
+        reloaded = []
+        for name, path, loaded_identity in targets:
+            identity = source_identity(path)
+            if identity in (loaded_identity, self._failed.get(name)) or not os.path.exists(path):
+                self._pending.pop(name, None)
+                continue
+            if self._pending.get(name) != identity:
+                # Changed since the last check: wait until the files stop changing
+                self._pending[name] = identity
+                continue
+            del self._pending[name]
+            if self._load(name, path):
+                self._failed.pop(name, None)
+                reloaded.append(name)
+            else:
+                # Do not retry until the files change again
+                self._failed[name] = identity
+        return reloaded
+    
+    def start_watching(self, interval=2.0):
+        """
+        Check for changed model files every interval seconds in a background thread.
+        """
+        if self._watcher is not None or interval <= 0:
+            return
+        
+        def watch():
+            while not self._stop.wait(interval):
+                self.check_for_updates()
+        
+        self._watcher = threading.Thread(target=watch, name="model-watcher", daemon=True)
+        self._watcher.start()
+    
+    def close(self):
+        """
+        Stop watching and retire every model (queued requests are still answered).
+        """
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+        with self._lock:
+            models = list(self._models.values())
+            self._models.clear()
+        for model in models:
+            model.retire()
+    
+    def describe(self):
+        """
+        Returns:
+            Dict of model name -> path, categories, load state and reload count
+        """
+        with self._lock:
+            names = list(self._paths)
+            models = dict(self._models)
+            errors = dict(self._errors)
+            reloads = dict(self._reloads)
+        return {
+            name: {
+                **(models[name].describe() if name in models else {}),
+                "default": name == self.default_name,
+                "error": errors.get(name),
+                "reloads": reloads[name],
+            }
+            for name in names
+        }
+    
+    def stats(self):
+        """
+        Returns:
+            Dict of model name -> batcher and prediction cache stats (loaded models only)
+        """
+        with self._lock:
+            models = dict(self._models)
+        return {
+            name: {"batching": model.batcher.stats(), "cache": model.cache.stats()}
+            for name, model in models.items()
+        }
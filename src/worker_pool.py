@@ -0,0 +1,584 @@
+import gc
+import json
+import logging
+import os
+import selectors
+import signal
+import socket
+import sys
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+# A worker that crashes sooner than this after starting counts as crashing
+# repeatedly, and its restart delay doubles (up to max_restart_delay)
+MIN_HEALTHY_UPTIME = 10.0
+
+class _Connection:
+    """
+    Non-blocking socket carrying newline-delimited messages, with read and write buffers.
+    """
+    
+    def __init__(self, sock):
+        sock.setblocking(False)
+        self.sock = sock
+        self._inbox = bytearray()
+        self._outbox = bytearray()
+    
+    def fileno(self):
+        return self.sock.fileno()
+    
+    @property
+    def pending_output(self):
+        return bool(self._outbox)
+    
+    def read_lines(self):
+        """
+        Returns:
+            (complete non-empty lines received, True if the peer closed the connection)
+        """
+        try:
+            data = self.sock.recv(1 << 16)
+        except (BlockingIOError, InterruptedError):
+            return [], False
+        except OSError:
+            return [], True
+        if not data:
+            return [], True
+        self._inbox += data
+        *lines, rest = self._inbox.split(b"\n")
+        self._inbox = bytearray(rest)
+        return [line for line in lines if line.strip()], False
+    
+    def write(self, line):
+        """
+        Queue one message (bytes without the newline) and send as much as the socket takes.
+        """
+        self._outbox += line
+        self._outbox += b"\n"
+        self.flush()
+    
+    def flush(self):
+        while self._outbox:
+            try:
+                sent = self.sock.send(self._outbox)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                # Peer is gone; the closed connection shows up on the next read
+                self._outbox.clear()
+                return
+            del self._outbox[:sent]
+    
+    def close(self):
+        self.sock.close()
+
+class _Worker:
+    """
+    Supervisor-side state of one worker slot (the process in it changes on restarts).
+    """
+    
+    def __init__(self, index):
+        self.index = index
+        self.pid = None
+        self.conn = None
+        self.ready = False
+        self.started_at = None
+        self.in_flight = set()
+        self.backlog = []
+        self.restarts = 0
+        self.quick_crashes = 0
+        self.restart_at = None
+
+class _Gather:
+    """
+    A broadcast request waiting for the replies of every ready worker.
+    """
+    
+    def __init__(self, client, request, combine, workers):
+        self.client = client
+        self.request = request
+        self.combine = combine
+        self.waiting = set(workers)
+        self.replies = {}
+    
+    def add(self, index, message):
+        self.waiting.discard(index)
+        self.replies[index] = message
+
+class WorkerPool:
+    """
+    Pre-forked worker processes behind one Unix socket.
+    
+    Workers speak the newline-delimited JSON protocol of predict_api.py
+    --serve: each one is forked from this process (so modules imported and
+    files preloaded before serve_forever() are shared copy-on-write) and runs
+    worker_main with stdin/stdout connected to the supervisor. The first
+    message of a worker must be {"type": "ready", ...}.
+    
+    Clients connect to socket_path and use the same protocol. Every client
+    first receives the ready message of the pool (a worker's ready message
+    plus "workers"). Request ids are rewritten so requests of all clients
+    can share the workers, and each request goes to the ready worker with the
+    fewest requests in flight. Requests with an affinity key (e.g. an
+    incremental prediction session) always go to the same worker, broadcast
+    request types are sent to every ready worker and answered with the
+    combined replies, and {"type": "shutdown"} closes the client connection.
+    
+    A worker that exits is forked again after restart_delay seconds (doubled
+    for each crash shortly after starting, up to max_restart_delay); its
+    in-flight requests are answered with an error, requests queued for it
+    are sent once the new process is ready.
+    
+    Args:
+        worker_main: Function (worker index) -> None run in each worker; it
+            returns when stdin closes
+        num_workers: Number of worker processes
+        socket_path: Unix socket clients connect to
+        loads: JSON decoder (bytes or str -> object)
+        dumps: JSON encoder (object -> str)
+        affinity: Optional function (request) -> key or None; requests with the same key go to the same worker
+        broadcast: Dict request type -> (function (request) -> worker request,
+            function (request, {worker index: reply or None}) -> response)
+        restart_delay, max_restart_delay: Seconds before a crashed worker is restarted
+        stop_timeout: Seconds workers get to exit after shutdown before they are killed
+    """
+    
+    def __init__(
+        self,
+        worker_main,
+        num_workers,
+        socket_path,
+        loads=json.loads,
+        dumps=json.dumps,
+        affinity=None,
+        broadcast=None,
+        restart_delay=1.0,
+        max_restart_delay=30.0,
+        stop_timeout=5.0
+    ):
+        if num_workers < 1:
+            raise ValueError(f"num_workers must be at least 1, got {num_workers}")
+        if not hasattr(os, "fork"):
+            raise RuntimeError("WorkerPool needs os.fork (Linux or macOS)")
+        self.worker_main = worker_main
+        self.socket_path = socket_path
+        self.loads = loads
+        self.dumps = dumps
+        self.affinity = affinity
+        self.broadcast = broadcast or {}
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self.stop_timeout = stop_timeout
+        
+        self.workers = [_Worker(index) for index in range(num_workers)]
+        self.ready_message = None
+        self._selector = None
+        self._listener = None
+        self._wakeup = None
+        self._clients = set()
+        self._routes = {}
+        self._backlog = []
+        self._next_id = 1
+        self._next_worker = 0
+        self._stopping = False
+    
+    def serve_forever(self):
+        """
+        Start the workers, accept clients until SIGTERM/SIGINT, then stop the workers.
+        """
+        self._selector = selectors.DefaultSelector()
+        self._listen()
+        self._install_signal_handlers()
+        # Objects created so far are never freed; keep the cyclic GC from
+        # touching them in the workers, which would copy their shared pages
+        gc.freeze()
+        try:
+            for worker in self.workers:
+                self._spawn(worker)
+            while not self._stopping:
+                self._poll()
+        finally:
+            self._shutdown()
+    
+    def stop(self):
+        self._stopping = True
+    
+    def describe(self):
+        """
+        Returns:
+            Dict with per-worker state (pid, ready, in-flight requests, restarts, uptime) and queued requests
+        """
+        now = time.monotonic()
+        return {
+            "workers": [
+                {
+                    "index": worker.index,
+                    "pid": worker.pid,
+                    "ready": worker.ready,
+                    "inFlight": len(worker.in_flight),
+                    "queued": len(worker.backlog),
+                    "restarts": worker.restarts,
+                    "uptimeSeconds": now - worker.started_at if worker.started_at is not None else None,
+                }
+                for worker in self.workers
+            ],
+            "queued": len(self._backlog),
+            "clients": len(self._clients),
+        }
+    
+    # --- Supervisor setup -------------------------------------------------
+    
+    def _listen(self):
+        if os.path.exists(self.socket_path):
+            # Remove a stale socket file, but never take over a live pool's socket
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.socket_path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                os.unlink(self.socket_path)
+            else:
+                raise RuntimeError(f"Another process is already listening on {self.socket_path}")
+            finally:
+                probe.close()
+        
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(self.socket_path)
+        listener.listen(128)
+        listener.setblocking(False)
+        self._listener = listener
+        self._selector.register(listener, selectors.EVENT_READ, ("listener", None))
+    
+    def _install_signal_handlers(self):
+        # Signals wake the selector through this socket pair
+        read_end, write_end = socket.socketpair()
+        read_end.setblocking(False)
+        write_end.setblocking(False)
+        self._wakeup = (read_end, write_end)
+        self._selector.register(read_end, selectors.EVENT_READ, ("wakeup", None))
+        signal.set_wakeup_fd(write_end.fileno())
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda signum, frame: self.stop())
+    
+    # --- Workers ----------------------------------------------------------
+    
+    def _spawn(self, worker):
+        parent_sock, child_sock = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+        # Unflushed output would otherwise be written again by the child
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            parent_sock.close()
+            self._run_child(worker.index, child_sock)
+        
+        child_sock.close()
+        worker.pid = pid
+        worker.conn = _Connection(parent_sock)
+        worker.ready = False
+        worker.started_at = time.monotonic()
+        worker.restart_at = None
+        self._selector.register(worker.conn, selectors.EVENT_READ, ("worker", worker))
+        logger.info("Started worker %d (pid %d)", worker.index, pid)
+    
+    def _run_child(self, index, sock):
+        exit_code = 1
+        try:
+            # Drop the supervisor's sockets, so a client or worker connection
+            # closes as soon as the supervisor closes it
+            signal.set_wakeup_fd(-1)
+            for sock_or_conn in (self._listener, *self._wakeup, *self._clients):
+                sock_or_conn.close()
+            for other in self.workers:
+                if other.conn is not None:
+                    other.conn.close()
+            self._selector.close()
+            # The supervisor stops the workers by closing their stdin
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            
+            os.dup2(sock.fileno(), 0)
+            os.dup2(sock.fileno(), 1)
+            sock.close()
+            sys.stdin = os.fdopen(0, "r", encoding="utf-8")
+            sys.stdout = os.fdopen(1, "w", encoding="utf-8")
+            self.worker_main(index)
+            exit_code = 0
+        except BaseException:
+            logger.exception("Worker %d failed", index)
+        finally:
+            try:
+                sys.stdout.flush()
+                sys.stderr.flush()
+            finally:
+                os._exit(exit_code)
+    
+    def _on_worker_exit(self, worker):
+        self._selector.unregister(worker.conn)
+        worker.conn.close()
+        worker.conn = None
+        worker.ready = False
+        status = self._reap(worker.pid)
+        uptime = time.monotonic() - worker.started_at
+        
+        # Requests the worker was processing are lost
+        for pool_id in sorted(worker.in_flight):
+            client, client_id, gather = self._routes.pop(pool_id)
+            if gather is not None:
+                gather.add(worker.index, None)
+                self._finish_gather(gather)
+            else:
+                self._reply(client, {"id": client_id, "type": "error", "error": f"Worker {worker.index} exited while processing the request"})
+        worker.in_flight.clear()
+        
+        if self._stopping:
+            return
+        worker.quick_crashes = worker.quick_crashes + 1 if uptime < MIN_HEALTHY_UPTIME else 0
+        delay = min(self.restart_delay * 2 ** max(worker.quick_crashes - 1, 0), self.max_restart_delay)
+        worker.restart_at = time.monotonic() + delay
+        logger.warning(
+            "Worker %d (pid %d) exited with %s after %.1fs, restarting in %.1fs",
+            worker.index, worker.pid, status, uptime, delay
+        )
+    
+    def _reap(self, pid):
+        """
+        Wait for a worker whose connection closed and describe how it exited.
+        """
+        try:
+            finished, status = os.waitpid(pid, os.WNOHANG)
+            if not finished:
+                # Closed its connection but is still running: it can no longer serve
+                os.kill(pid, signal.SIGKILL)
+                finished, status = os.waitpid(pid, 0)
+        except ChildProcessError:
+            return "unknown status"
+        if os.WIFSIGNALED(status):
+            return f"signal {os.WTERMSIG(status)}"
+        return f"code {os.waitstatus_to_exitcode(status)}"
+    
+    def _restart_due_workers(self):
+        now = time.monotonic()
+        for worker in self.workers:
+            if worker.restart_at is not None and worker.restart_at <= now:
+                worker.restarts += 1
+                self._spawn(worker)
+    
+    def _on_worker_message(self, worker, line):
+        message = self.loads(line)
+        if message.get("type") == "ready" and not worker.ready:
+            worker.ready = True
+            first_ready = self.ready_message is None
+            self.ready_message = {**message, "workers": len(self.workers)}
+            self.ready_message.pop("id", None)
+            logger.info("Worker %d ready", worker.index)
+            if first_ready:
+                ready_line = self.dumps(self.ready_message).encode()
+                for client in self._clients:
+                    self._write(client, ready_line)
+            
+            backlog, worker.backlog = worker.backlog, []
+            for client, request in backlog:
+                self._send(worker, client, request)
+            backlog, self._backlog = self._backlog, []
+            for client, request in backlog:
+                self._dispatch(client, request)
+            return
+        
+        route = self._routes.pop(message.get("id"), None)
+        if route is None:
+            return
+        worker.in_flight.discard(message["id"])
+        client, client_id, gather = route
+        if gather is not None:
+            gather.add(worker.index, message)
+            self._finish_gather(gather)
+            return
+        message["id"] = client_id
+        self._reply(client, message)
+    
+    # --- Requests ---------------------------------------------------------
+    
+    def _dispatch(self, client, request):
+        request_type = request.get("type", "predict")
+        if request_type in self.broadcast:
+            self._broadcast(client, request)
+            return
+        
+        key = self.affinity(request) if self.affinity is not None else None
+        if key is not None:
+            worker = self.workers[zlib.crc32(str(key).encode()) % len(self.workers)]
+            if worker.ready:
+                self._send(worker, client, request)
+            else:
+                worker.backlog.append((client, request))
+            return
+        
+        worker = self._least_loaded()
+        if worker is None:
+            self._backlog.append((client, request))
+        else:
+            self._send(worker, client, request)
+    
+    def _least_loaded(self):
+        """
+        Ready worker with the fewest requests in flight (ties go round-robin).
+        """
+        count = len(self.workers)
+        best = None
+        for offset in range(count):
+            worker = self.workers[(self._next_worker + offset) % count]
+            if worker.ready and (best is None or len(worker.in_flight) < len(best.in_flight)):
+                best = worker
+                if not worker.in_flight:
+                    break
+        if best is not None:
+            self._next_worker = (best.index + 1) % count
+        return best
+    
+    def _send(self, worker, client, request, gather=None):
+        pool_id = self._next_id
+        self._next_id += 1
+        self._routes[pool_id] = (client, request.get("id"), gather)
+        worker.in_flight.add(pool_id)
+        self._write(worker.conn, self.dumps({**request, "id": pool_id}).encode())
+    
+    def _broadcast(self, client, request):
+        make_request, combine = self.broadcast[request.get("type")]
+        ready = [worker for worker in self.workers if worker.ready]
+        gather = _Gather(client, request, combine, [worker.index for worker in ready])
+        worker_request = make_request(request)
+        for worker in ready:
+            self._send(worker, client, worker_request, gather)
+        self._finish_gather(gather)
+    
+    def _finish_gather(self, gather):
+        if gather.waiting:
+            return
+        response = gather.combine(gather.request, gather.replies)
+        self._reply(gather.client, {"id": gather.request.get("id"), **response})
+    
+    def _reply(self, client, message):
+        if client in self._clients:
+            self._write(client, self.dumps(message).encode())
+    
+    def _write(self, conn, line):
+        conn.write(line)
+        if conn.pending_output:
+            self._selector.modify(conn, selectors.EVENT_READ | selectors.EVENT_WRITE, self._selector.get_key(conn).data)
+    
+    # --- Clients ----------------------------------------------------------
+    
+    def _accept(self):
+        try:
+            sock, _ = self._listener.accept()
+        except (BlockingIOError, InterruptedError):
+            return
+        client = _Connection(sock)
+        self._clients.add(client)
+        self._selector.register(client, selectors.EVENT_READ, ("client", client))
+        if self.ready_message is not None:
+            self._write(client, self.dumps(self.ready_message).encode())
+    
+    def _close_client(self, client):
+        self._clients.discard(client)
+        self._selector.unregister(client)
+        client.close()
+        # Replies to its in-flight requests are dropped by _reply
+        self._backlog = [(c, request) for c, request in self._backlog if c is not client]
+        for worker in self.workers:
+            worker.backlog = [(c, request) for c, request in worker.backlog if c is not client]
+    
+    def _on_client_lines(self, client, lines):
+        for line in lines:
+            try:
+                request = self.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("request must be a JSON object")
+            except ValueError as e:
+                self._reply(client, {"id": None, "type": "error", "error": f"Invalid JSON: {e}"})
+                continue
+            if request.get("type") == "shutdown":
+                self._close_client(client)
+                return
+            self._dispatch(client, request)
+    
+    # --- Event loop -------------------------------------------------------
+    
+    def _poll(self):
+        restarts = [worker.restart_at for worker in self.workers if worker.restart_at is not None]
+        timeout = max(min(restarts) - time.monotonic(), 0.0) if restarts else None
+        for key, events in self._selector.select(timeout):
+            kind, owner = key.data
+            if kind == "listener":
+                self._accept()
+                continue
+            if kind == "wakeup":
+                try:
+                    self._wakeup[0].recv(64)
+                except (BlockingIOError, InterruptedError):
+                    pass
+                continue
+            
+            conn = key.fileobj
+            if (kind == "worker" and owner.conn is not conn) or (kind == "client" and owner not in self._clients):
+                # Closed earlier in this round
+                continue
+            if events & selectors.EVENT_WRITE:
+                conn.flush()
+                if not conn.pending_output:
+                    self._selector.modify(conn, selectors.EVENT_READ, key.data)
+            if not events & selectors.EVENT_READ:
+                continue
+            lines, closed = conn.read_lines()
+            if kind == "worker":
+                for line in lines:
+                    try:
+                        self._on_worker_message(owner, line)
+                    except ValueError:
+                        logger.warning("Ignoring invalid output of worker %d: %r", owner.index, line[:200])
+                if closed:
+                    self._on_worker_exit(owner)
+            else:
+                self._on_client_lines(owner, lines)
+                if closed and owner in self._clients:
+                    self._close_client(owner)
+        self._restart_due_workers()
+    
+    def _shutdown(self):
+        self._stopping = True
+        signal.set_wakeup_fd(-1)
+        if self._listener is not None:
+            self._selector.unregister(self._listener)
+            self._listener.close()
+            try:
+                os.unlink(self.socket_path)
+            except FileNotFoundError:
+                pass
+        for client in list(self._clients):
+            self._close_client(client)
+        
+        # Closing a worker's stdin ends its request loop
+        running = []
+        for worker in self.workers:
+            if worker.conn is not None:
+                self._selector.unregister(worker.conn)
+                worker.conn.close()
+                worker.conn = None
+                running.append(worker)
+        deadline = time.monotonic() + self.stop_timeout
+        for worker in running:
+            while time.monotonic() < deadline:
+                finished, _ = os.waitpid(worker.pid, os.WNOHANG)
+                if finished:
+                    break
+                time.sleep(0.05)
+            else:
+                logger.warning("Worker %d (pid %d) did not exit, killing it", worker.index, worker.pid)
+                os.kill(worker.pid, signal.SIGKILL)
+                os.waitpid(worker.pid, 0)
+        if self._wakeup is not None:
+            for sock in self._wakeup:
+                sock.close()
+        self._selector.close()
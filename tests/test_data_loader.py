@@ -0,0 +1,264 @@
+"""
+drawing_to_sequence / drawings_to_sequences가 기존 점 단위 루프 구현과 비트 단위로 같은지,
+병렬 ndjson 로더가 순차 로더와 같은 순서/값을 반환하는지, 시퀀스 캐시가 설정/원본 변경과 손상 시 무효화되는지 확인
+"""
+import os
+import sys
+import json
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src import data_loader
+
+def reference_sequence(drawing):
+    """
+    벡터화 이전의 drawing_to_sequence (점마다 Python 루프, 획 길이는 x 좌표 수)
+    """
+    sequence = []
+    prev_x = None
+    prev_y = None
+    for stroke in drawing:
+        x_coords, y_coords = stroke[0], stroke[1]
+        for point_idx in range(len(x_coords)):
+            curr_x = x_coords[point_idx]
+            curr_y = y_coords[point_idx]
+            if prev_x is None:
+                dx, dy = 0, 0
+            else:
+                dx, dy = curr_x - prev_x, curr_y - prev_y
+            end_flag = 1.0 if point_idx == len(x_coords) - 1 else 0.0
+            sequence.append([dx / 255.0, dy / 255.0, end_flag])
+            prev_x, prev_y = curr_x, curr_y
+    
+    sequence = np.array(sequence, dtype=np.float32).reshape(-1, 3)
+    if len(sequence) < data_loader.MAX_SEQ_LEN:
+        padding = np.zeros((data_loader.MAX_SEQ_LEN - len(sequence), 3), dtype=np.float32)
+        sequence = np.vstack([sequence, padding])
+    return sequence[:data_loader.MAX_SEQ_LEN]
+
+def random_drawing(rng, n_strokes, max_points, floats=False):
+    drawing = []
+    for _ in range(n_strokes):
+        n = int(rng.integers(0, max_points + 1))
+        if floats:
+            drawing.append([list(rng.uniform(-300, 300, n)), list(rng.uniform(-300, 300, n))])
+        else:
+            drawing.append([rng.integers(0, 256, n).tolist(), rng.integers(0, 256, n).tolist()])
+    return drawing
+
+CASES = {
+    "empty": [],
+    "single_point": [[[10], [20]]],
+    "empty_strokes": [[[], []], [[1, 2], [3, 4]], [[], []]],
+    "only_empty_strokes": [[[], []], [[], []]],
+    "floats": [[[0.5, 10.25, 3.125], [7.75, -2.5, 0.1]], [[1e-3, 254.999], [0.3, 0.7]]],
+    "long_y": [[[0, 10], [5, 15, 99, 98]], [[20, 30], [25, 35]]],
+    "truncated": [[list(range(150)), list(range(150, 0, -1))], [list(range(120)), list(range(120))]],
+    "exactly_max": [[list(range(200)), list(range(200))]],
+}
+
+@pytest.mark.parametrize("name", sorted(CASES))
+def test_drawing_to_sequence_matches_reference(name):
+    drawing = CASES[name]
+    expected = reference_sequence(drawing)
+    sequence, length = data_loader.drawing_to_sequence(drawing, return_length=True)
+    assert sequence.dtype == np.float32
+    np.testing.assert_array_equal(sequence, expected)
+    assert length == min(sum(len(stroke[0]) for stroke in drawing), data_loader.MAX_SEQ_LEN)
+
+@pytest.mark.parametrize("floats", [False, True])
+def test_random_drawings_match_reference(floats):
+    rng = np.random.default_rng(0 if floats else 1)
+    drawings = [random_drawing(rng, int(rng.integers(0, 12)), 40, floats) for _ in range(300)]
+    for drawing in drawings:
+        np.testing.assert_array_equal(data_loader.drawing_to_sequence(drawing), reference_sequence(drawing))
+
+def test_batch_rows_match_reference():
+    rng = np.random.default_rng(2)
+    drawings = list(CASES.values()) + [random_drawing(rng, int(rng.integers(0, 12)), 40) for _ in range(100)]
+    sequences, lengths = data_loader.drawings_to_sequences(drawings, return_lengths=True)
+    assert sequences.shape == (len(drawings), data_loader.MAX_SEQ_LEN, 3)
+    for idx, drawing in enumerate(drawings):
+        np.testing.assert_array_equal(sequences[idx], reference_sequence(drawing))
+        assert lengths[idx] == min(sum(len(stroke[0]) for stroke in drawing), data_loader.MAX_SEQ_LEN)
+
+def test_packed_drawing_ignores_extra_y():
+    drawing = CASES["long_y"]
+    xs, ys, lengths = data_loader.unpack_drawing(data_loader.pack_drawing(drawing))
+    np.testing.assert_array_equal(data_loader.points_to_sequence(xs, ys, lengths), reference_sequence(drawing))
+
+def write_ndjson(path, rng, count, empty_every=7):
+    with open(path, 'w') as f:
+        for idx in range(count):
+            drawing = [] if idx % empty_every == 0 else random_drawing(rng, int(rng.integers(1, 6)), 30)
+            f.write(json.dumps({"word": path.stem, "drawing": drawing}) + "\n")
+    return path
+
+@pytest.fixture(scope="module")
+def ndjson_files(tmp_path_factory):
+    base = tmp_path_factory.mktemp("raw")
+    rng = np.random.default_rng(3)
+    return [write_ndjson(base / f"{name}.ndjson", rng, count) for name, count in (("a", 300), ("b", 1), ("c", 250))]
+
+@pytest.mark.parametrize("max_items", [None, 100])
+@pytest.mark.parametrize("simplify", [False, True])
+def test_parallel_loader_matches_serial(ndjson_files, max_items, simplify):
+    serial = [
+        data_loader.load_category_ndjson(path, label, max_items=max_items, simplify=simplify)[0]
+        for label, path in enumerate(ndjson_files)
+    ]
+    # 작은 chunk_bytes로 파일마다 여러 청크로 나뉘게 함
+    X, counts = data_loader.load_ndjson_parallel(
+        ndjson_files, max_items=max_items, num_workers=2, chunk_bytes=512, simplify=simplify
+    )
+    assert counts.tolist() == [len(part) for part in serial]
+    np.testing.assert_array_equal(X, np.concatenate(serial))
+
+def test_load_dataset_parallel_matches_serial(ndjson_files):
+    categories = [path.stem for path in ndjson_files]
+    base_path = ndjson_files[0].parent
+    X_serial, y_serial = data_loader.load_dataset(categories, base_path=base_path, max_items=200, num_workers=1)
+    X_parallel, y_parallel = data_loader.load_dataset(categories, base_path=base_path, max_items=200, num_workers=3)
+    np.testing.assert_array_equal(X_parallel, X_serial)
+    np.testing.assert_array_equal(y_parallel, y_serial)
+
+@pytest.fixture
+def cached_file(tmp_path):
+    path = write_ndjson(tmp_path / "cat.ndjson", np.random.default_rng(4), 50)
+    cache_dir = tmp_path / "cache"
+    data_loader.build_sequence_cache(path, max_items=40, cache_dir=cache_dir)
+    return path, cache_dir
+
+def test_sequence_cache_round_trip(cached_file):
+    path, cache_dir = cached_file
+    assert data_loader.open_sequence_cache(path, max_items=40, cache_dir=cache_dir) is not None
+    X, y = data_loader.load_category_cached(path, 2, max_items=40, cache_dir=cache_dir)
+    expected, _ = data_loader.load_category_ndjson(path, 2, max_items=40)
+    np.testing.assert_array_equal(X, expected)
+    assert (y == 2).all()
+
+def test_sequence_cache_invalidated_by_settings(cached_file):
+    path, cache_dir = cached_file
+    assert data_loader.open_sequence_cache(path, max_items=None, cache_dir=cache_dir) is None
+    assert data_loader.open_sequence_cache(path, max_items=40, cache_dir=cache_dir, simplify=True) is None
+
+def test_sequence_cache_invalidated_by_source_mtime(cached_file):
+    path, cache_dir = cached_file
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert data_loader.open_sequence_cache(path, max_items=40, cache_dir=cache_dir) is None
+
+def test_sequence_cache_invalidated_by_source_size(cached_file):
+    path, cache_dir = cached_file
+    stat = os.stat(path)
+    with open(path, 'a') as f:
+        f.write(json.dumps({"drawing": [[[1, 2], [3, 4]]]}) + "\n")
+    # 크기만 바뀌고 mtime은 그대로인 경우
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert data_loader.open_sequence_cache(path, max_items=40, cache_dir=cache_dir) is None
+
+@pytest.mark.parametrize("damage", ["truncate", "garbage"])
+def test_damaged_sequence_cache_is_rebuilt(cached_file, damage):
+    path, cache_dir = cached_file
+    data_path = cache_dir / "cat.npy"
+    if damage == "truncate":
+        with open(data_path, 'r+b') as f:
+            f.truncate(os.path.getsize(data_path) // 2)
+    else:
+        data_path.write_bytes(b"not a numpy file")
+    assert data_loader.open_sequence_cache(path, max_items=40, cache_dir=cache_dir) is None
+    
+    X, _ = data_loader.load_category_cached(path, 0, max_items=40, cache_dir=cache_dir)
+    np.testing.assert_array_equal(X, data_loader.load_category_ndjson(path, 0, max_items=40)[0])
+    assert data_loader.open_sequence_cache(path, max_items=40, cache_dir=cache_dir) is not None
+
+def reference_rdp_mask(x, y, epsilon):
+    """
+    획 1개의 재귀(스택) RDP - 벡터화 이전 구현, 동률이면 앞쪽 점을 선택 (np.argmax)
+    """
+    n = len(x)
+    keep = np.zeros(n, dtype=bool)
+    if n <= 2:
+        keep[:] = True
+        return keep
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        chord_x = x[end] - x[start]
+        chord_y = y[end] - y[start]
+        px = x[start + 1:end] - x[start]
+        py = y[start + 1:end] - y[start]
+        chord = np.hypot(chord_x, chord_y)
+        distances = np.hypot(px, py) if chord == 0 else np.abs(chord_x * py - chord_y * px) / chord
+        idx = int(np.argmax(distances))
+        if distances[idx] > epsilon:
+            mid = start + 1 + idx
+            keep[mid] = True
+            stack.append((start, mid))
+            stack.append((mid, end))
+    return keep
+
+@pytest.mark.parametrize("integer", [True, False])
+def test_rdp_mask_matches_recursive(integer):
+    rng = np.random.default_rng(6 if integer else 7)
+    for _ in range(200):
+        lengths = rng.integers(0, 60, size=int(rng.integers(1, 8)))
+        if integer:
+            # 정수 좌표: 거리 동률과 같은 점 반복(길이 0인 현)이 자주 생김
+            xs = rng.integers(0, 12, size=lengths.sum()).astype(np.float64)
+            ys = rng.integers(0, 12, size=lengths.sum()).astype(np.float64)
+        else:
+            xs = np.cumsum(rng.normal(0, 5, size=lengths.sum()))
+            ys = np.cumsum(rng.normal(0, 5, size=lengths.sum()))
+        epsilon = float(rng.choice([0.5, 2.0, 6.0]))
+        bounds = np.concatenate([[0], np.cumsum(lengths)])
+        expected = np.concatenate([
+            reference_rdp_mask(xs[start:stop], ys[start:stop], epsilon)
+            for start, stop in zip(bounds[:-1], bounds[1:])
+        ])
+        np.testing.assert_array_equal(data_loader.rdp_mask(xs, ys, epsilon, lengths), expected)
+
+def test_rdp_mask_single_stroke():
+    x = np.arange(10, dtype=np.float64)
+    np.testing.assert_array_equal(data_loader.rdp_mask(x, np.zeros(10), 1.0), [True] + [False] * 8 + [True])
+    y = np.array([0, 0, 0, 5, 0, 0, 0, 0, 0, 0], dtype=np.float64)
+    assert data_loader.rdp_mask(x, y, 1.0).nonzero()[0].tolist() == [0, 2, 3, 4, 9]
+
+def test_normalize_points_keeps_aspect_ratio():
+    xs, ys = data_loader.normalize_points([10, 30, 20], [100, 110, 105])
+    np.testing.assert_allclose(xs, [0, 255, 127.5])
+    np.testing.assert_allclose(ys, [0, 127.5, 63.75])
+    # 크기가 0인 그림(한 점)은 원점으로만 이동
+    xs, ys = data_loader.normalize_points([7, 7], [9, 9])
+    np.testing.assert_array_equal(xs, [0, 0])
+    np.testing.assert_array_equal(ys, [0, 0])
+    xs, ys = data_loader.normalize_points([], [])
+    assert len(xs) == len(ys) == 0
+
+def test_simplify_points():
+    # 촘촘한 직선 1획 + 꺾인 선 1획 (캔버스 좌표, 0~255 범위 밖)
+    line = np.linspace(0, 1000, 300)
+    corner_x = np.concatenate([np.linspace(0, 500, 100), np.full(100, 500.0)])
+    corner_y = np.concatenate([np.zeros(100), np.linspace(0, 500, 100)])
+    xs = np.concatenate([line, corner_x])
+    ys = np.concatenate([line * 0.5, corner_y])
+    new_xs, new_ys, lengths = data_loader.simplify_points(xs, ys, [300, 200])
+    assert lengths.tolist() == [2, 3]
+    assert new_xs.tolist() == [0, 255, 0, 128, 128]
+    assert new_ys.tolist() == [0, 128, 0, 0, 128]
+    
+    # 빈 획은 길이 0으로 유지
+    _, _, lengths = data_loader.simplify_points(xs[:300], ys[:300], [0, 300, 0])
+    assert lengths.tolist() == [0, 2, 0]
+
+def test_simplified_sequence_matches_simplify_points():
+    rng = np.random.default_rng(8)
+    for _ in range(50):
+        drawing = random_drawing(rng, int(rng.integers(1, 6)), 80, floats=True)
+        expected = data_loader.points_to_sequence(*data_loader.simplify_points(*data_loader.drawing_to_points(drawing)))
+        np.testing.assert_array_equal(data_loader.drawing_to_sequence(drawing, simplify=True), expected)
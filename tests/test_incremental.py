@@ -0,0 +1,149 @@
+"""
+증분 예측: 점을 여러 번에 나눠 보낸 결과가 그때까지의 그림 전체를 한 번에 실행한 결과와 같은지 확인
+
+- IncrementalSession + 스텝 모델(build_step_model): 학습하지 않은 작은 "lstm" 모델로 Keras에서 비교
+- predict_api.py --serve의 "stream" 요청: ONNX로 변환한 스텝 모델과 전체 모델 응답 비교
+- "conv"/"conv_lstm": causal 합성곱 + stride 마스크라서 뒤의 패딩 길이와 무관한지 비교
+"""
+import os
+import sys
+import json
+import subprocess
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from src import data_loader
+from src.incremental import IncrementalSession
+
+tf = pytest.importorskip("tensorflow")
+from src import model as model_lib
+
+ATOL = 1e-5
+
+def random_strokes(rng, n_strokes, max_points):
+    return [
+        [rng.integers(0, 256, n).tolist(), rng.integers(0, 256, n).tolist()]
+        for n in rng.integers(1, max_points + 1, size=n_strokes)
+    ]
+
+def split_requests(strokes, rng, max_chunk):
+    """
+    그린 순서대로의 점을 임의 길이로 잘라 증분 요청 목록으로 변환
+    
+    Returns:
+        [(segments, closed, 그때까지의 그림), ...] - segments/closed는 IncrementalSession.append 인자
+    """
+    points = [(idx, x, y) for idx, (xs, ys) in enumerate(strokes) for x, y in zip(xs, ys)]
+    requests = []
+    start = 0
+    while start < len(points):
+        stop = min(start + int(rng.integers(1, max_chunk + 1)), len(points))
+        segments = []
+        for idx, x, y in points[start:stop]:
+            if not segments or segments[-1][0] != idx:
+                segments.append((idx, [[], []]))
+            segments[-1][1][0].append(x)
+            segments[-1][1][1].append(y)
+        last_idx = points[stop - 1][0]
+        closed = stop == len(points) or points[stop][0] != last_idx
+        
+        drawing = [[list(xs), list(ys)] for xs, ys in strokes[:last_idx]]
+        count = sum(1 for idx, _, _ in points[:stop] if idx == last_idx)
+        drawing.append([strokes[last_idx][0][:count], strokes[last_idx][1][:count]])
+        requests.append(([segment for _, segment in segments], closed, drawing))
+        start = stop
+    return requests
+
+@pytest.fixture(scope="module")
+def lstm_model():
+    tf.keras.utils.set_random_seed(0)
+    model = model_lib.build_model(num_classes=5, architecture="lstm")
+    # 학습하지 않은 모델은 거의 균등 확률이므로 출력층을 키워 그림마다 확률이 뚜렷하게 달라지게 함
+    kernel, bias = model.layers[-1].get_weights()
+    model.layers[-1].set_weights([kernel * 20, bias])
+    return model
+
+@pytest.mark.parametrize("seed,n_strokes,max_points,max_chunk", [
+    (0, 4, 12, 5),
+    (1, 8, 20, 1),
+    (2, 3, 40, 30),
+    (3, 12, 30, 17),  # MAX_SEQ_LEN(200)점을 넘어 잘리는 그림
+])
+def test_session_matches_full_sequence(lstm_model, seed, n_strokes, max_points, max_chunk):
+    step_model = model_lib.build_step_model(lstm_model)
+    
+    def run_step(points, state_h, state_c):
+        return [output.numpy() for output in step_model([points, state_h, state_c])]
+    
+    rng = np.random.default_rng(seed)
+    strokes = random_strokes(rng, n_strokes, max_points)
+    session = IncrementalSession(run_step, model_lib.LSTM_UNITS)
+    requests = split_requests(strokes, rng, max_chunk)
+    outputs = []
+    for segments, closed, drawing in requests:
+        probabilities = session.append(segments, closed=closed)
+        expected = lstm_model(data_loader.drawing_to_sequence(drawing)[None], training=False).numpy()[0]
+        np.testing.assert_allclose(probabilities, expected, rtol=0, atol=ATOL)
+        outputs.append(probabilities)
+    # 비교가 의미 있도록 요청마다 확률이 허용 오차보다 훨씬 크게 달라지는지 확인
+    assert len(requests) > 1
+    assert np.ptp(np.array(outputs), axis=0).max() > 1000 * ATOL
+    assert session.num_points == min(sum(len(xs) for xs, _ in strokes), data_loader.MAX_SEQ_LEN)
+
+def test_stream_requests_match_full_predictions(lstm_model, tmp_path):
+    pytest.importorskip("tf2onnx")
+    pytest.importorskip("onnxruntime")
+    keras_path = str(tmp_path / "lstm.keras")
+    onnx_path = str(tmp_path / "lstm.onnx")
+    lstm_model.save(keras_path)
+    subprocess.run(
+        [sys.executable, os.path.join(ROOT, "scripts", "convert_to_onnx.py"),
+         "--keras", keras_path, "--output", onnx_path, "--step-output", str(tmp_path / "lstm_stream.onnx")],
+        check=True, capture_output=True, cwd=ROOT, timeout=600
+    )
+    
+    rng = np.random.default_rng(4)
+    requests = split_requests(random_strokes(rng, 6, 15), rng, 6)
+    lines = []
+    for idx, (segments, closed, drawing) in enumerate(requests):
+        lines.append({"id": 2 * idx, "type": "stream", "session": "s", "strokes": segments, "closed": closed})
+        lines.append({"id": 2 * idx + 1, "type": "predict", "drawing": drawing})
+    # 스트림 세션은 원본 점을 그대로 쓰므로 일반 예측도 단순화 없이 비교
+    env = dict(os.environ, PREDICT_SIMPLIFY="0", PREDICT_CACHE_SIZE="0")
+    completed = subprocess.run(
+        [sys.executable, os.path.join(ROOT, "predict_api.py"), onnx_path, "--serve"],
+        input="".join(json.dumps(line) + "\n" for line in lines),
+        capture_output=True, text=True, cwd=ROOT, env=env, timeout=300
+    )
+    replies = {}
+    for line in completed.stdout.splitlines():
+        message = json.loads(line)
+        if message.get("type") == "result":
+            replies[message["id"]] = message["result"]
+    assert len(replies) == len(lines), completed.stderr
+    
+    for idx in range(len(requests)):
+        stream, full = replies[2 * idx], replies[2 * idx + 1]
+        assert stream["predictedClass"] == full["predictedClass"]
+        for name, probability in full["allProbabilities"].items():
+            assert stream["allProbabilities"][name] == pytest.approx(probability, abs=ATOL)
+
+@pytest.mark.parametrize("architecture", ["conv", "conv_lstm"])
+def test_conv_output_ignores_trailing_padding(architecture):
+    tf.keras.utils.set_random_seed(1)
+    model = model_lib.build_model(num_classes=5, variable_length=True, architecture=architecture)
+    rng = np.random.default_rng(5)
+    for length in (1, 2, 3, 4, 5, 37, 50, 51, 199, 200):
+        sequence = np.zeros((1, data_loader.MAX_SEQ_LEN, 3), dtype=np.float32)
+        sequence[0, :length, :2] = rng.integers(-20, 21, size=(length, 2)) / 255.0
+        sequence[0, :length, 2] = rng.random(length) < 0.2
+        sequence[0, :length, 0] += 1e-3  # 모든 특징이 0인 점(패딩으로 오인)이 없도록
+        expected = model(sequence, training=False).numpy()
+        for width in sorted({length, data_loader.bucket_length(length), length + 3}):
+            if width > data_loader.MAX_SEQ_LEN:
+                continue
+            trimmed = model(sequence[:, :width], training=False).numpy()
+            np.testing.assert_allclose(trimmed, expected, rtol=0, atol=ATOL, err_msg=f"length={length}, width={width}")
@@ -0,0 +1,118 @@
+"""
+MicroBatcher: 배치 실행이나 콜백이 예외를 내도 모든 요청이 응답을 받고 배치 스레드가 계속 동작하는지 확인
+PredictionCache: 모델 버전별 키, LRU 제거, 유지 시간 만료
+"""
+import os
+import sys
+import threading
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.inference import MicroBatcher, PredictionCache
+
+class Replies:
+    """
+    callback(output, error) 결과를 모으고 기대한 개수가 도착할 때까지 대기
+    """
+    
+    def __init__(self):
+        self.results = []
+        self.lock = threading.Lock()
+        self.done = threading.Condition(self.lock)
+    
+    def callback(self, output, error):
+        with self.lock:
+            self.results.append((output, error))
+            self.done.notify_all()
+    
+    def wait(self, count, timeout=5.0):
+        with self.lock:
+            assert self.done.wait_for(lambda: len(self.results) >= count, timeout=timeout)
+            return list(self.results)
+
+def submit_batch(batcher, samples, callbacks):
+    # 큐에 한꺼번에 넣어 같은 배치로 모이게 함 (max_wait_ms가 충분히 큼)
+    for sample, callback in zip(samples, callbacks):
+        batcher.submit(sample, callback)
+
+def test_run_batch_error_reaches_every_request():
+    calls = []
+    
+    def run_batch(X):
+        calls.append(len(X))
+        if len(calls) == 1:
+            raise RuntimeError("session failed")
+        return X * 2
+    
+    batcher = MicroBatcher(run_batch, max_batch_size=4, max_wait_ms=200)
+    replies = Replies()
+    try:
+        submit_batch(batcher, [np.full(2, i, dtype=np.float32) for i in range(3)], [replies.callback] * 3)
+        results = replies.wait(3)
+        assert all(output is None and isinstance(error, RuntimeError) for output, error in results)
+        
+        batcher.submit(np.ones(2, dtype=np.float32), replies.callback)
+        output, error = replies.wait(4)[3]
+        assert error is None
+        np.testing.assert_array_equal(output, [2, 2])
+    finally:
+        batcher.close()
+
+def test_wrong_output_length_is_an_error():
+    batcher = MicroBatcher(lambda X: X[:1], max_batch_size=2, max_wait_ms=200)
+    replies = Replies()
+    try:
+        submit_batch(batcher, [np.zeros(2, dtype=np.float32)] * 2, [replies.callback] * 2)
+        results = replies.wait(2)
+        assert all(output is None and isinstance(error, ValueError) for output, error in results)
+    finally:
+        batcher.close()
+
+def test_failing_callback_does_not_stop_batch_thread():
+    def failing(output, error):
+        raise RuntimeError("client went away")
+    
+    batcher = MicroBatcher(lambda X: X + 1, max_batch_size=3, max_wait_ms=200)
+    replies = Replies()
+    try:
+        samples = [np.full(2, i, dtype=np.float32) for i in range(3)]
+        submit_batch(batcher, samples, [failing, replies.callback, replies.callback])
+        results = replies.wait(2)
+        np.testing.assert_array_equal(results[0][0], [2, 2])
+        np.testing.assert_array_equal(results[1][0], [3, 3])
+        
+        batcher.submit(np.zeros(2, dtype=np.float32), failing)
+        batcher.submit(np.zeros(2, dtype=np.float32), replies.callback)
+        output, error = replies.wait(3)[2]
+        assert error is None
+        np.testing.assert_array_equal(output, [1, 1])
+        assert batcher._thread.is_alive()
+    finally:
+        batcher.close()
+    assert batcher.stats()["totalRequests"] == 5
+
+def test_prediction_cache_keys_per_model_version():
+    sequence = np.arange(600, dtype=np.float32).reshape(200, 3)
+    old, new = PredictionCache("model:1"), PredictionCache("model:2")
+    assert old.key(sequence) == PredictionCache("model:1").key(sequence.copy())
+    assert old.key(sequence) != new.key(sequence)
+    assert old.key(sequence) != old.key(sequence + 1)
+
+def test_prediction_cache_lru_and_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("src.inference.time.monotonic", lambda: now[0])
+    cache = PredictionCache("model", max_entries=2, ttl_seconds=10)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # a가 최근 사용으로 이동
+    cache.put("c", 3)  # 가장 오래 사용하지 않은 b 제거
+    assert cache.get("b") is None
+    now[0] += 11
+    assert cache.get("a") is None and cache.get("c") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"], stats["expirations"]) == (1, 3, 1, 2)
+    
+    disabled = PredictionCache("model", max_entries=0)
+    disabled.put("a", 1)
+    assert disabled.get("a") is None
@@ -0,0 +1,72 @@
+"""
+NumPy 엔진(src/numpy_engine.py)이 같은 가중치의 ONNX Runtime / Keras 출력과 일치하는지 확인
+
+models/의 배포 모델(quickdraw_rnn.onnx, quickdraw_rnn.keras)에서 가중치를 추출해 비교합니다.
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src import data_loader
+from src.numpy_engine import NumpyLSTMModel, keras_weights, onnx_weights, save_weights
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models")
+ONNX_MODEL = os.path.join(MODELS_DIR, "quickdraw_rnn.onnx")
+KERAS_MODEL = os.path.join(MODELS_DIR, "quickdraw_rnn.keras")
+# scripts/export_numpy.py --tolerance 기본값과 동일
+TOLERANCE = 1e-4
+
+def random_inputs(count=64, seed=0):
+    """
+    길이가 제각각인 임의 스트로크 (scripts/export_numpy.py의 임의 검증 입력과 같은 방식)
+    """
+    rng = np.random.default_rng(seed)
+    X = np.zeros((count, data_loader.MAX_SEQ_LEN, 3), dtype=np.float32)
+    lengths = rng.integers(1, data_loader.MAX_SEQ_LEN + 1, size=count)
+    lengths[:3] = [1, 2, data_loader.MAX_SEQ_LEN]
+    for row, length in zip(X, lengths):
+        row[:length, :2] = rng.integers(-20, 21, size=(length, 2)) / 255.0
+        row[:length, 2] = rng.random(length) < 0.1
+    return X
+
+def assert_parity(expected, actual):
+    assert actual.shape == expected.shape
+    np.testing.assert_allclose(actual, expected, rtol=0, atol=TOLERANCE)
+    np.testing.assert_array_equal(actual.argmax(axis=1), expected.argmax(axis=1))
+
+@pytest.fixture(scope="module")
+def onnx_engine(tmp_path_factory):
+    pytest.importorskip("onnx")
+    if not os.path.exists(ONNX_MODEL):
+        pytest.skip(f"모델이 없습니다: {ONNX_MODEL}")
+    npz_path = tmp_path_factory.mktemp("numpy_engine") / "quickdraw_rnn.npz"
+    save_weights(npz_path, onnx_weights(ONNX_MODEL))
+    return NumpyLSTMModel.load(npz_path)
+
+def test_matches_onnx_runtime(onnx_engine):
+    ort = pytest.importorskip("onnxruntime")
+    session = ort.InferenceSession(ONNX_MODEL, providers=["CPUExecutionProvider"])
+    input_name = session.get_inputs()[0].name
+    X = random_inputs()
+    expected = session.run(None, {input_name: X})[0]
+    assert_parity(expected, onnx_engine.predict(X))
+
+def test_single_drawing_matches_batch(onnx_engine):
+    X = random_inputs(count=8, seed=1)
+    batch = onnx_engine.run(X)
+    for idx in range(len(X)):
+        np.testing.assert_allclose(onnx_engine.run(X[idx:idx + 1])[0], batch[idx], rtol=0, atol=1e-6)
+
+def test_matches_keras(tmp_path):
+    keras = pytest.importorskip("tensorflow").keras
+    if not os.path.exists(KERAS_MODEL):
+        pytest.skip(f"모델이 없습니다: {KERAS_MODEL}")
+    import src.model  # conv 구조의 커스텀 레이어 등록 (load_model용)
+    model = keras.models.load_model(KERAS_MODEL)
+    npz_path = save_weights(tmp_path / "quickdraw_rnn.npz", keras_weights(model))
+    engine = NumpyLSTMModel.load(npz_path)
+    X = random_inputs(seed=2)
+    assert_parity(model.predict(X, verbose=0), engine.predict(X))
@@ -0,0 +1,39 @@
+"""
+predict_api.py 1회 실행 모드: 점이 없는 그림(빈 획만 있는 그림 포함)은 빈 그림과 같은 빈 결과를 반환
+"""
+import os
+import sys
+import json
+import base64
+import subprocess
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from src import data_loader
+
+ONNX_MODEL = os.path.join(ROOT, "models", "quickdraw_rnn.onnx")
+
+def predict(request):
+    pytest.importorskip("onnxruntime")
+    if not os.path.exists(ONNX_MODEL):
+        pytest.skip(f"모델이 없습니다: {ONNX_MODEL}")
+    completed = subprocess.run(
+        [sys.executable, os.path.join(ROOT, "predict_api.py"), ONNX_MODEL],
+        input=json.dumps(request), capture_output=True, text=True, cwd=ROOT, timeout=120
+    )
+    assert completed.returncode == 0, completed.stderr
+    return json.loads(completed.stdout)
+
+def test_zero_point_drawings_are_empty():
+    empty = predict({"drawing": []})
+    assert empty["predictedClass"] == ""
+    assert empty["confidence"] == 0.0
+    
+    for drawing in ([[[], []]], [[[], []], [[], []]]):
+        assert predict({"drawing": drawing}) == empty
+    packed = base64.b64encode(data_loader.pack_drawing([[[], []]])).decode()
+    assert predict({"packed": packed}) == empty
+    
+    assert predict({"drawing": [[[5], [6]]]})["predictedClass"] != ""
@@ -1,5 +1,6 @@
 import os
 import json
+import time
 import numpy as np
 import tensorflow as tf
 from sklearn.model_selection import train_test_split
@@ -7,21 +8,42 @@ from datetime import datetime
 
 # TensorFlow 2.x 호환성을 위한 import
 try:
-    from tensorflow.keras.callbacks import ReduceLROnPlateau, EarlyStopping, ModelCheckpoint
+    from tensorflow.keras.callbacks import Callback, ReduceLROnPlateau, EarlyStopping, BackupAndRestore
 except ImportError:
-    from keras.callbacks import ReduceLROnPlateau, EarlyStopping, ModelCheckpoint
+    from keras.callbacks import Callback, ReduceLROnPlateau, EarlyStopping, BackupAndRestore
 
-from src import data_loader
-from src.model import build_model
+from src import data_loader, distillation, distributed
+from src.input_pipeline import bucket_batches, count_split_items, make_streaming_dataset
+from src.model import build_model, mixed_precision_policy
+from src.registry import load_categories, save_categories
 
 # ============================================================================
 # 설정 (클래스 수를 늘리려면 여기서 categories 리스트만 수정하면 됩니다)
 # ============================================================================
 CATEGORIES = ["cat", "dog", "airplane", "car", "bird"]  # 클래스 추가: 예) ["cat", "dog", "airplane", "car", "bird", "house", "tree", ...]
 MAX_ITEMS_PER_CLASS = 20000  # 클래스당 최대 샘플 수 (None이면 전체 사용)
-BATCH_SIZE = 64  # 클래스 수가 많으면 128로 증가 권장
+SAMPLING = None  # 클래스당 샘플을 고르는 방식: None(파일 앞부분), "random", "stratified", "reservoir" (메모리 학습 모드 전용)
+SAMPLE_SEED = 42  # SAMPLING 표본 시드 (바꾸면 다른 표본)
+BATCH_SIZE = 64  # 워커(복제본)당 batch size, 다중 워커 학습의 전체 batch는 BATCH_SIZE × 복제본 수 (클래스 수가 많으면 128로 증가 권장)
 EPOCHS = 50  # 클래스 수가 많으면 더 많은 epoch 필요할 수 있음
 VALIDATION_SPLIT = 0.2  # 검증 데이터 비율
+CACHE_DIR = "data/cache"  # 전처리된 시퀀스 캐시 위치 (None이면 매번 ndjson 파싱)
+NUM_LOAD_WORKERS = os.cpu_count() or 1  # ndjson 파싱 프로세스 수 (1이면 순차 파싱)
+STREAMING = False  # True면 전체 데이터를 메모리에 올리지 않고 tf.data로 스트리밍 (대규모 클래스 학습용)
+SHUFFLE_BUFFER = 10000  # 스트리밍 모드 셔플 버퍼 크기 (메모리 사용량 상한)
+ARCHITECTURE = "bilstm"  # 모델 구조: "bilstm"(기본), "lstm"(단방향, 증분 예측용 스텝 모델로 변환 가능), "conv"(dilated/strided 1D 합성곱, CPU에서 가장 빠름), "conv_lstm"(합성곱 + 작은 LSTM)
+SIMPLIFY_STROKES = True  # 0~255 정규화 + RDP 단순화 (predict_api.py의 실시간 입력과 같은 전처리, 이미 단순화된 데이터에는 거의 영향 없음)
+BUCKETING = False  # True면 길이별 버킷으로 배치를 묶어 200 대신 실제 길이(버킷 경계)까지만 LSTM 실행
+HIGH_THROUGHPUT = False  # True면 mixed precision(GPU float16 / 지원 CPU bfloat16) + XLA(jit_compile) + steps_per_execution
+STEPS_PER_EXECUTION = 32  # HIGH_THROUGHPUT 모드에서 tf.function 1회 호출당 실행할 배치 수 (Python 오버헤드 감소)
+JIT_COMPILE = None  # HIGH_THROUGHPUT 모드의 XLA 사용 여부 (None이면 GPU에서만, CPU에서는 마스킹된 LSTM이 XLA while 루프로 바뀌어 오히려 느림)
+TEACHER_MODEL = None  # 지식 증류: 학습된 teacher .keras 경로 (예: "models/quickdraw_rnn_5classes.keras"), 설정하면 STUDENT_ARCHITECTURE 구조의 student를 teacher soft target으로 학습 (메모리 학습 모드 전용)
+STUDENT_ARCHITECTURE = "conv"  # 지식 증류 student 구조 (TEACHER_MODEL을 설정하면 ARCHITECTURE 대신 사용, 기본은 CPU에서 가장 빠른 "conv")
+DISTILL_TEMPERATURE = distillation.DEFAULT_TEMPERATURE  # 증류 softmax 온도 (높을수록 오답 클래스 간 순위 정보를 더 전달)
+DISTILL_ALPHA = distillation.DEFAULT_ALPHA  # 전체 loss 중 증류(KD) loss 비중, 나머지는 정답 라벨 cross-entropy
+BACKUP_DIR = "models/backup"  # 학습 상태(가중치/옵티마이저/epoch) 백업 위치: epoch마다 저장하고, 중단된 학습을 같은 설정으로 다시 실행하면 마지막으로 끝난 epoch 다음부터 이어서 학습 (정상 종료 시 삭제)
+# 다중 워커 학습: TF_CONFIG 환경 변수(클러스터 스펙)가 있으면 MultiWorkerMirroredStrategy로 여러 프로세스/머신에서 동기 데이터 병렬 학습
+# (한 머신에서 여러 워커를 띄우려면 scripts/launch_workers.py, 워커마다 데이터 샤드를 결정적으로 나눠 읽음)
 
 # 클래스 수에 따른 자동 설정 조정
 NUM_CLASSES = len(CATEGORIES)
@@ -29,6 +51,217 @@ if NUM_CLASSES > 15:  # 클래스가 많으면 batch size 증가
     BATCH_SIZE = max(BATCH_SIZE, 128)
     print(f"⚠️  클래스 수가 많아 batch size를 {BATCH_SIZE}로 조정했습니다.")
 
+class ThroughputLogger(Callback):
+    """
+    epoch마다 학습 처리량(samples/sec)을 출력하고 기록
+    
+    train_samples를 모르면(스트리밍) 실행한 배치 수 × batch_size로 추정합니다.
+    steps_per_execution > 1이면 배치 콜백이 묶음 단위로 호출되므로 마지막 batch 번호로 배치 수를 셉니다.
+    """
+    
+    def __init__(self, batch_size, train_samples=None):
+        super().__init__()
+        self.batch_size = batch_size
+        self.train_samples = train_samples
+        self.samples_per_sec = []
+    
+    def on_epoch_begin(self, epoch, logs=None):
+        self.steps = 0
+        self.start = time.perf_counter()
+    
+    def on_train_batch_end(self, batch, logs=None):
+        self.steps = batch + 1
+        self.train_end = time.perf_counter()
+    
+    def on_epoch_end(self, epoch, logs=None):
+        # 검증 시간은 제외하고 학습 구간만 측정
+        elapsed = getattr(self, "train_end", time.perf_counter()) - self.start
+        samples = self.train_samples or self.steps * self.batch_size
+        rate = samples / elapsed if elapsed > 0 else 0.0
+        self.samples_per_sec.append(rate)
+        if logs is not None:
+            logs['samples_per_sec'] = rate
+        print(f"\n  처리량: {rate:,.0f} samples/sec ({samples:,}개, {elapsed:.1f}초)")
+
+def load_in_memory_split():
+    """
+    전체 데이터를 메모리에 올린 뒤 학습/검증으로 분할
+    
+    Returns:
+        (X_train, X_val, y_train, y_val)
+    """
+    # 데이터 로딩
+    print("\n[1/5] 데이터 로딩 중...")
+    X, y = data_loader.load_dataset(
+        categories=CATEGORIES, 
+        base_path="data/raw", 
+        max_items=MAX_ITEMS_PER_CLASS,
+        cache_dir=CACHE_DIR,
+        num_workers=NUM_LOAD_WORKERS,
+        simplify=SIMPLIFY_STROKES,
+        sample=SAMPLING,
+        seed=SAMPLE_SEED
+    )
+    print(f"✓ 총 {len(X):,}개 샘플 로드 완료")
+    print(f"  클래스별 샘플 수: {np.bincount(y)}")
+    
+    # 데이터 분할
+    print("\n[2/5] 데이터 분할 중...")
+    X_train, X_val, y_train, y_val = train_test_split(
+        X, y, 
+        test_size=VALIDATION_SPLIT, 
+        stratify=y,  # 클래스 비율 유지
+        random_state=42
+    )
+    print(f"✓ 학습 데이터: {len(X_train):,}개")
+    print(f"✓ 검증 데이터: {len(X_val):,}개")
+    return X_train, X_val, y_train, y_val
+
+def batch_datasets(train_ds, val_ds):
+    """
+    셔플된 학습 데이터셋과 검증 데이터셋을 배치(또는 길이 버킷 배치)로 묶고 prefetch
+    """
+    if BUCKETING:
+        # 길이별 버킷 배치 (버킷 길이까지만 패딩)
+        train_ds = bucket_batches(train_ds, BATCH_SIZE, data_loader.BUCKET_LENGTHS)
+        val_ds = bucket_batches(val_ds, BATCH_SIZE, data_loader.BUCKET_LENGTHS)
+    else:
+        train_ds = train_ds.batch(BATCH_SIZE)
+        val_ds = val_ds.batch(BATCH_SIZE)
+    
+    train_ds = train_ds.prefetch(tf.data.AUTOTUNE)  # GPU 활용 최적화
+    val_ds = val_ds.prefetch(tf.data.AUTOTUNE)
+    print(f"✓ Batch size: {BATCH_SIZE}")
+    if BUCKETING:
+        print(f"✓ 길이 버킷: {data_loader.BUCKET_LENGTHS}")
+    return train_ds, val_ds
+
+def build_in_memory_datasets(num_workers=1, worker_index=0):
+    """
+    전체 데이터를 메모리에 올린 뒤 분할하여 tf.data 데이터셋 생성
+    
+    다중 워커 학습이면 모든 워커가 같은 분할을 만든 뒤 worker_index번째 샤드만 사용합니다.
+    
+    Returns:
+        (train_ds, val_ds, 학습 샘플 수, 검증 샘플 수) - 샘플 수는 이 워커의 샤드 기준
+    """
+    X_train, X_val, y_train, y_val = load_in_memory_split()
+    if num_workers > 1:
+        X_train, y_train = distributed.shard_arrays((X_train, y_train), num_workers, worker_index)
+        X_val, y_val = distributed.shard_arrays((X_val, y_val), num_workers, worker_index)
+        print(f"✓ 워커 {worker_index} 샤드: 학습 {len(X_train):,}개, 검증 {len(X_val):,}개")
+    
+    # 데이터셋 생성 (tf.data로 최적화)
+    print("\n[3/5] 데이터셋 생성 중...")
+    train_ds = tf.data.Dataset.from_tensor_slices((X_train, y_train))
+    train_ds = train_ds.shuffle(buffer_size=min(10000, len(X_train)))
+    val_ds = tf.data.Dataset.from_tensor_slices((X_val, y_val))
+    train_ds, val_ds = batch_datasets(train_ds, val_ds)
+    
+    return train_ds, val_ds, len(X_train), len(X_val)
+
+def load_teacher():
+    """
+    지식 증류용 teacher 모델 로드 (출력 클래스와 카테고리 순서가 CATEGORIES와 같은지 확인)
+    """
+    print(f"\n✓ Teacher 모델 로드: {TEACHER_MODEL}")
+    teacher = tf.keras.models.load_model(TEACHER_MODEL)
+    teacher_categories = load_categories(TEACHER_MODEL, default=CATEGORIES)
+    if teacher_categories != CATEGORIES or teacher.output_shape[-1] != NUM_CLASSES:
+        raise ValueError(
+            f"Teacher 카테고리({teacher_categories}, 출력 {teacher.output_shape[-1]}개)가 "
+            f"CATEGORIES({CATEGORIES})와 다릅니다"
+        )
+    return teacher
+
+def build_distillation_datasets(teacher, num_workers=1, worker_index=0):
+    """
+    지식 증류용 데이터셋 생성: 학습 데이터에 teacher logits(soft target)를 붙여 배치
+    
+    teacher logits는 배치 단위로 한 번 계산해 CACHE_DIR에 저장하고,
+    같은 teacher·같은 학습 데이터로 다시 학습하면 캐시를 읽습니다.
+    검증 데이터는 정답 라벨만 사용합니다 (일반 학습과 같은 val_loss/val_accuracy).
+    다중 워커 학습이면 soft target을 전체 학습 데이터로 계산(캐시 공유)한 뒤 샤드를 나눕니다.
+    
+    Returns:
+        (train_ds, val_ds, 학습 샘플 수, 검증 샘플 수, (X_val, y_val)) - 샘플 수는 이 워커의 샤드 기준,
+        (X_val, y_val)은 teacher/student 비교용 전체 검증 데이터
+    """
+    X_train, X_val, y_train, y_val = load_in_memory_split()
+    
+    print("\n[3/5] Teacher soft target 계산 및 데이터셋 생성 중...")
+    start = time.perf_counter()
+    soft_targets, cached = distillation.load_soft_targets(teacher, TEACHER_MODEL, X_train, cache_dir=CACHE_DIR)
+    source = "캐시" if cached else "계산"
+    print(f"✓ Teacher logits {soft_targets.shape} {source} ({time.perf_counter() - start:.1f}초)")
+    
+    validation_data = (X_val, y_val)
+    if num_workers > 1:
+        X_train, y_train, soft_targets = distributed.shard_arrays((X_train, y_train, soft_targets), num_workers, worker_index)
+        X_val, y_val = distributed.shard_arrays((X_val, y_val), num_workers, worker_index)
+        print(f"✓ 워커 {worker_index} 샤드: 학습 {len(X_train):,}개, 검증 {len(X_val):,}개")
+    
+    train_ds = tf.data.Dataset.from_tensor_slices((X_train, (y_train, soft_targets)))
+    train_ds = train_ds.shuffle(buffer_size=min(10000, len(X_train)))
+    val_ds = tf.data.Dataset.from_tensor_slices((X_val, y_val))
+    train_ds, val_ds = batch_datasets(train_ds, val_ds)
+    
+    return train_ds, val_ds, len(X_train), len(X_val), validation_data
+
+def build_streaming_datasets(num_workers=1, worker_index=0):
+    """
+    ndjson(또는 캐시)을 스트리밍하는 tf.data 데이터셋 생성
+    
+    전체 X 배열을 만들지 않으므로 데이터 크기와 무관하게 메모리 사용량이 일정합니다.
+    학습/검증 분할은 카테고리와 샘플 순서로 결정되어 실행마다 동일합니다.
+    다중 워커 학습이면 각 워커가 분할의 worker_index번째 샤드(num_workers개마다 1개)만 읽습니다.
+    
+    Returns:
+        (train_ds, val_ds, 학습 샘플 수, 검증 샘플 수) - 샘플 수는 스트리밍이라 None,
+        다중 워커 학습이면 모든 워커에 공통인 샤드당 최소 샘플 수 (워커마다 같은 step 수 계산용)
+    """
+    print("\n[1/5] 스트리밍 데이터셋 준비 중...")
+    print(f"✓ 데이터를 메모리에 올리지 않고 스트리밍합니다 (셔플 버퍼: {SHUFFLE_BUFFER:,})")
+    
+    print("\n[2/5] 데이터 분할 (결정적 해시 기반)...")
+    print(f"✓ 검증 비율: {VALIDATION_SPLIT}")
+    
+    print("\n[3/5] 데이터셋 생성 중...")
+    common = dict(
+        categories=CATEGORIES,
+        base_path="data/raw",
+        max_items=MAX_ITEMS_PER_CLASS,
+        cache_dir=CACHE_DIR,
+        validation_split=VALIDATION_SPLIT,
+        batch_size=BATCH_SIZE,
+        bucket_lengths=data_loader.BUCKET_LENGTHS if BUCKETING else None,
+        simplify=SIMPLIFY_STROKES,
+        num_shards=num_workers,
+        shard_index=worker_index
+    )
+    train_ds = make_streaming_dataset(validation=False, shuffle_buffer=SHUFFLE_BUFFER, **common)
+    val_ds = make_streaming_dataset(validation=True, **common)
+    print(f"✓ Batch size: {BATCH_SIZE}")
+    
+    if num_workers == 1:
+        return train_ds, val_ds, None, None
+    
+    # 샤드 크기는 카테고리마다 최대 1개씩 차이 나므로, 모든 워커에 공통인 하한으로 step 수를 정함
+    counts = {}
+    for validation in (False, True):
+        per_category = count_split_items(
+            CATEGORIES,
+            base_path="data/raw",
+            max_items=MAX_ITEMS_PER_CLASS,
+            cache_dir=CACHE_DIR,
+            validation=validation,
+            validation_split=VALIDATION_SPLIT,
+            simplify=SIMPLIFY_STROKES
+        )
+        counts[validation] = int(np.sum(per_category // num_workers))
+    print(f"✓ 워커 {worker_index} 샤드: 학습 {counts[False]:,}개 이상, 검증 {counts[True]:,}개 이상")
+    return train_ds, val_ds, counts[False], counts[True]
+
 def main():
     """
     QuickDraw 분류 모델 학습
@@ -41,7 +274,7 @@ def main():
     print("="*70)
     print(f"클래스 수: {NUM_CLASSES}")
     print(f"클래스 목록: {', '.join(CATEGORIES)}")
-    print(f"클래스당 최대 샘플: {MAX_ITEMS_PER_CLASS or '전체'}")
+    print(f"클래스당 최대 샘플: {MAX_ITEMS_PER_CLASS or '전체'}" + (f" ({SAMPLING} 표본, seed {SAMPLE_SEED})" if SAMPLING else ""))
     print(f"Batch size: {BATCH_SIZE}")
     print(f"최대 Epochs: {EPOCHS}")
     print("="*70)
@@ -61,58 +294,99 @@ def main():
     else:
         print("⚠️  GPU를 찾을 수 없습니다. CPU로 학습합니다.")
     
-    # 데이터 로딩
-    print("\n[1/5] 데이터 로딩 중...")
-    X, y = data_loader.load_dataset(
-        categories=CATEGORIES, 
-        base_path="data/raw", 
-        max_items=MAX_ITEMS_PER_CLASS
-    )
-    print(f"✓ 총 {len(X):,}개 샘플 로드 완료")
-    print(f"  클래스별 샘플 수: {np.bincount(y)}")
+    # 다중 워커 학습 (TF_CONFIG가 있을 때): 다른 TensorFlow 연산보다 먼저 생성해야 함
+    strategy = distributed.make_strategy()
+    num_workers, worker_index, is_chief = distributed.worker_info(strategy)
+    global_batch_size = BATCH_SIZE * strategy.num_replicas_in_sync
+    if num_workers > 1:
+        print(
+            f"✓ 다중 워커 학습: 워커 {worker_index}/{num_workers}{' (chief)' if is_chief else ''}, "
+            f"복제본 {strategy.num_replicas_in_sync}개, 전체 batch size {global_batch_size}"
+        )
     
-    # 데이터 분할
-    print("\n[2/5] 데이터 분할 중...")
-    X_train, X_val, y_train, y_val = train_test_split(
-        X, y, 
-        test_size=VALIDATION_SPLIT, 
-        stratify=y,  # 클래스 비율 유지
-        random_state=42
-    )
-    print(f"✓ 학습 데이터: {len(X_train):,}개")
-    print(f"✓ 검증 데이터: {len(X_val):,}개")
+    # 고속 학습 모드: 모델 생성 전에 전역 precision 정책 설정 (출력층은 항상 float32)
+    precision_policy = mixed_precision_policy() if HIGH_THROUGHPUT else "float32"
+    tf.keras.mixed_precision.set_global_policy(precision_policy)
+    jit_compile = HIGH_THROUGHPUT and (JIT_COMPILE if JIT_COMPILE is not None else bool(gpus))
+    steps_per_execution = STEPS_PER_EXECUTION if HIGH_THROUGHPUT else 1
+    if HIGH_THROUGHPUT:
+        print(f"✓ 고속 학습 모드: precision={precision_policy}, jit_compile={jit_compile}, steps_per_execution={steps_per_execution}")
     
-    # 데이터셋 생성 (tf.data로 최적화)
-    print("\n[3/5] 데이터셋 생성 중...")
-    train_ds = tf.data.Dataset.from_tensor_slices((X_train, y_train))
-    train_ds = train_ds.shuffle(buffer_size=min(10000, len(X_train))).batch(BATCH_SIZE)
-    train_ds = train_ds.prefetch(tf.data.AUTOTUNE)  # GPU 활용 최적화
+    teacher = None
+    # 지식 증류면 teacher보다 작은 student 구조로 학습
+    architecture = STUDENT_ARCHITECTURE if TEACHER_MODEL else ARCHITECTURE
+    if TEACHER_MODEL:
+        if STREAMING:
+            raise ValueError("지식 증류(TEACHER_MODEL)는 메모리 학습 모드(STREAMING = False)에서만 지원합니다")
+        teacher = load_teacher()
+        train_ds, val_ds, train_samples, val_samples, validation_data = build_distillation_datasets(teacher, num_workers, worker_index)
+        print(f"✓ 지식 증류: student={architecture}, temperature={DISTILL_TEMPERATURE}, alpha={DISTILL_ALPHA}")
+    elif STREAMING:
+        train_ds, val_ds, train_samples, val_samples = build_streaming_datasets(num_workers, worker_index)
+    else:
+        train_ds, val_ds, train_samples, val_samples = build_in_memory_datasets(num_workers, worker_index)
     
-    val_ds = tf.data.Dataset.from_tensor_slices((X_val, y_val))
-    val_ds = val_ds.batch(BATCH_SIZE).prefetch(tf.data.AUTOTUNE)
-    print(f"✓ Batch size: {BATCH_SIZE}")
+    steps_per_epoch = validation_steps = None
+    if num_workers > 1:
+        # 모든 워커가 epoch마다 같은 step 수를 실행해야 all-reduce에서 서로 기다리지 않으므로
+        # 데이터셋을 반복하고 샤드 크기로 step 수를 고정 (워커별 배치는 BATCH_SIZE, 전체 배치는 global_batch_size)
+        steps_per_epoch = max(train_samples // BATCH_SIZE, 1)
+        validation_steps = max(val_samples // BATCH_SIZE, 1)
+        train_ds = distributed.distribute_dataset(strategy, lambda ds=train_ds: ds.repeat())
+        val_ds = distributed.distribute_dataset(strategy, lambda ds=val_ds: ds.repeat())
+        print(f"✓ epoch당 step: 학습 {steps_per_epoch}, 검증 {validation_steps}")
+    elif steps_per_execution > 1 and train_ds.cardinality() == tf.data.UNKNOWN_CARDINALITY:
+        # Keras는 배치 수를 모르는 데이터셋(길이 버킷/스트리밍)에 steps_per_execution > 1을 쓸 수 없음
+        print("⚠️  데이터셋 배치 수를 알 수 없어(길이 버킷/스트리밍) steps_per_execution=1로 학습합니다.")
+        steps_per_execution = 1
     
     # 모델 생성
     print("\n[4/5] 모델 생성 중...")
-    model = build_model(num_classes=NUM_CLASSES)
+    model_kwargs = dict(num_classes=NUM_CLASSES, variable_length=BUCKETING, architecture=architecture)
+    with strategy.scope():
+        model = build_model(jit_compile=jit_compile, steps_per_execution=steps_per_execution, **model_kwargs)
+        if teacher is not None:
+            # student를 감싸 teacher logits로 학습 (저장은 student만)
+            student = model
+            model = distillation.Distiller(student, temperature=DISTILL_TEMPERATURE, alpha=DISTILL_ALPHA)
+            model.compile(
+                optimizer=tf.keras.optimizers.Adam(learning_rate=1e-3),
+                jit_compile=jit_compile,
+                steps_per_execution=steps_per_execution
+            )
     print("\n모델 구조:")
-    model.summary()
+    (student if teacher is not None else model).summary()
+    if teacher is not None:
+        # 파라미터 수가 아니라 단건 추론 시간으로 비교 (합성곱 student는 파라미터가 더 많아도 순차 연산이 없어 빠름)
+        # 측정 오차를 감안해 10% 이상 빠르지 않으면 경고 (teacher와 같은 구조면 항상 경고)
+        teacher_ms = distillation.measure_latency(teacher, validation_data[0], 1, runs=20)["p50Ms"]
+        student_ms = distillation.measure_latency(student, validation_data[0], 1, runs=20)["p50Ms"]
+        if student_ms > 0.9 * teacher_ms:
+            print(
+                f"⚠️  Student({architecture}, 단건 {student_ms:.2f} ms)가 teacher(단건 {teacher_ms:.2f} ms)보다 충분히 빠르지 않습니다. "
+                f"STUDENT_ARCHITECTURE를 더 작은 구조로 바꾸세요."
+            )
     
     # 콜백 설정
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     model_dir = "models"
     os.makedirs(model_dir, exist_ok=True)
     
-    model_path = os.path.join(model_dir, f"quickdraw_rnn_{NUM_CLASSES}classes.keras")
+    model_prefix = "quickdraw_rnn" if architecture == "bilstm" else f"quickdraw_{architecture}"
+    if teacher is not None:
+        model_prefix += "_student"  # teacher 모델 파일을 덮어쓰지 않도록
+    model_path = os.path.join(model_dir, f"{model_prefix}_{NUM_CLASSES}classes.keras")
     history_path = os.path.join(model_dir, f"history_{NUM_CLASSES}classes_{timestamp}.json")
     
+    # 다중 워커 학습이면 전체(모든 워커) 처리량: step 수 × 전체 batch size
+    throughput = ThroughputLogger(global_batch_size, train_samples if num_workers == 1 else None)
+    early_stopping = EarlyStopping(
+        monitor='val_loss',
+        patience=7,  # 클래스 수가 많으면 patience 증가
+        restore_best_weights=True,
+        verbose=1
+    )
     callbacks = [
-        ModelCheckpoint(
-            filepath=model_path,
-            monitor='val_loss',
-            save_best_only=True,  # 최고 성능 모델만 저장
-            verbose=1
-        ),
         ReduceLROnPlateau(
             monitor='val_loss',
             factor=0.5,
@@ -120,13 +394,16 @@ def main():
             min_lr=1e-6,
             verbose=1
         ),
-        EarlyStopping(
-            monitor='val_loss',
-            patience=7,  # 클래스 수가 많으면 patience 증가
-            restore_best_weights=True,
-            verbose=1
-        )
+        early_stopping,
+        throughput
     ]
+    if BACKUP_DIR:
+        # epoch마다 가중치/옵티마이저/epoch 번호를 백업하고, 재실행하면 복원해 이어서 학습
+        # (다중 워커 학습이면 chief만 BACKUP_DIR에 쓰고, 워커가 죽으면 모든 워커를 다시 시작해 복원)
+        backup_dir = os.path.join(BACKUP_DIR, f"{model_prefix}_{NUM_CLASSES}classes")
+        callbacks.insert(0, BackupAndRestore(backup_dir=backup_dir))
+        if os.path.isdir(backup_dir) and os.listdir(backup_dir):
+            print(f"\n✓ 학습 상태 백업 발견: {backup_dir} (마지막으로 끝난 epoch 다음부터 이어서 학습)")
     
     # 학습
     print("\n[5/5] 모델 학습 시작...")
@@ -135,23 +412,68 @@ def main():
         train_ds,
         validation_data=val_ds,
         epochs=EPOCHS,
+        steps_per_epoch=steps_per_epoch,
+        validation_steps=validation_steps,
         callbacks=callbacks,
-        verbose=1
+        verbose=1 if is_chief else 2
     )
     print("-"*70)
     
+    # 조기 종료 없이 끝나도 검증 loss가 가장 낮았던 epoch의 가중치로 저장
+    # (재개한 학습이면 재개 이후 epoch 중 최고)
+    if early_stopping.stopped_epoch == 0 and early_stopping.best_weights is not None:
+        print(f"✓ 최고 epoch({early_stopping.best_epoch + 1})의 가중치로 복원")
+        model.set_weights(early_stopping.best_weights)
+    save_model = student if teacher is not None else model
+    distributed.save_on_chief(save_model.save, model_path, is_chief, worker_index)
+    if not is_chief:
+        # chief가 저장/비교를 마칠 때까지 대기 (먼저 종료하면 chief에 워커 실패로 보고됨)
+        distributed.barrier(strategy)
+        print(f"✓ 워커 {worker_index} 학습 완료 (모델/히스토리는 chief가 저장)")
+        return
+    
+    if precision_policy != "float32":
+        # ONNX 변환/predict_api.py용으로 최고 모델을 float32 가중치 그대로 float32 모델로 다시 저장
+        best_model = tf.keras.models.load_model(model_path)
+        tf.keras.mixed_precision.set_global_policy("float32")
+        export_model = build_model(**model_kwargs)
+        export_model.set_weights(best_model.get_weights())
+        export_model.save(model_path)
+        print(f"✓ float32 모델로 다시 저장: {model_path}")
+    
+    # 카테고리 목록 저장 (convert_to_onnx.py가 ONNX 모델 옆으로 복사, predict_api.py가 읽음)
+    categories_path = save_categories(model_path, CATEGORIES)
+    
+    distillation_report = None
+    if teacher is not None:
+        # 검증 데이터로 teacher와 최고 student의 정확도/지연 시간 비교
+        print("\nTeacher vs Student 비교 중...")
+        X_val, y_val = validation_data
+        distillation_report = distillation.compare_models(teacher, tf.keras.models.load_model(model_path), X_val, y_val)
+        distillation_report.update({
+            'teacher_model': TEACHER_MODEL,
+            'temperature': DISTILL_TEMPERATURE,
+            'alpha': DISTILL_ALPHA,
+        })
+    
     # 학습 히스토리 저장
     history_dict = {
         'categories': CATEGORIES,
         'num_classes': NUM_CLASSES,
-        'train_samples': len(X_train),
-        'val_samples': len(X_val),
+        'architecture': architecture,
+        'train_samples': train_samples,
+        'val_samples': val_samples,
         'batch_size': BATCH_SIZE,
+        'precision_policy': precision_policy,
+        'jit_compile': jit_compile,
+        'steps_per_execution': steps_per_execution,
+        'distillation': distillation_report,
         'history': {
             'loss': [float(x) for x in history.history['loss']],
             'accuracy': [float(x) for x in history.history['accuracy']],
             'val_loss': [float(x) for x in history.history['val_loss']],
-            'val_accuracy': [float(x) for x in history.history['val_accuracy']]
+            'val_accuracy': [float(x) for x in history.history['val_accuracy']],
+            'samples_per_sec': [float(x) for x in throughput.samples_per_sec]
         }
     }
     
@@ -166,11 +488,25 @@ def main():
     print("학습 완료!")
     print("="*70)
     print(f"✓ 모델 저장: {model_path}")
+    print(f"✓ 카테고리 저장: {categories_path}")
     print(f"✓ 히스토리 저장: {history_path}")
     print(f"\n최종 성능:")
     print(f"  학습 정확도: {final_train_acc:.4f} ({final_train_acc*100:.2f}%)")
     print(f"  검증 정확도: {final_val_acc:.4f} ({final_val_acc*100:.2f}%)")
+    print(f"  평균 처리량: {np.mean(throughput.samples_per_sec):,.0f} samples/sec")
+    if distillation_report is not None:
+        print(f"\n지식 증류 (검증 데이터 {len(y_val):,}개):")
+        for name in ("teacher", "student"):
+            report = distillation_report[name]
+            print(
+                f"  {name:7s} 파라미터 {report['parameters']:>9,} | 정확도 {report['accuracy']*100:6.2f}% | "
+                f"단건 {report['latency']['single']['p50Ms']:.2f} ms | "
+                f"배치(64) {report['latency']['batched']['p50Ms']:.2f} ms"
+            )
+        print(f"  예측 일치율: {distillation_report['top1Agreement']*100:.2f}%")
+        print(f"  속도 향상: 단건 {distillation_report['singleSpeedup']:.2f}x, 배치 {distillation_report['batchedSpeedup']:.2f}x")
     print("="*70)
+    distributed.barrier(strategy)
 
 if __name__ == "__main__":
     main()